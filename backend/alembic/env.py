@@ -12,12 +12,16 @@ sys.path.append(os.path.dirname(os.path.dirname(__file__)))
 
 # Import your models and database configuration
 from app.core.db import Base
-from app.core.models import APISpec, TestCase, TestResult
+from app.core.models import APISpec, TestCase, TestRun, TestResult
 
 # this is the Alembic Config object, which provides
 # access to the values within the .ini file in use.
 config = context.config
 
+# Migrate the database the app is configured for, if set
+if os.getenv("DATABASE_URL"):
+    config.set_main_option("sqlalchemy.url", os.environ["DATABASE_URL"].replace("%", "%%"))
+
 # Interpret the config file for Python logging.
 # This line sets up loggers basically.
 if config.config_file_name is not None:
@@ -0,0 +1,47 @@
+"""Add load stats
+
+Revision ID: 0b7d5e2c9a48
+Revises: f2c81a6d4e39
+Create Date: 2026-10-17 18:02:17.845120
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0b7d5e2c9a48'
+down_revision: Union[str, Sequence[str], None] = 'f2c81a6d4e39'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('load_stats',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('run_id', sa.Integer(), nullable=False),
+    sa.Column('endpoint', sa.String(), nullable=False),
+    sa.Column('requests', sa.Integer(), nullable=False),
+    sa.Column('errors', sa.Integer(), nullable=False),
+    sa.Column('statuses', sa.Text(), nullable=True),
+    sa.Column('throughput_rps', sa.Float(), nullable=True),
+    sa.Column('p50_ms', sa.Float(), nullable=True),
+    sa.Column('p95_ms', sa.Float(), nullable=True),
+    sa.Column('p99_ms', sa.Float(), nullable=True),
+    sa.Column('max_ms', sa.Float(), nullable=True),
+    sa.Column('histogram', sa.Text(), nullable=True),
+    sa.ForeignKeyConstraint(['run_id'], ['test_runs.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_load_stats_id'), 'load_stats', ['id'], unique=False)
+    op.create_index(op.f('ix_load_stats_run_id'), 'load_stats', ['run_id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_load_stats_run_id'), table_name='load_stats')
+    op.drop_index(op.f('ix_load_stats_id'), table_name='load_stats')
+    op.drop_table('load_stats')
@@ -0,0 +1,46 @@
+"""Add response captures
+
+Revision ID: 4e8b2f9d3c71
+Revises: 9d4a7c1e6b53
+Create Date: 2026-10-17 19:15:08.562194
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '4e8b2f9d3c71'
+down_revision: Union[str, Sequence[str], None] = '9d4a7c1e6b53'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('response_captures',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('run_id', sa.Integer(), nullable=True),
+    sa.Column('test_case_id', sa.Integer(), nullable=False),
+    sa.Column('status', sa.Integer(), nullable=False),
+    sa.Column('headers', sa.Text(), nullable=True),
+    sa.Column('body', sa.LargeBinary(), nullable=True),
+    sa.Column('encoding', sa.String(), nullable=False),
+    sa.Column('size_bytes', sa.Integer(), nullable=False),
+    sa.Column('truncated', sa.Boolean(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['run_id'], ['test_runs.id'], ),
+    sa.ForeignKeyConstraint(['test_case_id'], ['test_cases.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_response_captures_id'), 'response_captures', ['id'], unique=False)
+    op.create_index('ix_response_captures_run_id_test_case_id', 'response_captures', ['run_id', 'test_case_id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_response_captures_run_id_test_case_id', table_name='response_captures')
+    op.drop_index(op.f('ix_response_captures_id'), table_name='response_captures')
+    op.drop_table('response_captures')
@@ -0,0 +1,48 @@
+"""Add run batches
+
+Revision ID: 6c2e9a4f1d87
+Revises: 4e8b2f9d3c71
+Create Date: 2026-10-17 20:31:44.918270
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '6c2e9a4f1d87'
+down_revision: Union[str, Sequence[str], None] = '4e8b2f9d3c71'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('run_batches',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('run_id', sa.Integer(), nullable=False),
+    sa.Column('test_case_ids', sa.Text(), nullable=False),
+    sa.Column('status', sa.String(), nullable=False),
+    sa.Column('worker_id', sa.String(), nullable=True),
+    sa.Column('attempts', sa.Integer(), nullable=False),
+    sa.Column('lease_expires_at', sa.DateTime(), nullable=True),
+    sa.Column('passed', sa.Integer(), nullable=True),
+    sa.Column('failed', sa.Integer(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.Column('finished_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['run_id'], ['test_runs.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_run_batches_id'), 'run_batches', ['id'], unique=False)
+    op.create_index(op.f('ix_run_batches_run_id'), 'run_batches', ['run_id'], unique=False)
+    op.create_index('ix_run_batches_status_lease_expires_at', 'run_batches', ['status', 'lease_expires_at'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_run_batches_status_lease_expires_at', table_name='run_batches')
+    op.drop_index(op.f('ix_run_batches_run_id'), table_name='run_batches')
+    op.drop_index(op.f('ix_run_batches_id'), table_name='run_batches')
+    op.drop_table('run_batches')
@@ -0,0 +1,30 @@
+"""Add result lookup indexes
+
+Revision ID: 7c1f2a9d4b6e
+Revises: 3389323bc7c7
+Create Date: 2026-10-17 09:12:41.518204
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '7c1f2a9d4b6e'
+down_revision: Union[str, Sequence[str], None] = '3389323bc7c7'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index('ix_test_results_test_case_id_id', 'test_results', ['test_case_id', 'id'], unique=False)
+    op.create_index(op.f('ix_test_cases_spec_id'), 'test_cases', ['spec_id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_test_cases_spec_id'), table_name='test_cases')
+    op.drop_index('ix_test_results_test_case_id_id', table_name='test_results')
@@ -0,0 +1,36 @@
+"""Add spec content hash
+
+Revision ID: 8f3d2b6a1e94
+Revises: e1b7c94a2f05
+Create Date: 2026-10-17 14:07:12.661830
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8f3d2b6a1e94'
+down_revision: Union[str, Sequence[str], None] = 'e1b7c94a2f05'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('api_specs', sa.Column('content_hash', sa.String(length=64), nullable=True))
+    op.add_column('api_specs', sa.Column('file_path', sa.String(), nullable=True))
+    op.create_index(op.f('ix_api_specs_content_hash'), 'api_specs', ['content_hash'], unique=False)
+    op.add_column('jobs', sa.Column('content_hash', sa.String(length=64), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.batch_alter_table('jobs') as batch_op:
+        batch_op.drop_column('content_hash')
+    op.drop_index(op.f('ix_api_specs_content_hash'), table_name='api_specs')
+    with op.batch_alter_table('api_specs') as batch_op:
+        batch_op.drop_column('file_path')
+        batch_op.drop_column('content_hash')
@@ -0,0 +1,37 @@
+"""Add test result timings
+
+Revision ID: 9d4a7c1e6b53
+Revises: 0b7d5e2c9a48
+Create Date: 2026-10-17 18:40:52.310947
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9d4a7c1e6b53'
+down_revision: Union[str, Sequence[str], None] = '0b7d5e2c9a48'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('test_results', sa.Column('latency_ms', sa.Float(), nullable=True))
+    op.add_column('test_results', sa.Column('connect_ms', sa.Float(), nullable=True))
+    op.add_column('test_results', sa.Column('tls_ms', sa.Float(), nullable=True))
+    op.add_column('test_results', sa.Column('ttfb_ms', sa.Float(), nullable=True))
+    op.add_column('test_results', sa.Column('response_bytes', sa.Integer(), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.batch_alter_table('test_results') as batch_op:
+        batch_op.drop_column('response_bytes')
+        batch_op.drop_column('ttfb_ms')
+        batch_op.drop_column('tls_ms')
+        batch_op.drop_column('connect_ms')
+        batch_op.drop_column('latency_ms')
@@ -0,0 +1,29 @@
+"""Add test case category
+
+Revision ID: a3e59d7c0b62
+Revises: c6a4f8e2d7b3
+Create Date: 2026-10-17 16:40:03.572219
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a3e59d7c0b62'
+down_revision: Union[str, Sequence[str], None] = 'c6a4f8e2d7b3'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('test_cases', sa.Column('category', sa.String(), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.batch_alter_table('test_cases') as batch_op:
+        batch_op.drop_column('category')
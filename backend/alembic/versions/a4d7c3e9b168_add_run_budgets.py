@@ -0,0 +1,31 @@
+"""Add fail-fast and time budget limits to test runs
+
+Revision ID: a4d7c3e9b168
+Revises: e5c9b2d7f814
+Create Date: 2026-10-17 23:41:05.318274
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a4d7c3e9b168'
+down_revision: Union[str, Sequence[str], None] = 'e5c9b2d7f814'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('test_runs', sa.Column('fail_fast', sa.Integer(), nullable=True))
+    op.add_column('test_runs', sa.Column('time_budget', sa.Float(), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.batch_alter_table('test_runs') as batch_op:
+        batch_op.drop_column('time_budget')
+        batch_op.drop_column('fail_fast')
@@ -0,0 +1,53 @@
+"""Add test runs
+
+Revision ID: b4e8d1c3f2a7
+Revises: 7c1f2a9d4b6e
+Create Date: 2026-10-17 10:04:27.903114
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b4e8d1c3f2a7'
+down_revision: Union[str, Sequence[str], None] = '7c1f2a9d4b6e'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('test_runs',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('spec_id', sa.Integer(), nullable=True),
+    sa.Column('status', sa.String(), nullable=False),
+    sa.Column('started_at', sa.DateTime(), nullable=True),
+    sa.Column('finished_at', sa.DateTime(), nullable=True),
+    sa.Column('total_tests', sa.Integer(), nullable=True),
+    sa.Column('passed', sa.Integer(), nullable=True),
+    sa.Column('failed', sa.Integer(), nullable=True),
+    sa.Column('duration_ms', sa.Integer(), nullable=True),
+    sa.ForeignKeyConstraint(['spec_id'], ['api_specs.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_test_runs_id'), 'test_runs', ['id'], unique=False)
+    op.create_index(op.f('ix_test_runs_spec_id'), 'test_runs', ['spec_id'], unique=False)
+    # SQLite can't add a foreign key in place, so recreate the table
+    with op.batch_alter_table('test_results') as batch_op:
+        batch_op.add_column(sa.Column('run_id', sa.Integer(), nullable=True))
+        batch_op.create_index(batch_op.f('ix_test_results_run_id'), ['run_id'], unique=False)
+        batch_op.create_foreign_key('fk_test_results_run_id_test_runs', 'test_runs', ['run_id'], ['id'])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.batch_alter_table('test_results') as batch_op:
+        batch_op.drop_constraint('fk_test_results_run_id_test_runs', type_='foreignkey')
+        batch_op.drop_index(batch_op.f('ix_test_results_run_id'))
+        batch_op.drop_column('run_id')
+    op.drop_index(op.f('ix_test_runs_spec_id'), table_name='test_runs')
+    op.drop_index(op.f('ix_test_runs_id'), table_name='test_runs')
+    op.drop_table('test_runs')
@@ -0,0 +1,83 @@
+"""Add scenarios
+
+Revision ID: b7f3e1a9c254
+Revises: 6c2e9a4f1d87
+Create Date: 2026-10-17 21:12:05.374118
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b7f3e1a9c254'
+down_revision: Union[str, Sequence[str], None] = '6c2e9a4f1d87'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('scenarios',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('spec_id', sa.Integer(), nullable=False),
+    sa.Column('name', sa.String(), nullable=False),
+    sa.Column('description', sa.Text(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['spec_id'], ['api_specs.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_scenarios_id'), 'scenarios', ['id'], unique=False)
+    op.create_index(op.f('ix_scenarios_spec_id'), 'scenarios', ['spec_id'], unique=False)
+    op.create_table('scenario_steps',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('scenario_id', sa.Integer(), nullable=False),
+    sa.Column('name', sa.String(), nullable=False),
+    sa.Column('position', sa.Integer(), nullable=False),
+    sa.Column('method', sa.String(), nullable=False),
+    sa.Column('endpoint', sa.String(), nullable=False),
+    sa.Column('payload', sa.Text(), nullable=True),
+    sa.Column('headers', sa.Text(), nullable=True),
+    sa.Column('depends_on', sa.Text(), nullable=True),
+    sa.Column('extract', sa.Text(), nullable=True),
+    sa.Column('expect_status', sa.Integer(), nullable=True),
+    sa.ForeignKeyConstraint(['scenario_id'], ['scenarios.id'], ),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('scenario_id', 'name', name='uq_scenario_steps_scenario_id_name')
+    )
+    op.create_index(op.f('ix_scenario_steps_id'), 'scenario_steps', ['id'], unique=False)
+    op.create_index(op.f('ix_scenario_steps_scenario_id'), 'scenario_steps', ['scenario_id'], unique=False)
+    op.create_table('scenario_results',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('run_id', sa.Integer(), nullable=False),
+    sa.Column('scenario_id', sa.Integer(), nullable=False),
+    sa.Column('step_id', sa.Integer(), nullable=False),
+    sa.Column('success', sa.Boolean(), nullable=False),
+    sa.Column('skipped', sa.Boolean(), nullable=False),
+    sa.Column('status', sa.Integer(), nullable=False),
+    sa.Column('latency_ms', sa.Float(), nullable=True),
+    sa.Column('extracted', sa.Text(), nullable=True),
+    sa.Column('error', sa.Text(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['run_id'], ['test_runs.id'], ),
+    sa.ForeignKeyConstraint(['scenario_id'], ['scenarios.id'], ),
+    sa.ForeignKeyConstraint(['step_id'], ['scenario_steps.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_scenario_results_id'), 'scenario_results', ['id'], unique=False)
+    op.create_index(op.f('ix_scenario_results_run_id'), 'scenario_results', ['run_id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_scenario_results_run_id'), table_name='scenario_results')
+    op.drop_index(op.f('ix_scenario_results_id'), table_name='scenario_results')
+    op.drop_table('scenario_results')
+    op.drop_index(op.f('ix_scenario_steps_scenario_id'), table_name='scenario_steps')
+    op.drop_index(op.f('ix_scenario_steps_id'), table_name='scenario_steps')
+    op.drop_table('scenario_steps')
+    op.drop_index(op.f('ix_scenarios_spec_id'), table_name='scenarios')
+    op.drop_index(op.f('ix_scenarios_id'), table_name='scenarios')
+    op.drop_table('scenarios')
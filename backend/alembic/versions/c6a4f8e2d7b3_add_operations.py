@@ -0,0 +1,52 @@
+"""Add operations
+
+Revision ID: c6a4f8e2d7b3
+Revises: 8f3d2b6a1e94
+Create Date: 2026-10-17 15:26:50.118372
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c6a4f8e2d7b3'
+down_revision: Union[str, Sequence[str], None] = '8f3d2b6a1e94'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('operations',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('spec_id', sa.Integer(), nullable=False),
+    sa.Column('key', sa.String(), nullable=False),
+    sa.Column('path', sa.String(), nullable=False),
+    sa.Column('method', sa.String(), nullable=False),
+    sa.Column('operation_id', sa.String(), nullable=True),
+    sa.Column('definition', sa.Text(), nullable=False),
+    sa.Column('parameters', sa.Text(), nullable=True),
+    sa.Column('request_body', sa.Text(), nullable=True),
+    sa.Column('responses', sa.Text(), nullable=True),
+    sa.Column('definition_hash', sa.String(length=64), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.Column('updated_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['spec_id'], ['api_specs.id'], ),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('spec_id', 'key', name='uq_operations_spec_id_key')
+    )
+    op.create_index(op.f('ix_operations_id'), 'operations', ['id'], unique=False)
+    op.create_index(op.f('ix_operations_spec_id'), 'operations', ['spec_id'], unique=False)
+    op.add_column('api_specs', sa.Column('base_url', sa.String(), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.batch_alter_table('api_specs') as batch_op:
+        batch_op.drop_column('base_url')
+    op.drop_index(op.f('ix_operations_spec_id'), table_name='operations')
+    op.drop_index(op.f('ix_operations_id'), table_name='operations')
+    op.drop_table('operations')
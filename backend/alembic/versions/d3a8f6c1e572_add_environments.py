@@ -0,0 +1,51 @@
+"""Add environments
+
+Revision ID: d3a8f6c1e572
+Revises: b7f3e1a9c254
+Create Date: 2026-10-17 22:04:39.612847
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd3a8f6c1e572'
+down_revision: Union[str, Sequence[str], None] = 'b7f3e1a9c254'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('environments',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('spec_id', sa.Integer(), nullable=False),
+    sa.Column('name', sa.String(), nullable=False),
+    sa.Column('base_url', sa.String(), nullable=False),
+    sa.Column('headers', sa.Text(), nullable=True),
+    sa.Column('auth', sa.Text(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.Column('updated_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['spec_id'], ['api_specs.id'], ),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('spec_id', 'name', name='uq_environments_spec_id_name')
+    )
+    op.create_index(op.f('ix_environments_id'), 'environments', ['id'], unique=False)
+    op.create_index(op.f('ix_environments_spec_id'), 'environments', ['spec_id'], unique=False)
+    with op.batch_alter_table('test_runs') as batch_op:
+        batch_op.add_column(sa.Column('environment_id', sa.Integer(), nullable=True))
+        batch_op.create_foreign_key('fk_test_runs_environment_id_environments', 'environments',
+                                    ['environment_id'], ['id'])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.batch_alter_table('test_runs') as batch_op:
+        batch_op.drop_constraint('fk_test_runs_environment_id_environments', type_='foreignkey')
+        batch_op.drop_column('environment_id')
+    op.drop_index(op.f('ix_environments_spec_id'), table_name='environments')
+    op.drop_index(op.f('ix_environments_id'), table_name='environments')
+    op.drop_table('environments')
@@ -0,0 +1,38 @@
+"""Add generated test cache
+
+Revision ID: d92a6f0e5c18
+Revises: b4e8d1c3f2a7
+Create Date: 2026-10-17 11:21:08.346552
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd92a6f0e5c18'
+down_revision: Union[str, Sequence[str], None] = 'b4e8d1c3f2a7'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('generated_test_cache',
+    sa.Column('key', sa.String(length=64), nullable=False),
+    sa.Column('model', sa.String(), nullable=False),
+    sa.Column('tests', sa.Text(), nullable=False),
+    sa.Column('size_bytes', sa.Integer(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.Column('last_used_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('key')
+    )
+    op.create_index(op.f('ix_generated_test_cache_last_used_at'), 'generated_test_cache', ['last_used_at'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_generated_test_cache_last_used_at'), table_name='generated_test_cache')
+    op.drop_table('generated_test_cache')
@@ -0,0 +1,36 @@
+"""Add spec versions
+
+Revision ID: e1b7c94a2f05
+Revises: 5a0c7e3b9d21
+Create Date: 2026-10-17 13:15:39.204417
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e1b7c94a2f05'
+down_revision: Union[str, Sequence[str], None] = '5a0c7e3b9d21'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('api_specs', sa.Column('version', sa.Integer(), nullable=False, server_default='1'))
+    op.add_column('test_cases', sa.Column('operation_key', sa.String(), nullable=True))
+    op.add_column('test_cases', sa.Column('spec_version', sa.Integer(), nullable=True, server_default='1'))
+    op.create_index(op.f('ix_test_cases_operation_key'), 'test_cases', ['operation_key'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_test_cases_operation_key'), table_name='test_cases')
+    with op.batch_alter_table('test_cases') as batch_op:
+        batch_op.drop_column('spec_version')
+        batch_op.drop_column('operation_key')
+    with op.batch_alter_table('api_specs') as batch_op:
+        batch_op.drop_column('version')
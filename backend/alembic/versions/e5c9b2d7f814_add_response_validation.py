@@ -0,0 +1,32 @@
+"""Add response validation results
+
+Revision ID: e5c9b2d7f814
+Revises: d3a8f6c1e572
+Create Date: 2026-10-17 22:48:17.205631
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e5c9b2d7f814'
+down_revision: Union[str, Sequence[str], None] = 'd3a8f6c1e572'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('test_results', sa.Column('validation_errors', sa.Text(), nullable=True))
+    op.add_column('load_stats', sa.Column('invalid', sa.Integer(), nullable=False, server_default='0'))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.batch_alter_table('load_stats') as batch_op:
+        batch_op.drop_column('invalid')
+    with op.batch_alter_table('test_results') as batch_op:
+        batch_op.drop_column('validation_errors')
@@ -0,0 +1,31 @@
+"""Add test run mode and summary
+
+Revision ID: f2c81a6d4e39
+Revises: a3e59d7c0b62
+Create Date: 2026-10-17 17:25:41.209633
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f2c81a6d4e39'
+down_revision: Union[str, Sequence[str], None] = 'a3e59d7c0b62'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('test_runs', sa.Column('mode', sa.String(), nullable=False, server_default='functional'))
+    op.add_column('test_runs', sa.Column('summary', sa.Text(), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.batch_alter_table('test_runs') as batch_op:
+        batch_op.drop_column('summary')
+        batch_op.drop_column('mode')
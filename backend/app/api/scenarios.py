@@ -0,0 +1,69 @@
+from fastapi import APIRouter, HTTPException, Depends
+from pydantic import BaseModel, Field
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from typing import Any, Dict, List, Optional
+from core import db, models, scenarios
+
+router = APIRouter()
+
+
+class StepIn(BaseModel):
+    name: str = Field(..., min_length=1)
+    method: str = Field(..., pattern="(?i)^(get|put|post|delete|options|head|patch)$")
+    endpoint: str
+    payload: Any = None
+    headers: Dict[str, str] = {}
+    depends_on: List[str] = []
+    extract: Dict[str, str] = {}
+    expect_status: Optional[int] = Field(None, ge=100, le=599)
+
+
+class ScenarioIn(BaseModel):
+    name: str = Field(..., min_length=1)
+    description: Optional[str] = None
+    steps: List[StepIn]
+
+
+@router.post("/{spec_id}")
+def create_scenario(spec_id: int, body: ScenarioIn, session: Session = Depends(db.get_session)):
+    """Define a scenario. Steps run once their ``depends_on`` steps succeeded, and use values
+    extracted upstream as ``{{name}}`` (run it with ``POST /api/tests/run/{spec_id}?mode=scenario``).
+    """
+    if not session.get(models.APISpec, spec_id):
+        raise HTTPException(status_code=404, detail="Spec not found")
+    try:
+        scenario = scenarios.create_scenario(session, spec_id, body.name, [s.model_dump() for s in body.steps],
+                                             description=body.description)
+    except scenarios.ScenarioError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    return scenarios.scenario_dict(scenario)
+
+
+@router.get("/{spec_id}")
+async def list_scenarios(spec_id: int, session: AsyncSession = Depends(db.get_read_session)):
+    def _read(session: Session):
+        return {"spec_id": spec_id,
+                "scenarios": [scenarios.scenario_dict(s) for s in scenarios.scenarios_query(session, spec_id)]}
+
+    return await session.run_sync(_read)
+
+
+@router.get("/{spec_id}/{scenario_id}")
+async def get_scenario(spec_id: int, scenario_id: int, session: AsyncSession = Depends(db.get_read_session)):
+    def _read(session: Session):
+        scenario = scenarios.scenarios_query(session, spec_id, scenario_id).first()
+        if not scenario:
+            raise HTTPException(status_code=404, detail="Scenario not found")
+        return scenarios.scenario_dict(scenario)
+
+    return await session.run_sync(_read)
+
+
+@router.delete("/{spec_id}/{scenario_id}")
+def delete_scenario(spec_id: int, scenario_id: int, session: Session = Depends(db.get_session)):
+    scenario = scenarios.scenarios_query(session, spec_id, scenario_id).first()
+    if not scenario:
+        raise HTTPException(status_code=404, detail="Scenario not found")
+    scenarios.delete_scenario(session, scenario)
+    return {"spec_id": spec_id, "scenario_id": scenario_id, "message": "Scenario deleted"}
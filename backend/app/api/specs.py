@@ -1,8 +1,13 @@
 from fastapi import APIRouter, UploadFile, File, HTTPException, Depends
+from fastapi.concurrency import run_in_threadpool
+from pydantic import BaseModel
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from core import db, models, test_generator
+from typing import Any, Dict, Optional
+from core import db, models, operations, environments
+from core.spec_parser import store_upload
+from workers import jobs
 import json
-import shutil
 import os
 
 router = APIRouter()
@@ -13,56 +18,134 @@ os.makedirs(UPLOAD_DIR, exist_ok=True)
 
 @router.post("/upload")
 async def upload_spec(file: UploadFile = File(...), session: Session = Depends(db.get_session)):
-    # 1️⃣ Save the uploaded file locally
-    file_path = os.path.join(UPLOAD_DIR, file.filename)
-    with open(file_path, "wb") as f:
-        shutil.copyfileobj(file.file, f)
+    # 1️⃣ Stream the uploaded file to disk under its content hash (off the event loop)
+    content_hash, file_path = await run_in_threadpool(store_upload, file.file, UPLOAD_DIR, file.filename)
 
-    # 2️⃣ Parse JSON
-    try:
-        with open(file_path, "r", encoding="utf-8") as f:
-            spec_json = json.load(f)
-    except json.JSONDecodeError as e:
-        raise HTTPException(status_code=400, detail=f"Invalid JSON file: {str(e)}")
+    # 2️⃣ Queue parsing and test generation; the client polls the job for progress
+    job = models.Job(kind="ingest", status="queued", filename=file.filename, file_path=file_path,
+                     content_hash=content_hash)
+    session.add(job)
+    session.commit()
+    session.refresh(job)
+    jobs.submit(job)
 
-    # 3️⃣ Store spec in DB
-    try:
-        new_spec = models.APISpec(filename=file.filename, content=json.dumps(spec_json))
-        session.add(new_spec)
-        session.commit()
-        session.refresh(new_spec)
-    except Exception as e:
-        session.rollback()
-        raise HTTPException(status_code=500, detail=f"DB error: {str(e)}")
-
-    # 4️⃣ Generate AI tests
-    ai_tests = []
-    try:
-        ai_tests = test_generator.generate_ai_tests(json.dumps(spec_json))
-        print(f"Generated {len(ai_tests)} test cases")
-    except Exception as e:
-        print(f"AI test generation failed: {e}")
-        # Even if AI test generation fails, we continue to ensure the spec is processed
-
-    # 5️⃣ Save generated tests to DB
-    test_count = 0
-    for t in ai_tests:
-        try:
-            tc = models.TestCase(
-                spec_id=new_spec.id,
-                endpoint=t["endpoint"],
-                method=t["method"].upper(),
-                payload=json.dumps(t.get("payload", {}))
-            )
-            session.add(tc)
-            test_count += 1
-        except Exception as e:
-            print(f"Failed to save test case: {e}")
+    return {
+        "job_id": job.id,
+        "filename": file.filename,
+        "status": job.status,
+        "message": "Spec queued for test generation"
+    }
+
+
+@router.post("/{spec_id}/versions")
+async def upload_spec_version(spec_id: int, file: UploadFile = File(...), session: Session = Depends(db.get_session)):
+    """Upload a new version of an existing spec; only added or changed operations get new tests."""
+    if not session.get(models.APISpec, spec_id):
+        raise HTTPException(status_code=404, detail="Spec not found")
+
+    content_hash, file_path = await run_in_threadpool(store_upload, file.file, UPLOAD_DIR, file.filename)
+
+    job = models.Job(kind="ingest_version", status="queued", spec_id=spec_id, filename=file.filename,
+                     file_path=file_path, content_hash=content_hash)
+    session.add(job)
     session.commit()
+    session.refresh(job)
+    jobs.submit(job)
 
     return {
-        "spec_id": new_spec.id,
+        "job_id": job.id,
+        "spec_id": spec_id,
         "filename": file.filename,
-        "generated_tests": test_count,
-        "message": "Test cases generated successfully" if test_count > 0 else "No test cases generated - using fallback method"
-    }
\ No newline at end of file
+        "status": job.status,
+        "message": "New spec version queued for diffing and test generation"
+    }
+
+
+@router.get("/{spec_id}/operations")
+def list_operations(spec_id: int, session: Session = Depends(db.get_session)):
+    # Sync (threadpool): indexing a spec stored before operations were recorded writes and commits
+    spec = session.get(models.APISpec, spec_id)
+    if not spec:
+        raise HTTPException(status_code=404, detail="Spec not found")
+    operations.ensure_operations(session, spec)
+
+    return {
+        "spec_id": spec_id,
+        "version": spec.version,
+        "operations": [
+            {k: op[k] for k in ("id", "key", "path", "method", "operation_id", "parameters", "request_body", "hash")}
+            for op in operations.load_operations(session, spec_id)
+        ],
+    }
+
+
+class EnvironmentIn(BaseModel):
+    base_url: str
+    headers: Dict[str, str] = {}
+    auth: Optional[Dict[str, Any]] = None
+
+
+@router.put("/{spec_id}/environments/{name}")
+def save_environment(spec_id: int, name: str, body: EnvironmentIn, session: Session = Depends(db.get_session)):
+    """Create or replace a named environment, e.g. ``staging``. ``auth`` is one of
+    ``{"type": "bearer", "token"}``, ``{"type": "basic", "username", "password"}``,
+    ``{"type": "api_key", "name", "value", "in": "header" | "query" | "cookie"}``,
+    ``{"type": "oauth2", "token_url", "client_id", "client_secret", "scope"}``, or
+    ``{"scheme": <name in the spec's securitySchemes>, ...the scheme's secrets}``.
+    """
+    if not session.get(models.APISpec, spec_id):
+        raise HTTPException(status_code=404, detail="Spec not found")
+    try:
+        env = environments.save_environment(session, spec_id, name, body.base_url, body.headers, body.auth)
+    except environments.EnvironmentConfigError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    return environments.environment_dict(env)
+
+
+@router.get("/{spec_id}/environments")
+async def list_environments(spec_id: int, session: AsyncSession = Depends(db.get_read_session)):
+    def _read(session: Session):
+        spec = session.get(models.APISpec, spec_id)
+        if not spec:
+            raise HTTPException(status_code=404, detail="Spec not found")
+        envs = session.query(models.Environment).filter(models.Environment.spec_id == spec_id)\
+            .order_by(models.Environment.name)
+        return {
+            "spec_id": spec_id,
+            "default": {"name": environments.DEFAULT_ENVIRONMENT, "base_url": spec.base_url},
+            "environments": [environments.environment_dict(env) for env in envs],
+        }
+
+    return await session.run_sync(_read)
+
+
+@router.delete("/{spec_id}/environments/{name}")
+def delete_environment(spec_id: int, name: str, session: Session = Depends(db.get_session)):
+    env = environments.get_environment(session, spec_id, name)
+    if not env:
+        raise HTTPException(status_code=404, detail="Environment not found")
+    try:
+        environments.delete_environment(session, env)
+    except environments.EnvironmentConfigError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return {"spec_id": spec_id, "name": name, "message": "Environment deleted"}
+
+
+@router.get("/jobs/{job_id}")
+async def get_job(job_id: int, session: AsyncSession = Depends(db.get_read_session)):
+    # Polled by clients while a job runs, so it reads through the async engine instead of blocking the loop
+    job = await session.get(models.Job, job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    return {
+        "job_id": job.id,
+        "kind": job.kind,
+        "status": job.status,
+        "filename": job.filename,
+        "spec_id": job.spec_id,
+        "progress": job.progress,
+        "total": job.total,
+        "result": json.loads(job.result) if job.result else None,
+        "error": job.error,
+    }
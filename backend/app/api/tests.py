@@ -1,87 +1,427 @@
-from fastapi import APIRouter, BackgroundTasks, HTTPException
+from fastapi import APIRouter, BackgroundTasks, HTTPException, Depends, Query
+from fastapi.responses import StreamingResponse
+from sqlalchemy import func
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from core import db
-import requests
+from typing import Optional
+from core import db, models, runs, performance, capture, events, run_queue, scenarios, environments
+from core import response_validation, prioritization
+from workers import test_runner, fuzzer, load_runner, scenario_runner
+from workers.result_writer import ResultWriter
+import asyncio
 import json
 
 router = APIRouter()
 
-# Run a single test case
-def run_test_case(test_case, session: Session):
+# Rows fetched per round trip when streaming results
+STREAM_BATCH_SIZE = 500
+
+
+# Seconds between keep-alive comments on an idle event stream
+SSE_KEEPALIVE = 15
+
+
+async def _run_and_record(test_cases, writer: ResultWriter, progress: events.RunProgress, target: dict,
+                          validators: response_validation.SpecValidators, budget: test_runner.RunBudget = None):
+    def on_result(result):
+        writer.add(result)
+        progress.record(result)
+
+    flusher = asyncio.create_task(writer.flush_periodically())
     try:
-        method = test_case.method.upper()
-        url = test_case.endpoint
-        payload = json.loads(test_case.payload or "{}")
-        response = requests.request(method, url, json=payload, timeout=10)
-
-        test_result = db.models.TestResult(
-            test_case_id=test_case.id,
-            success=response.status_code >= 200 and response.status_code < 300,
-            status=response.status_code
-        )
-        session.add(test_result)
-        session.commit()
-    except Exception as e:
-        print(f"Error running test {test_case.id}: {e}")
-        test_result = db.models.TestResult(
-            test_case_id=test_case.id,
-            success=False,
-            status=0
-        )
-        session.add(test_result)
-        session.commit()
+        return await test_runner.run_test_cases(test_cases, on_result=on_result, target=target,
+                                                validators=validators, budget=budget)
+    finally:
+        flusher.cancel()
 
 
-def run_tests_background(spec_id: int):
-    session: Session = db.get_session()
-    test_cases = session.query(db.models.TestCase).filter(db.models.TestCase.spec_id == spec_id).all()
-    for tc in test_cases:
-        run_test_case(tc, session)
+def run_tests_background(spec_id: int, run_id: int, changed_only: bool = False, prioritized: bool = False):
+    # Sessions are only open around the DB work, never while requests are in flight
+    try:
+        with db.SessionLocal() as session:
+            # Before the cases: indexing a spec's operations commits, which would expire them
+            validators = response_validation.spec_validators(session, spec_id)
+            test_cases = runs.test_cases_query(session, spec_id, changed_only).all()
+            if prioritized:
+                test_cases = prioritization.prioritize(session, spec_id, test_cases)
+            run = session.get(models.TestRun, run_id)
+            target = environments.run_target(session, run)
+            limits = (run.fail_fast, run.time_budget)
+
+        # Results go through the writer's own dedicated session
+        with ResultWriter(run_id=run_id) as writer:
+            budget = test_runner.RunBudget(*limits) if any(limits) else None
+            progress = events.RunProgress(run_id, len(test_cases))
+            results = asyncio.run(_run_and_record(test_cases, writer, progress, target, validators, budget))
+        passed = sum(1 for r in results if r["success"])
+
+        with db.SessionLocal() as session:
+            run = session.get(models.TestRun, run_id)
+            if prioritized:
+                runs.update_summary(run, order="priority")
+            if budget is not None and budget.skipped:
+                runs.update_summary(run, stopped=budget.reason, skipped=budget.skipped)
+            baseline = performance.previous_run(session, run)
+            if baseline:
+                regressions = performance.latency_regressions(session, run_id, baseline.id)
+                runs.update_summary(run, baseline_run_id=baseline.id, latency_regressions=regressions)
+            runs.finish_run(session, run, passed=passed, failed=len(results) - passed)
+            runs.compact_runs(session, spec_id)
+    except Exception as e:
+        print(f"Test run {run_id} failed: {e}")
+        runs.fail_run(run_id)
 
 
 @router.post("/run/{spec_id}")
-async def run_tests(spec_id: int, background_tasks: BackgroundTasks):
-    session: Session = db.get_session()
-    spec = session.query(db.models.APISpec).filter(db.models.APISpec.id == spec_id).first()
+def run_tests(spec_id: int, background_tasks: BackgroundTasks, changed_only: bool = False,
+              mode: str = Query("functional", pattern="^(functional|fuzz|load|scenario)$"),
+              model: str = Query("closed", pattern="^(open|closed)$"),
+              duration: Optional[float] = Query(None, gt=0, le=3600),
+              rps: Optional[float] = Query(None, gt=0),
+              concurrency: Optional[int] = Query(None, ge=1, le=1000),
+              max_requests: Optional[int] = Query(None, ge=1),
+              distributed: bool = False,
+              scenario_id: Optional[int] = None,
+              environment: Optional[str] = None,
+              order: str = Query("default", pattern="^(default|priority)$"),
+              fail_fast: Optional[int] = Query(None, ge=1),
+              time_budget: Optional[float] = Query(None, gt=0, le=86400),
+              session: Session = Depends(db.get_session)):
+    """Start a run of the spec's test cases.
+
+    Requests go to the named ``environment`` (its base URL, headers and
+    credentials), or by default to the spec's own server URL.
+
+    ``changed_only`` runs just the cases generated for the latest spec version.
+    ``mode=fuzz`` instead mutates the spec's cases for ``duration`` seconds at up
+    to ``rps`` requests per second (``concurrency``, ``max_requests`` bound it further).
+    ``mode=load`` replays the cases for ``duration`` seconds, either with
+    ``concurrency`` virtual users (``model=closed``) or at a fixed ``rps``
+    arrival rate (``model=open``), and records per-endpoint latency histograms.
+    ``distributed`` (functional runs) queues the cases in batches for
+    ``python -m workers`` processes instead of running them in this server.
+    ``mode=scenario`` runs the spec's scenarios (or just ``scenario_id``),
+    each as a DAG of dependent steps.
+
+    For CI, functional runs take ``order=priority`` (recently failed, flaky
+    and changed-operation cases first, from the stored result history) and
+    stop early after ``fail_fast`` failures or ``time_budget`` seconds; the
+    run's summary then reports why it stopped and how many cases it skipped.
+    """
+    spec = session.query(models.APISpec).filter(models.APISpec.id == spec_id).first()
     if not spec:
         raise HTTPException(status_code=404, detail="Spec not found")
+    if mode == "scenario" and not scenarios.scenarios_query(session, spec_id, scenario_id).first():
+        raise HTTPException(status_code=404, detail="No scenarios defined for this spec")
+    env = None
+    if environment and environment != environments.DEFAULT_ENVIRONMENT:
+        env = environments.get_environment(session, spec_id, environment)
+        if not env:
+            raise HTTPException(status_code=404, detail=f"Environment '{environment}' not found")
+
+    # Results are kept per run, so starting one is a single insert
+    functional = mode == "functional"
+    run = runs.start_run(session, spec_id, changed_only, mode=mode, environment_id=env.id if env else None,
+                         fail_fast=fail_fast if functional else None,
+                         time_budget=time_budget if functional else None)
+    prioritized = order == "priority"
 
-    # Clear previous results for fresh run
-    session.query(db.models.TestResult).filter(db.models.TestResult.test_case.has(spec_id=spec_id)).delete()
-    session.commit()
+    # Unset limits fall back to each mode's configured defaults
+    limits = {k: v for k, v in {"duration": duration, "rps": rps, "concurrency": concurrency}.items() if v is not None}
 
     # Run tests in background
-    background_tasks.add_task(run_tests_background, spec_id)
+    if mode == "fuzz":
+        background_tasks.add_task(fuzzer.run_fuzz_background, spec_id, run.id, max_requests=max_requests, **limits)
+    elif mode == "scenario":
+        background_tasks.add_task(scenario_runner.run_scenarios_background, spec_id, run.id, scenario_id)
+    elif mode == "load":
+        background_tasks.add_task(load_runner.run_load_background, spec_id, run.id, model=model,
+                                  changed_only=changed_only, **limits)
+    elif distributed:
+        batches = run_queue.enqueue_run(session, run, changed_only, prioritized=prioritized)
+        return {"spec_id": spec_id, "run_id": run.id, "mode": mode, "batches": batches,
+                "message": "Tests queued for workers"}
+    else:
+        background_tasks.add_task(run_tests_background, spec_id, run.id, changed_only, prioritized)
 
-    return {"spec_id": spec_id, "message": "Tests started in background"}
+    return {"spec_id": spec_id, "run_id": run.id, "mode": mode, "message": "Tests started in background"}
 
 
-@router.get("/status/{spec_id}")
-async def get_test_status(spec_id: int):
-    session: Session = db.get_session()
-    test_cases = session.query(db.models.TestCase).filter(db.models.TestCase.spec_id == spec_id).all()
-    if not test_cases:
-        raise HTTPException(status_code=404, detail="No test cases found for this spec")
-
-    results = []
-    for tc in test_cases:
-        last_result = session.query(db.models.TestResult).filter(db.models.TestResult.test_case_id == tc.id)\
-                        .order_by(db.models.TestResult.id.desc()).first()
-        if last_result:
-            results.append({
-                "test_case_id": tc.id,
-                "endpoint": tc.endpoint,
-                "method": tc.method,
-                "success": last_result.success,
-                "status": last_result.status
-            })
+@router.get("/runs/{spec_id}")
+async def list_runs(spec_id: int, limit: int = Query(20, ge=1, le=200),
+                    session: AsyncSession = Depends(db.get_read_session)):
+    def _read(session: Session):
+        test_runs = session.query(models.TestRun).filter(models.TestRun.spec_id == spec_id)\
+            .order_by(models.TestRun.id.desc()).limit(limit).all()
+        return {
+            "spec_id": spec_id,
+            "runs": [
+                {
+                    "run_id": r.id,
+                    "mode": r.mode,
+                    "environment_id": r.environment_id,
+                    "fail_fast": r.fail_fast,
+                    "time_budget": r.time_budget,
+                    "status": r.status,
+                    "started_at": r.started_at,
+                    "finished_at": r.finished_at,
+                    "total_tests": r.total_tests,
+                    "passed": r.passed,
+                    "failed": r.failed,
+                    "duration_ms": r.duration_ms,
+                    "summary": json.loads(r.summary) if r.summary else None,
+                }
+                for r in test_runs
+            ],
+        }
+
+    return await session.run_sync(_read)
+
+
+def _sse(event_type: str, data: dict) -> str:
+    return f"event: {event_type}\ndata: {json.dumps(data, default=str)}\n\n"
+
+
+async def _finished_status(run_id: int):
+    async with db.AsyncReadSessionLocal() as session:
+        run = await session.get(models.TestRun, run_id)
+        if run is None or run.status == "running":
+            return None
+        return {"status": run.status, "counters": runs.run_counters(run)}
+
+
+@router.get("/runs/{spec_id}/{run_id}/events")
+async def stream_run_events(spec_id: int, run_id: int, session: AsyncSession = Depends(db.get_read_session)):
+    """Server-Sent Events for a run: a ``snapshot`` of its counters, then a ``result`` event per
+    test case as the runner produces it, and ``finished`` at the end.
+
+    Events come from the in-process broker; the database is read once, on connect.
+    """
+    # Subscribe before reading the run so a finish in between is not missed
+    sub = events.broker.subscribe(run_id)
+    try:
+        run = await session.get(models.TestRun, run_id)
+        if not run or run.spec_id != spec_id:
+            raise HTTPException(status_code=404, detail="Run not found")
+        status, mode = run.status, run.mode
+        counters = events.broker.counters(run_id) or runs.run_counters(run)
+    except Exception:
+        events.broker.unsubscribe(sub)
+        raise
+    finally:
+        # Release the connection now rather than when the (long-lived) stream ends
+        await session.close()
+
+    async def stream():
+        try:
+            yield _sse("snapshot", {"run_id": run_id, "mode": mode, "status": status, "counters": counters})
+            if status != "running":
+                yield _sse("finished", {"status": status, "counters": counters})
+                return
+            while True:
+                try:
+                    event = await asyncio.wait_for(sub.get(), timeout=SSE_KEEPALIVE)
+                except asyncio.TimeoutError:
+                    # Runs executed by queue workers finish in another process, out of the broker's sight
+                    finished = await _finished_status(run_id)
+                    if finished:
+                        yield _sse("finished", finished)
+                        return
+                    yield ": keep-alive\n\n"
+                    continue
+                if event["type"] == "result" and sub.dropped:
+                    event = {**event, "dropped": sub.dropped}
+                yield _sse(event["type"], {k: v for k, v in event.items() if k != "type"})
+                if event["type"] == "finished":
+                    return
+        finally:
+            events.broker.unsubscribe(sub)
+
+    return StreamingResponse(stream(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
+@router.get("/runs/{spec_id}/{run_id}/load")
+async def get_load_stats(spec_id: int, run_id: int, session: AsyncSession = Depends(db.get_read_session)):
+    """Per-endpoint latency percentiles, throughput and error rates of a load run."""
+    def _read(session: Session):
+        run = session.query(models.TestRun)\
+            .filter(models.TestRun.id == run_id, models.TestRun.spec_id == spec_id).first()
+        if not run or run.mode != "load":
+            raise HTTPException(status_code=404, detail="Load run not found")
+        stats = session.query(models.LoadStat).filter(models.LoadStat.run_id == run_id)\
+            .order_by(models.LoadStat.endpoint)
+        return {
+            "spec_id": spec_id,
+            "run_id": run_id,
+            "status": run.status,
+            "summary": json.loads(run.summary) if run.summary else None,
+            "endpoints": [load_runner.stats_dict(row) for row in stats],
+        }
+
+    return await session.run_sync(_read)
+
+
+@router.get("/runs/{spec_id}/{run_id}/scenarios")
+async def get_scenario_results(spec_id: int, run_id: int, session: AsyncSession = Depends(db.get_read_session)):
+    """Step by step outcome of each scenario in a scenario run, including the values extracted."""
+    def _read(session: Session):
+        run = session.query(models.TestRun)\
+            .filter(models.TestRun.id == run_id, models.TestRun.spec_id == spec_id).first()
+        if not run or run.mode != "scenario":
+            raise HTTPException(status_code=404, detail="Scenario run not found")
+        return {
+            "spec_id": spec_id,
+            "run_id": run_id,
+            "status": run.status,
+            "summary": json.loads(run.summary) if run.summary else None,
+            "scenarios": scenario_runner.results_by_scenario(session, run_id),
+        }
+
+    return await session.run_sync(_read)
+
+
+@router.get("/performance/{spec_id}")
+async def get_performance_report(spec_id: int, run_id: Optional[int] = None, limit: int = Query(10, ge=1, le=100),
+                                 session: AsyncSession = Depends(db.get_read_session)):
+    """Slowest endpoints of a run and the endpoints whose latency regressed since the previous run.
+
+    Defaults to the spec's latest completed functional run.
+    """
+    def _read(session: Session):
+        query = session.query(models.TestRun).filter(models.TestRun.spec_id == spec_id)
+        if run_id is not None:
+            run = query.filter(models.TestRun.id == run_id).first()
         else:
-            results.append({
-                "test_case_id": tc.id,
-                "endpoint": tc.endpoint,
-                "method": tc.method,
-                "success": None,
-                "status": None
-            })
-
-    return {"spec_id": spec_id, "total_tests": len(test_cases), "results": results}
+            run = query.filter(models.TestRun.mode == "functional", models.TestRun.status == "completed")\
+                .order_by(models.TestRun.id.desc()).first()
+        if not run:
+            raise HTTPException(status_code=404, detail="Run not found")
+
+        baseline = performance.previous_run(session, run)
+        return {
+            "spec_id": spec_id,
+            "run_id": run.id,
+            "baseline_run_id": baseline.id if baseline else None,
+            "slowest_endpoints": performance.slowest_endpoints(session, run.id, limit),
+            "latency_regressions": performance.latency_regressions(session, run.id, baseline.id) if baseline else [],
+        }
+
+    return await session.run_sync(_read)
+
+
+def latest_results_query(session: Session, spec_id: int, success: Optional[bool] = None,
+                         method: Optional[str] = None, endpoint_prefix: Optional[str] = None,
+                         status: Optional[int] = None, run_id: Optional[int] = None):
+    """Each test case of a spec joined with its most recent result (if any), in one query.
+
+    With ``run_id`` only results recorded by that run are considered.
+    """
+    latest = (
+        session.query(models.TestResult.test_case_id, func.max(models.TestResult.id).label("result_id"))
+        .join(models.TestCase, models.TestCase.id == models.TestResult.test_case_id)
+        .filter(models.TestCase.spec_id == spec_id)
+    )
+    if run_id is not None:
+        latest = latest.filter(models.TestResult.run_id == run_id)
+    latest = latest.group_by(models.TestResult.test_case_id).subquery()
+    query = (
+        session.query(
+            models.TestCase.id.label("test_case_id"),
+            models.TestCase.endpoint,
+            models.TestCase.method,
+            models.TestResult.success,
+            models.TestResult.status,
+            models.TestResult.latency_ms,
+            models.TestResult.response_bytes,
+            models.TestResult.validation_errors,
+        )
+        .filter(models.TestCase.spec_id == spec_id)
+        .outerjoin(latest, latest.c.test_case_id == models.TestCase.id)
+        .outerjoin(models.TestResult, models.TestResult.id == latest.c.result_id)
+        .order_by(models.TestCase.id)
+    )
+    if success is not None:
+        query = query.filter(models.TestResult.success == success)
+    if method:
+        query = query.filter(models.TestCase.method == method.upper())
+    if endpoint_prefix:
+        query = query.filter(models.TestCase.endpoint.startswith(endpoint_prefix, autoescape=True))
+    if status is not None:
+        query = query.filter(models.TestResult.status == status)
+    return query
+
+
+def result_dict(row) -> dict:
+    result = row._asdict()
+    if result["validation_errors"]:
+        result["validation_errors"] = json.loads(result["validation_errors"])
+    return result
+
+
+@router.get("/status/{spec_id}")
+async def get_test_status(spec_id: int, run_id: Optional[int] = None,
+                          session: AsyncSession = Depends(db.get_read_session)):
+    def _read(session: Session):
+        results = [result_dict(row) for row in latest_results_query(session, spec_id, run_id=run_id)]
+        if not results:
+            raise HTTPException(status_code=404, detail="No test cases found for this spec")
+
+        return {"spec_id": spec_id, "total_tests": len(results), "results": results}
+
+    return await session.run_sync(_read)
+
+
+@router.get("/results/{spec_id}")
+async def get_test_results(spec_id: int, cursor: Optional[int] = None, limit: int = Query(100, ge=1, le=1000),
+                           success: Optional[bool] = None, method: Optional[str] = None,
+                           endpoint_prefix: Optional[str] = None, status: Optional[int] = None,
+                           run_id: Optional[int] = None, session: AsyncSession = Depends(db.get_read_session)):
+    """Page through the latest result of each test case, ordered by test case id.
+
+    Pass the returned ``next_cursor`` back as ``cursor`` to get the next page.
+    """
+    def _read(session: Session):
+        query = latest_results_query(session, spec_id, success, method, endpoint_prefix, status, run_id)
+        if cursor is not None:
+            query = query.filter(models.TestCase.id > cursor)
+        rows = query.limit(limit + 1).all()
+
+        results = [result_dict(row) for row in rows[:limit]]
+        next_cursor = results[-1]["test_case_id"] if len(rows) > limit else None
+        return {"spec_id": spec_id, "results": results, "next_cursor": next_cursor}
+
+    return await session.run_sync(_read)
+
+
+@router.get("/captures/{run_id}/{test_case_id}")
+async def get_response_capture(run_id: int, test_case_id: int,
+                               session: AsyncSession = Depends(db.get_read_session)):
+    """The captured response of a test case in a run (only failures and sampled successes are kept)."""
+    def _read(session: Session):
+        row = session.query(models.ResponseCapture)\
+            .filter(models.ResponseCapture.run_id == run_id, models.ResponseCapture.test_case_id == test_case_id)\
+            .order_by(models.ResponseCapture.id.desc()).first()
+        if not row:
+            raise HTTPException(status_code=404, detail="No response captured for this test case and run")
+        return capture.capture_dict(row)
+
+    return await session.run_sync(_read)
+
+
+@router.get("/results/{spec_id}/stream")
+def stream_test_results(spec_id: int, success: Optional[bool] = None, method: Optional[str] = None,
+                        endpoint_prefix: Optional[str] = None, status: Optional[int] = None,
+                        run_id: Optional[int] = None):
+    """Stream the latest result of each test case as NDJSON, one row per line."""
+    def rows():
+        # The session has to outlive this handler, so it is owned by the generator
+        session: Session = db.SessionLocal()
+        try:
+            query = latest_results_query(session, spec_id, success, method, endpoint_prefix, status, run_id)
+            for row in query.execution_options(stream_results=True, yield_per=STREAM_BATCH_SIZE):
+                yield json.dumps(result_dict(row)) + "\n"
+        finally:
+            session.close()
+
+    return StreamingResponse(rows(), media_type="application/x-ndjson")
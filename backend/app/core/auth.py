@@ -0,0 +1,249 @@
+"""Authentication for test traffic: static credentials and cached OAuth2 client-credentials tokens.
+
+An environment's ``auth`` is either explicit (``{"type": "bearer", "token"}``,
+``basic``, ``api_key``, ``oauth2``) or names one of the spec's
+``securitySchemes`` and supplies only the secrets
+(``{"scheme": "oauth", "client_id", "client_secret"}``); header names, key
+locations and token URLs then come from the spec.
+
+OAuth2 tokens live in the process-wide ``tokens`` cache. They are refreshed
+ahead of expiry while requests keep using the current one, and concurrent
+requests share a single in-flight fetch, so a run of a thousand cases calls
+the token endpoint once.
+"""
+import asyncio
+import hashlib
+import json
+import os
+import threading
+import time
+from urllib.parse import urljoin
+import httpx
+
+# Refresh tokens this many seconds before they expire (at most half their lifetime)
+AUTH_TOKEN_REFRESH_MARGIN = float(os.getenv("AUTH_TOKEN_REFRESH_MARGIN", "60"))
+# Lifetime assumed when the token endpoint does not send expires_in
+AUTH_TOKEN_DEFAULT_TTL = float(os.getenv("AUTH_TOKEN_DEFAULT_TTL", "3600"))
+AUTH_TOKEN_TIMEOUT = float(os.getenv("AUTH_TOKEN_TIMEOUT", "10"))
+# After a failed fetch, requests fail fast for this many seconds instead of retrying it each
+AUTH_TOKEN_RETRY_AFTER = float(os.getenv("AUTH_TOKEN_RETRY_AFTER", "5"))
+
+AUTH_TYPES = {
+    "bearer": ("token",),
+    "basic": ("username", "password"),
+    "api_key": ("name", "value"),
+    "oauth2": ("token_url", "client_id", "client_secret"),
+}
+API_KEY_LOCATIONS = ("header", "query", "cookie")
+CLIENT_AUTH_METHODS = ("basic", "post")
+SECRET_FIELDS = ("token", "password", "value", "client_secret")
+
+
+class AuthConfigError(Exception):
+    pass
+
+
+class AuthError(Exception):
+    """A token could not be obtained."""
+
+
+def security_schemes(spec: dict) -> dict:
+    """``components.securitySchemes`` (OpenAPI 3) or ``securityDefinitions`` (Swagger 2)."""
+    return (spec.get("components") or {}).get("securitySchemes") or spec.get("securityDefinitions") or {}
+
+
+def from_scheme(name: str, scheme: dict, creds: dict, base_url: str = None) -> dict:
+    """Explicit auth config for a security scheme of the spec, filled with ``creds``."""
+    kind = (scheme.get("type") or "").lower()
+    if kind == "apikey":
+        return {"type": "api_key", "name": scheme.get("name"), "in": scheme.get("in", "header"),
+                "value": creds.get("value")}
+    if kind == "basic" or (kind == "http" and (scheme.get("scheme") or "").lower() == "basic"):
+        return {"type": "basic", "username": creds.get("username"), "password": creds.get("password")}
+    if kind == "http" and (scheme.get("scheme") or "").lower() == "bearer":
+        return {"type": "bearer", "token": creds.get("token")}
+    if kind == "oauth2":
+        # OpenAPI 3 nests flows; Swagger 2 has a flat "application" flow
+        flow = (scheme.get("flows") or {}).get("clientCredentials") \
+            or (scheme if scheme.get("flow") == "application" else None)
+        if flow is None:
+            raise AuthConfigError(f"Security scheme '{name}' has no client credentials flow")
+        token_url = creds.get("token_url") or flow.get("tokenUrl")
+        if token_url and base_url and not token_url.startswith(("http://", "https://")):
+            token_url = urljoin(base_url.rstrip("/") + "/", token_url)
+        return {"type": "oauth2", "token_url": token_url, "client_id": creds.get("client_id"),
+                "client_secret": creds.get("client_secret"),
+                "scope": creds.get("scope", " ".join(flow.get("scopes") or {})) or None,
+                "client_auth": creds.get("client_auth", "basic")}
+    raise AuthConfigError(f"Security scheme '{name}' ({kind or 'no type'}) is not supported")
+
+
+def validate(config: dict):
+    kind = config.get("type")
+    if kind not in AUTH_TYPES:
+        raise AuthConfigError(f"Auth type must be one of {', '.join(AUTH_TYPES)}")
+    missing = [f for f in AUTH_TYPES[kind] if not config.get(f)]
+    if missing:
+        raise AuthConfigError(f"{kind} auth needs {', '.join(missing)}")
+    if kind == "api_key" and config.get("in", "header") not in API_KEY_LOCATIONS:
+        raise AuthConfigError(f"API key location must be one of {', '.join(API_KEY_LOCATIONS)}")
+    if kind == "oauth2" and config.get("client_auth", "basic") not in CLIENT_AUTH_METHODS:
+        raise AuthConfigError(f"client_auth must be one of {', '.join(CLIENT_AUTH_METHODS)}")
+
+
+def resolve(auth: dict, spec: dict = None, base_url: str = None) -> dict:
+    """The explicit, validated config for an environment's ``auth`` (or None)."""
+    if not auth:
+        return None
+    if "scheme" in auth:
+        schemes = security_schemes(spec or {})
+        if auth["scheme"] not in schemes:
+            raise AuthConfigError(f"The spec declares no security scheme '{auth['scheme']}'")
+        creds = {k: v for k, v in auth.items() if k != "scheme"}
+        config = from_scheme(auth["scheme"], schemes[auth["scheme"]], creds, base_url)
+    else:
+        config = auth
+    validate(config)
+    return config
+
+
+def redacted(auth: dict) -> dict:
+    return {k: ("***" if k in SECRET_FIELDS else v) for k, v in auth.items()} if auth else auth
+
+
+class _Token:
+    __slots__ = ("value", "refresh_at", "expires_at")
+
+    def __init__(self, value: str, ttl: float, margin: float):
+        now = time.monotonic()
+        self.value = value
+        self.expires_at = now + ttl
+        self.refresh_at = now + ttl - min(margin, ttl / 2)
+
+
+class TokenManager:
+    """In-memory OAuth2 token cache with proactive, single-flight refresh.
+
+    A token past its refresh point is still handed out while one background
+    fetch replaces it; callers only wait when there is no unexpired token.
+    After a failed fetch none is retried for ``retry_after`` seconds: callers
+    keep getting the unexpired token, or the error once there is none.
+    In-flight fetches are per event loop (each background run has its own),
+    the cached tokens are shared by all of them.
+    """
+
+    def __init__(self, refresh_margin: float = AUTH_TOKEN_REFRESH_MARGIN,
+                 default_ttl: float = AUTH_TOKEN_DEFAULT_TTL, retry_after: float = AUTH_TOKEN_RETRY_AFTER):
+        self.refresh_margin = refresh_margin
+        self.default_ttl = default_ttl
+        self.retry_after = retry_after
+        self.fetches = 0
+        self._lock = threading.Lock()
+        self._tokens = {}
+        self._inflight = {}
+        self._failures = {}
+
+    @staticmethod
+    def key(config: dict) -> str:
+        fields = [config.get(f) for f in ("token_url", "client_id", "client_secret", "scope")]
+        return hashlib.sha256(json.dumps(fields).encode()).hexdigest()
+
+    async def get(self, config: dict) -> str:
+        key = self.key(config)
+        loop = asyncio.get_running_loop()
+        now = time.monotonic()
+        with self._lock:
+            token = self._tokens.get(key)
+            if token and now < token.refresh_at:
+                return token.value
+            failure = self._failures.get(key)
+            if failure and now < failure[1]:
+                # Backing off: no new fetch, the current token serves as long as it is valid
+                if token and now < token.expires_at:
+                    return token.value
+                raise failure[0]
+            task = self._inflight.get((loop, key))
+            if task is None:
+                task = loop.create_task(self._fetch(key, config))
+                self._inflight[(loop, key)] = task
+                task.add_done_callback(lambda t, k=key: self._done(loop, k, t))
+        if token and now < token.expires_at:
+            return token.value
+        # Shielded: one caller being cancelled must not cancel the fetch the others wait on
+        return await asyncio.shield(task)
+
+    def _done(self, loop, key: str, task: asyncio.Task):
+        error = None if task.cancelled() else task.exception()
+        with self._lock:
+            self._inflight.pop((loop, key), None)
+            if error is not None:
+                self._failures[key] = (error, time.monotonic() + self.retry_after)
+        if error is not None:
+            print(f"OAuth2 token fetch failed: {error}")
+
+    async def _fetch(self, key: str, config: dict) -> str:
+        data = {"grant_type": "client_credentials"}
+        if config.get("scope"):
+            data["scope"] = config["scope"]
+        client_auth = None
+        if config.get("client_auth", "basic") == "basic":
+            client_auth = (config["client_id"], config["client_secret"])
+        else:
+            data.update(client_id=config["client_id"], client_secret=config["client_secret"])
+
+        async with httpx.AsyncClient(timeout=AUTH_TOKEN_TIMEOUT) as client:
+            resp = await client.post(config["token_url"], data=data, auth=client_auth,
+                                     headers={"Accept": "application/json"})
+        if resp.status_code != 200:
+            raise AuthError(f"Token endpoint returned {resp.status_code}: {resp.text[:200]}")
+        try:
+            body = resp.json()
+            value = body["access_token"]
+        except (ValueError, KeyError, TypeError):
+            raise AuthError("Token endpoint response has no access_token")
+        token = _Token(value, float(body.get("expires_in") or self.default_ttl), self.refresh_margin)
+        with self._lock:
+            self._tokens[key] = token
+            self._failures.pop(key, None)
+            self.fetches += 1
+        return value
+
+
+tokens = TokenManager()
+
+
+class OAuth2ClientCredentials(httpx.Auth):
+    """Adds a cached client-credentials token to each request of an async client."""
+
+    def __init__(self, config: dict, manager: TokenManager = None):
+        self.config = config
+        self.manager = manager or tokens
+
+    async def async_auth_flow(self, request):
+        request.headers["Authorization"] = f"Bearer {await self.manager.get(self.config)}"
+        yield request
+
+    def sync_auth_flow(self, request):
+        raise RuntimeError("OAuth2 client credentials auth needs an async client")
+
+
+def client_auth(config: dict):
+    """``(headers, params, httpx auth)`` that apply an explicit auth config to a client."""
+    headers, params, auth = {}, {}, None
+    if not config:
+        return headers, params, auth
+    if config["type"] == "bearer":
+        headers["Authorization"] = f"Bearer {config['token']}"
+    elif config["type"] == "basic":
+        auth = (config["username"], config["password"])
+    elif config["type"] == "oauth2":
+        auth = OAuth2ClientCredentials(config)
+    else:
+        location = config.get("in", "header")
+        if location == "query":
+            params[config["name"]] = config["value"]
+        elif location == "cookie":
+            headers["Cookie"] = f"{config['name']}={config['value']}"
+        else:
+            headers[config["name"]] = config["value"]
+    return headers, params, auth
@@ -0,0 +1,73 @@
+import gzip
+import json
+import os
+import random
+
+try:
+    import zstandard
+    ZSTD_AVAILABLE = True
+except ImportError:
+    ZSTD_AVAILABLE = False
+
+# Response capture: "failures" keeps failed responses (plus a CAPTURE_SAMPLE_RATE share of successes),
+# "all" keeps every response, "off" keeps none. Bodies are truncated to CAPTURE_MAX_BYTES before compression.
+CAPTURE_RESPONSES = os.getenv("CAPTURE_RESPONSES", "failures").lower()
+CAPTURE_SAMPLE_RATE = float(os.getenv("CAPTURE_SAMPLE_RATE", "0.01"))
+CAPTURE_MAX_BYTES = int(os.getenv("CAPTURE_MAX_BYTES", "65536"))
+
+REDACTED_HEADERS = {"set-cookie", "authorization", "proxy-authorization"}
+
+_zstd_compressor = zstandard.ZstdCompressor(level=3) if ZSTD_AVAILABLE else None
+
+
+def should_capture(success: bool, mode: str = None, sample_rate: float = None) -> bool:
+    mode = mode or CAPTURE_RESPONSES
+    if mode == "off":
+        return False
+    if mode == "all" or not success:
+        return True
+    return random.random() < (CAPTURE_SAMPLE_RATE if sample_rate is None else sample_rate)
+
+
+def compress(data: bytes):
+    """Returns (encoding, compressed bytes); zstd when installed, gzip otherwise."""
+    if ZSTD_AVAILABLE:
+        return "zstd", _zstd_compressor.compress(data)
+    return "gzip", gzip.compress(data, compresslevel=6)
+
+
+def decompress(encoding: str, data: bytes) -> bytes:
+    if encoding == "zstd":
+        if not ZSTD_AVAILABLE:
+            raise RuntimeError("zstandard is required to read this capture")
+        return zstandard.ZstdDecompressor().decompress(data)
+    return gzip.decompress(data)
+
+
+def capture_response(response, max_bytes: int = CAPTURE_MAX_BYTES) -> dict:
+    """A ``ResponseCapture`` row (without run/test case ids) for an httpx response."""
+    headers = {k: ("[redacted]" if k.lower() in REDACTED_HEADERS else v) for k, v in response.headers.items()}
+    content = response.content
+    encoding, body = compress(content[:max_bytes])
+    return {
+        "status": response.status_code,
+        "headers": json.dumps(headers),
+        "body": body,
+        "encoding": encoding,
+        "size_bytes": len(content),
+        "truncated": len(content) > max_bytes,
+    }
+
+
+def capture_dict(row) -> dict:
+    body = decompress(row.encoding, row.body) if row.body is not None else b""
+    return {
+        "run_id": row.run_id,
+        "test_case_id": row.test_case_id,
+        "status": row.status,
+        "headers": json.loads(row.headers) if row.headers else {},
+        "body": body.decode("utf-8", errors="replace"),
+        "size_bytes": row.size_bytes,
+        "truncated": row.truncated,
+        "created_at": row.created_at,
+    }
@@ -0,0 +1,114 @@
+"""Named environments: the base URL, default headers and credentials a run targets.
+
+A run without an environment targets the spec's own ``servers[0].url``.
+Credentials are described in ``core.auth``.
+The runners turn a target into one pooled client (see
+``workers.test_runner.ClientPool``), so every case of a run, and every batch a
+queue worker runs against the same environment, reuses its connections.
+"""
+import hashlib
+import json
+from datetime import datetime
+from sqlalchemy.orm import Session
+from . import auth as auth_config, models
+
+DEFAULT_ENVIRONMENT = "default"
+
+
+class EnvironmentConfigError(Exception):
+    pass
+
+
+def _spec_document(spec: models.APISpec) -> dict:
+    return json.loads(spec.content) if spec.content else {}
+
+
+def save_environment(session: Session, spec_id: int, name: str, base_url: str, headers: dict = None,
+                     auth: dict = None) -> models.Environment:
+    """Create or replace a spec's environment called ``name``."""
+    if name == DEFAULT_ENVIRONMENT:
+        raise EnvironmentConfigError(f"'{DEFAULT_ENVIRONMENT}' is reserved for the spec's own base URL")
+    if not base_url.startswith(("http://", "https://")):
+        raise EnvironmentConfigError("base_url must be an absolute http(s) URL")
+    if auth:
+        try:
+            auth_config.resolve(auth, _spec_document(session.get(models.APISpec, spec_id)), base_url)
+        except auth_config.AuthConfigError as e:
+            raise EnvironmentConfigError(str(e))
+    env = session.query(models.Environment)\
+        .filter(models.Environment.spec_id == spec_id, models.Environment.name == name).first()
+    if env is None:
+        env = models.Environment(spec_id=spec_id, name=name)
+        session.add(env)
+    env.base_url = base_url.rstrip("/")
+    env.headers = json.dumps(headers or {})
+    env.auth = json.dumps(auth) if auth else None
+    env.updated_at = datetime.utcnow()
+    session.commit()
+    session.refresh(env)
+    return env
+
+
+def get_environment(session: Session, spec_id: int, name: str):
+    return session.query(models.Environment)\
+        .filter(models.Environment.spec_id == spec_id, models.Environment.name == name).first()
+
+
+def delete_environment(session: Session, env: models.Environment):
+    """Delete an environment; finished runs keep their results but lose the reference."""
+    running = session.query(models.TestRun.id)\
+        .filter(models.TestRun.environment_id == env.id, models.TestRun.status == "running").first()
+    if running:
+        raise EnvironmentConfigError(f"Run {running.id} is still using this environment")
+    session.query(models.TestRun).filter(models.TestRun.environment_id == env.id)\
+        .update({"environment_id": None}, synchronize_session=False)
+    session.delete(env)
+    session.commit()
+
+
+def target(spec: models.APISpec, env: models.Environment = None) -> dict:
+    """What the runners need to reach an environment (or the spec's default server).
+
+    ``auth`` is resolved against the spec's security schemes here, once per run.
+    """
+    if env is None:
+        return {"name": DEFAULT_ENVIRONMENT, "base_url": spec.base_url, "headers": {}, "auth": None}
+    auth = json.loads(env.auth) if env.auth else None
+    if auth and "scheme" in auth:
+        auth = auth_config.resolve(auth, _spec_document(spec), env.base_url)
+    return {
+        "name": env.name,
+        "base_url": env.base_url,
+        "headers": json.loads(env.headers or "{}"),
+        "auth": auth,
+    }
+
+
+def run_target(session: Session, run: models.TestRun) -> dict:
+    env = session.get(models.Environment, run.environment_id) if run.environment_id else None
+    return target(session.get(models.APISpec, run.spec_id), env)
+
+
+def target_key(target: dict) -> str:
+    """Identifies a target's client; changing an environment's settings gets it a fresh one."""
+    return hashlib.sha256(json.dumps(target, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def client_options(target: dict) -> dict:
+    """``httpx.AsyncClient`` keyword arguments for a target: base URL, default headers and credentials."""
+    auth_headers, params, auth = auth_config.client_auth(target.get("auth"))
+    headers = {**(target.get("headers") or {}), **auth_headers}
+    return {"base_url": target.get("base_url") or "", "headers": headers, "params": params, "auth": auth}
+
+
+def environment_dict(env: models.Environment) -> dict:
+    # Credentials are write-only
+    auth = auth_config.redacted(json.loads(env.auth)) if env.auth else None
+    return {
+        "id": env.id,
+        "name": env.name,
+        "base_url": env.base_url,
+        "headers": json.loads(env.headers or "{}"),
+        "auth": auth,
+        "updated_at": env.updated_at,
+    }
@@ -0,0 +1,96 @@
+"""In-process pub/sub for run progress.
+
+Runs publish from their worker threads (each background run drives its own
+event loop) and SSE handlers subscribe on the server's loop, so events are
+handed over with ``loop.call_soon_threadsafe``. Nothing here touches the
+database: watching a run costs one queue per subscriber.
+"""
+import asyncio
+import os
+import threading
+from collections import defaultdict
+
+# Events buffered per subscriber; a slow client loses the oldest result events, never the counters
+EVENT_QUEUE_SIZE = int(os.getenv("EVENT_QUEUE_SIZE", "1000"))
+
+
+class Subscription:
+    def __init__(self, run_id: int, loop: asyncio.AbstractEventLoop, maxsize: int):
+        self.run_id = run_id
+        self.loop = loop
+        self.queue = asyncio.Queue(maxsize=maxsize)
+        self.dropped = 0
+
+    def _put(self, event: dict):
+        # Runs on the subscriber's loop
+        if self.queue.full():
+            self.queue.get_nowait()
+            self.dropped += 1
+        self.queue.put_nowait(event)
+
+    async def get(self) -> dict:
+        return await self.queue.get()
+
+
+class EventBroker:
+    def __init__(self, queue_size: int = EVENT_QUEUE_SIZE):
+        self.queue_size = queue_size
+        self._lock = threading.Lock()
+        self._subscribers = defaultdict(set)
+        self._counters = {}
+
+    def subscribe(self, run_id: int) -> Subscription:
+        """Subscribe from a coroutine; events are delivered on its running loop."""
+        sub = Subscription(run_id, asyncio.get_running_loop(), self.queue_size)
+        with self._lock:
+            self._subscribers[run_id].add(sub)
+        return sub
+
+    def unsubscribe(self, sub: Subscription):
+        with self._lock:
+            subs = self._subscribers.get(sub.run_id)
+            if subs is not None:
+                subs.discard(sub)
+                if not subs:
+                    del self._subscribers[sub.run_id]
+
+    def counters(self, run_id: int):
+        """The latest published counters of a running run, or None."""
+        with self._lock:
+            return self._counters.get(run_id)
+
+    def publish(self, run_id: int, event: dict):
+        """Thread-safe; cheap when nobody is watching the run."""
+        with self._lock:
+            if "counters" in event:
+                self._counters[run_id] = event["counters"]
+            if event.get("type") == "finished":
+                self._counters.pop(run_id, None)
+            subs = list(self._subscribers.get(run_id, ()))
+        for sub in subs:
+            try:
+                sub.loop.call_soon_threadsafe(sub._put, event)
+            except RuntimeError:
+                # The subscriber's loop has shut down
+                self.unsubscribe(sub)
+
+
+broker = EventBroker()
+
+
+class RunProgress:
+    """Counts a run's results and publishes each one with the running totals."""
+
+    def __init__(self, run_id: int, total: int, broker: EventBroker = broker):
+        self.run_id = run_id
+        self.broker = broker
+        self.counters = {"total": total, "done": 0, "passed": 0, "failed": 0}
+
+    def record(self, result: dict):
+        self.counters["done"] += 1
+        self.counters["passed" if result["success"] else "failed"] += 1
+        self.broker.publish(self.run_id, {
+            "type": "result",
+            "result": {k: result.get(k) for k in ("test_case_id", "success", "status", "latency_ms")},
+            "counters": dict(self.counters),
+        })
@@ -0,0 +1,87 @@
+import hashlib
+import json
+import os
+from datetime import datetime
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+from . import models
+
+# Bounds for the generated test cache; least recently used entries are evicted first
+GEN_CACHE_MAX_ENTRIES = int(os.getenv("GEN_CACHE_MAX_ENTRIES", "10000"))
+GEN_CACHE_MAX_BYTES = int(os.getenv("GEN_CACHE_MAX_BYTES", str(50 * 1024 * 1024)))
+
+
+def cache_key(endpoint: str, method: str, details: dict, base_url: str, prompt_template: str, model: str) -> str:
+    """Hash an operation definition together with the prompt template and model that would generate its tests."""
+    operation = json.dumps(
+        {"endpoint": endpoint, "method": method.upper(), "base_url": base_url, "details": details},
+        sort_keys=True, separators=(",", ":"), default=str,
+    )
+    digest = hashlib.sha256()
+    for part in (operation, prompt_template, model):
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+class GenerationCache:
+    """DB-backed, content-addressed cache of generated test cases with LRU eviction."""
+
+    def __init__(self, session: Session, max_entries: int = GEN_CACHE_MAX_ENTRIES,
+                 max_bytes: int = GEN_CACHE_MAX_BYTES):
+        self.session = session
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+
+    def get_many(self, keys):
+        """Return ``{key: tests}`` for the keys that are cached, marking them as recently used.
+
+        Empty entries (stored before empty generations stopped being cached) count as misses.
+        """
+        keys = list(set(keys))
+        found = {}
+        # Stay well under SQLite's bound parameter limit
+        for i in range(0, len(keys), 500):
+            chunk = keys[i:i + 500]
+            for entry in self.session.query(models.GeneratedTestCache).filter(models.GeneratedTestCache.key.in_(chunk)):
+                tests = json.loads(entry.tests)
+                if tests:
+                    found[entry.key] = tests
+        if found:
+            self.session.query(models.GeneratedTestCache).filter(models.GeneratedTestCache.key.in_(list(found)))\
+                .update({"last_used_at": datetime.utcnow()}, synchronize_session=False)
+            self.session.commit()
+        return found
+
+    def put_many(self, entries, model: str):
+        """Store ``{key: tests}`` and evict old entries if the cache is over its bounds."""
+        now = datetime.utcnow()
+        for key, tests in entries.items():
+            data = json.dumps(tests)
+            self.session.merge(models.GeneratedTestCache(
+                key=key, model=model, tests=data, size_bytes=len(data), created_at=now, last_used_at=now,
+            ))
+        self.session.commit()
+        self.evict()
+
+    def evict(self):
+        count, size = self.session.query(
+            func.count(models.GeneratedTestCache.key), func.coalesce(func.sum(models.GeneratedTestCache.size_bytes), 0)
+        ).one()
+        if count <= self.max_entries and size <= self.max_bytes:
+            return
+
+        # Walk entries from most to least recently used and drop everything past the bounds
+        kept_count, kept_size, stale = 0, 0, []
+        for key, entry_size in self.session.query(models.GeneratedTestCache.key, models.GeneratedTestCache.size_bytes)\
+                .order_by(models.GeneratedTestCache.last_used_at.desc()):
+            if kept_count < self.max_entries and kept_size + entry_size <= self.max_bytes:
+                kept_count += 1
+                kept_size += entry_size
+            else:
+                stale.append(key)
+        for i in range(0, len(stale), 500):
+            self.session.query(models.GeneratedTestCache).filter(models.GeneratedTestCache.key.in_(stale[i:i + 500]))\
+                .delete(synchronize_session=False)
+        self.session.commit()
+        print(f"Evicted {len(stale)} generated test cache entries")
@@ -0,0 +1,95 @@
+"""Compact HDR-style latency histogram.
+
+Values (microseconds) are counted in log-linear buckets: every power-of-two
+range above ``2 ** SUB_BUCKET_BITS`` is split into ``2 ** (SUB_BUCKET_BITS - 1)``
+linear sub-buckets, so any recorded value is reported within 1/64 (about 1.6%)
+of its true value while a run of millions of requests still fits in a few
+hundred sparse counters.
+"""
+import json
+
+SUB_BUCKET_BITS = 7
+_SUB_BUCKET_MASK = (1 << SUB_BUCKET_BITS) - 1
+
+
+def _index(value: int) -> int:
+    if value < (1 << SUB_BUCKET_BITS):
+        return value
+    shift = value.bit_length() - SUB_BUCKET_BITS
+    return (shift << SUB_BUCKET_BITS) + (value >> shift)
+
+
+def _highest_equivalent(index: int) -> int:
+    shift = index >> SUB_BUCKET_BITS
+    if shift == 0:
+        return index
+    return (((index & _SUB_BUCKET_MASK) + 1) << shift) - 1
+
+
+class Histogram:
+    def __init__(self):
+        self.counts = {}
+        self.count = 0
+        self.total = 0
+        self.min = None
+        self.max = 0
+
+    def record(self, value_us: float):
+        value = max(0, int(value_us))
+        i = _index(value)
+        self.counts[i] = self.counts.get(i, 0) + 1
+        self.count += 1
+        self.total += value
+        self.max = max(self.max, value)
+        self.min = value if self.min is None else min(self.min, value)
+
+    def merge(self, other: "Histogram"):
+        for i, n in other.counts.items():
+            self.counts[i] = self.counts.get(i, 0) + n
+        self.count += other.count
+        self.total += other.total
+        self.max = max(self.max, other.max)
+        if other.min is not None:
+            self.min = other.min if self.min is None else min(self.min, other.min)
+
+    def percentile(self, p: float) -> int:
+        """Value (microseconds) at or below which ``p`` percent of recorded values fall."""
+        if not self.count:
+            return 0
+        target = max(1, round(self.count * p / 100))
+        seen = 0
+        for i in sorted(self.counts):
+            seen += self.counts[i]
+            if seen >= target:
+                return min(_highest_equivalent(i), self.max)
+        return self.max
+
+    def mean(self) -> float:
+        return self.total / self.count if self.count else 0.0
+
+    def summary_ms(self) -> dict:
+        return {
+            "min_ms": round((self.min or 0) / 1000, 3),
+            "mean_ms": round(self.mean() / 1000, 3),
+            "p50_ms": round(self.percentile(50) / 1000, 3),
+            "p90_ms": round(self.percentile(90) / 1000, 3),
+            "p95_ms": round(self.percentile(95) / 1000, 3),
+            "p99_ms": round(self.percentile(99) / 1000, 3),
+            "max_ms": round(self.max / 1000, 3),
+        }
+
+    def to_json(self) -> str:
+        return json.dumps({"unit": "us", "sub_bucket_bits": SUB_BUCKET_BITS, "count": self.count,
+                           "total": self.total, "min": self.min, "max": self.max,
+                           "counts": {str(i): n for i, n in sorted(self.counts.items())}})
+
+    @classmethod
+    def from_json(cls, data: str) -> "Histogram":
+        raw = json.loads(data)
+        hist = cls()
+        hist.counts = {int(i): n for i, n in raw["counts"].items()}
+        hist.count = raw["count"]
+        hist.total = raw["total"]
+        hist.min = raw["min"]
+        hist.max = raw["max"]
+        return hist
@@ -0,0 +1,123 @@
+import json
+from sqlalchemy.orm import Session
+from . import models, test_generator, generation_cache, operations
+from .spec_parser import load_spec, base_url
+
+
+def save_test_cases(session: Session, spec_id: int, tests, spec_version: int = 1) -> int:
+    test_count = 0
+    for t in tests:
+        try:
+            tc = models.TestCase(
+                spec_id=spec_id,
+                endpoint=t["endpoint"],
+                method=t["method"].upper(),
+                payload=json.dumps(t.get("payload", {})),
+                operation_key=t.get("operation"),
+                category=t.get("category"),
+                spec_version=spec_version
+            )
+            session.add(tc)
+            test_count += 1
+        except Exception as e:
+            print(f"Failed to save test case: {e}")
+    session.commit()
+    return test_count
+
+
+async def ingest_spec(session: Session, file_path: str, filename: str, content_hash: str = None, on_progress=None):
+    """Parse an uploaded spec, store it and generate its test cases. Returns ``(spec, test_count)``."""
+    # 1️⃣ Parse JSON / YAML
+    spec_json, content = load_spec(file_path)
+
+    # 2️⃣ Store spec in DB and index its operations
+    new_spec = models.APISpec(filename=filename, content=content, content_hash=content_hash, file_path=file_path,
+                              base_url=base_url(spec_json))
+    session.add(new_spec)
+    session.commit()
+    session.refresh(new_spec)
+    try:
+        ops = operations.index_operations(session, new_spec.id, spec_json)
+
+        # 3️⃣ Generate AI tests
+        ai_tests = []
+        try:
+            ai_tests = await test_generator.generate_ai_tests_async(
+                ops, base_url=new_spec.base_url, cache=generation_cache.GenerationCache(session),
+                on_progress=on_progress
+            )
+            print(f"Generated {len(ai_tests)} test cases")
+        except Exception as e:
+            print(f"AI test generation failed: {e}")
+            # Even if AI test generation fails, we continue to ensure the spec is processed
+
+        # 4️⃣ Save generated tests to DB
+        return new_spec, save_test_cases(session, new_spec.id, ai_tests)
+    except BaseException:
+        # Don't leave a half-ingested spec (and its operations) behind
+        session.rollback()
+        session.delete(new_spec)
+        session.commit()
+        raise
+
+
+def _case_operation_key(tc: models.TestCase) -> str:
+    # Cases generated before operation keys were recorded: best effort from the stored request
+    return tc.operation_key or test_generator.operation_key(tc.endpoint.split("?", 1)[0], tc.method)
+
+
+async def ingest_spec_version(session: Session, spec_id: int, file_path: str, filename: str,
+                              content_hash: str = None, on_progress=None):
+    """Store a new version of an existing spec, regenerating tests only for added or changed operations.
+
+    Test cases (and their result history) of unchanged operations are kept;
+    those of changed or removed operations are deleted. Returns the diff
+    summary with the new version number and number of generated tests.
+    """
+    new_spec_json, content = load_spec(file_path)
+    spec = session.get(models.APISpec, spec_id)
+    operations.ensure_operations(session, spec)
+    diff, ops = operations.sync_operations(session, spec_id, new_spec_json)
+
+    stale = set(diff["changed"]) | set(diff["removed"])
+    stale_ids = [
+        tc.id for tc in session.query(models.TestCase).filter(models.TestCase.spec_id == spec_id)
+        if _case_operation_key(tc) in stale
+    ]
+    for i in range(0, len(stale_ids), 500):
+        chunk = stale_ids[i:i + 500]
+        session.query(models.TestResult).filter(models.TestResult.test_case_id.in_(chunk))\
+            .delete(synchronize_session=False)
+        session.query(models.ResponseCapture).filter(models.ResponseCapture.test_case_id.in_(chunk))\
+            .delete(synchronize_session=False)
+        session.query(models.TestCase).filter(models.TestCase.id.in_(chunk))\
+            .delete(synchronize_session=False)
+
+    spec.content = content
+    spec.content_hash = content_hash
+    spec.file_path = file_path
+    spec.filename = filename
+    spec.base_url = base_url(new_spec_json)
+    spec.version = (spec.version or 1) + 1
+    session.commit()
+
+    ai_tests = []
+    regenerate = diff["added"] + diff["changed"]
+    if regenerate:
+        try:
+            ai_tests = await test_generator.generate_ai_tests_async(
+                [ops[key] for key in regenerate], base_url=spec.base_url,
+                cache=generation_cache.GenerationCache(session), on_progress=on_progress
+            )
+        except Exception as e:
+            print(f"AI test generation failed: {e}")
+    elif on_progress:
+        on_progress(0, 0)
+
+    test_count = save_test_cases(session, spec_id, ai_tests, spec_version=spec.version)
+    return {
+        "version": spec.version,
+        **{k: len(v) for k, v in diff.items()},
+        "removed_tests": len(stale_ids),
+        "generated_tests": test_count,
+    }
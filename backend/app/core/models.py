@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Text, ForeignKey, DateTime, Boolean
+from sqlalchemy import Column, Integer, Float, String, Text, LargeBinary, ForeignKey, DateTime, Boolean, Index, UniqueConstraint
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from .db import Base
@@ -8,30 +8,249 @@ class APISpec(Base):
     id = Column(Integer, primary_key=True, index=True)
     filename = Column(String, nullable=False)  # Added filename
     content = Column(Text, nullable=False)
+    content_hash = Column(String(64), index=True)  # SHA-256 of the uploaded file
+    file_path = Column(String)
+    version = Column(Integer, nullable=False, default=1)  # Bumped by each incremental re-upload
+    base_url = Column(String)  # servers[0].url, if the spec declares one
     created_at = Column(DateTime, default=datetime.utcnow)
 
     test_cases = relationship("TestCase", back_populates="spec", cascade="all, delete-orphan")
+    runs = relationship("TestRun", back_populates="spec", cascade="all, delete-orphan")
+    operations = relationship("Operation", back_populates="spec", cascade="all, delete-orphan")
+    scenarios = relationship("Scenario", back_populates="spec", cascade="all, delete-orphan")
+    environments = relationship("Environment", back_populates="spec", cascade="all, delete-orphan")
 
 
 class TestCase(Base):
     __tablename__ = "test_cases"
     id = Column(Integer, primary_key=True, index=True)
-    spec_id = Column(Integer, ForeignKey("api_specs.id"))
+    spec_id = Column(Integer, ForeignKey("api_specs.id"), index=True)
     endpoint = Column(String, nullable=False)
     method = Column(String, nullable=False)
     payload = Column(Text, default="{}")
+    operation_key = Column(String, index=True)  # e.g. "GET /users/{id}"
+    category = Column(String)  # Kind of case from the schema engine (valid, boundary, injection...)
+    spec_version = Column(Integer, default=1)  # Spec version this case was generated for
     created_at = Column(DateTime, default=datetime.utcnow)
 
     spec = relationship("APISpec", back_populates="test_cases")
     results = relationship("TestResult", back_populates="test_case", cascade="all, delete-orphan")
 
 
+class TestRun(Base):
+    __tablename__ = "test_runs"
+    id = Column(Integer, primary_key=True, index=True)
+    spec_id = Column(Integer, ForeignKey("api_specs.id"), index=True)
+    status = Column(String, nullable=False, default="running")  # running / completed / failed
+    mode = Column(String, nullable=False, default="functional")  # functional / fuzz / load / scenario
+    started_at = Column(DateTime, default=datetime.utcnow)
+    finished_at = Column(DateTime)
+    total_tests = Column(Integer, default=0)
+    passed = Column(Integer, default=0)
+    failed = Column(Integer, default=0)
+    duration_ms = Column(Integer)
+    summary = Column(Text)  # JSON; mode-specific report (e.g. fuzz coverage and findings)
+    environment_id = Column(Integer, ForeignKey("environments.id"))  # None: the spec's own base_url
+    # Functional runs stop early after this many failures / seconds; the remaining cases are skipped
+    fail_fast = Column(Integer)
+    time_budget = Column(Float)
+
+    spec = relationship("APISpec", back_populates="runs")
+    results = relationship("TestResult", back_populates="run", cascade="all, delete-orphan")
+    load_stats = relationship("LoadStat", back_populates="run", cascade="all, delete-orphan")
+
+
 class TestResult(Base):
     __tablename__ = "test_results"
+    # Covers "latest result per test case" lookups (MAX(id) grouped by test_case_id)
+    __table_args__ = (Index("ix_test_results_test_case_id_id", "test_case_id", "id"),)
+
     id = Column(Integer, primary_key=True, index=True)
     test_case_id = Column(Integer, ForeignKey("test_cases.id"))
+    run_id = Column(Integer, ForeignKey("test_runs.id"), index=True)
     success = Column(Boolean, nullable=False)
     status = Column(Integer, nullable=False)
+    # Timings in milliseconds; connect/TLS only when the request opened a new connection
+    latency_ms = Column(Float)
+    connect_ms = Column(Float)
+    tls_ms = Column(Float)
+    ttfb_ms = Column(Float)
+    response_bytes = Column(Integer)
+    validation_errors = Column(Text)  # JSON list; set when the response does not match its declared schema
     created_at = Column(DateTime, default=datetime.utcnow)
 
     test_case = relationship("TestCase", back_populates="results")
+    run = relationship("TestRun", back_populates="results")
+
+
+class Environment(Base):
+    """A named target for a spec's runs (e.g. staging, prod): where requests go and what they carry."""
+    __tablename__ = "environments"
+    __table_args__ = (UniqueConstraint("spec_id", "name", name="uq_environments_spec_id_name"),)
+
+    id = Column(Integer, primary_key=True, index=True)
+    spec_id = Column(Integer, ForeignKey("api_specs.id"), nullable=False, index=True)
+    name = Column(String, nullable=False)
+    base_url = Column(String, nullable=False)
+    headers = Column(Text, default="{}")  # JSON; sent with every request
+    auth = Column(Text)  # JSON, e.g. {"type": "bearer", "token": "..."}
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    spec = relationship("APISpec", back_populates="environments")
+
+
+class Scenario(Base):
+    """A stateful flow of requests (e.g. create, then get, then delete) whose steps form a DAG."""
+    __tablename__ = "scenarios"
+    id = Column(Integer, primary_key=True, index=True)
+    spec_id = Column(Integer, ForeignKey("api_specs.id"), nullable=False, index=True)
+    name = Column(String, nullable=False)
+    description = Column(Text)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+    spec = relationship("APISpec", back_populates="scenarios")
+    steps = relationship("ScenarioStep", back_populates="scenario", cascade="all, delete-orphan",
+                         order_by="ScenarioStep.position")
+
+
+class ScenarioStep(Base):
+    """One request of a scenario. ``{{name}}`` placeholders are filled from values extracted upstream."""
+    __tablename__ = "scenario_steps"
+    __table_args__ = (UniqueConstraint("scenario_id", "name", name="uq_scenario_steps_scenario_id_name"),)
+
+    id = Column(Integer, primary_key=True, index=True)
+    scenario_id = Column(Integer, ForeignKey("scenarios.id"), nullable=False, index=True)
+    name = Column(String, nullable=False)
+    position = Column(Integer, nullable=False, default=0)
+    method = Column(String, nullable=False)
+    endpoint = Column(String, nullable=False)
+    payload = Column(Text)  # JSON
+    headers = Column(Text, default="{}")  # JSON
+    depends_on = Column(Text, default="[]")  # JSON list of step names
+    extract = Column(Text, default="{}")  # JSON {variable: "body.id" | "headers.location" | "status"}
+    expect_status = Column(Integer)  # Any 2xx when unset
+
+    scenario = relationship("Scenario", back_populates="steps")
+
+
+class ScenarioResult(Base):
+    """Outcome of one scenario step in a run; steps after a failed dependency are recorded as skipped."""
+    __tablename__ = "scenario_results"
+    id = Column(Integer, primary_key=True, index=True)
+    run_id = Column(Integer, ForeignKey("test_runs.id"), nullable=False, index=True)
+    scenario_id = Column(Integer, ForeignKey("scenarios.id"), nullable=False)
+    step_id = Column(Integer, ForeignKey("scenario_steps.id"), nullable=False)
+    success = Column(Boolean, nullable=False)
+    skipped = Column(Boolean, nullable=False, default=False)
+    status = Column(Integer, nullable=False, default=0)
+    latency_ms = Column(Float)
+    extracted = Column(Text)  # JSON of the values this step extracted
+    error = Column(Text)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+
+class RunBatch(Base):
+    """A slice of a run's test cases queued for worker processes (``python -m workers``)."""
+    __tablename__ = "run_batches"
+    __table_args__ = (Index("ix_run_batches_status_lease_expires_at", "status", "lease_expires_at"),)
+
+    id = Column(Integer, primary_key=True, index=True)
+    run_id = Column(Integer, ForeignKey("test_runs.id"), nullable=False, index=True)
+    test_case_ids = Column(Text, nullable=False)  # JSON list
+    status = Column(String, nullable=False, default="queued")  # queued / leased / done / failed / skipped
+    worker_id = Column(String)
+    attempts = Column(Integer, nullable=False, default=0)
+    lease_expires_at = Column(DateTime)
+    passed = Column(Integer, default=0)
+    failed = Column(Integer, default=0)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    finished_at = Column(DateTime)
+
+
+class ResponseCapture(Base):
+    """Headers and (truncated, compressed) body of a response, kept apart from the hot test_results table."""
+    __tablename__ = "response_captures"
+    __table_args__ = (Index("ix_response_captures_run_id_test_case_id", "run_id", "test_case_id"),)
+
+    id = Column(Integer, primary_key=True, index=True)
+    run_id = Column(Integer, ForeignKey("test_runs.id"))
+    test_case_id = Column(Integer, ForeignKey("test_cases.id"), nullable=False)
+    status = Column(Integer, nullable=False)
+    headers = Column(Text)  # JSON
+    body = Column(LargeBinary)
+    encoding = Column(String, nullable=False)  # zstd / gzip
+    size_bytes = Column(Integer, nullable=False)  # Original body size, before truncation
+    truncated = Column(Boolean, nullable=False, default=False)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+
+class LoadStat(Base):
+    """Aggregated latency and throughput of one endpoint during a load run (one row per endpoint, not per request)."""
+    __tablename__ = "load_stats"
+    id = Column(Integer, primary_key=True, index=True)
+    run_id = Column(Integer, ForeignKey("test_runs.id"), nullable=False, index=True)
+    endpoint = Column(String, nullable=False)  # "METHOD /path" operation key
+    requests = Column(Integer, nullable=False, default=0)
+    errors = Column(Integer, nullable=False, default=0)
+    invalid = Column(Integer, nullable=False, default=0)  # Responses not matching their declared schema
+    statuses = Column(Text)  # JSON {status: count}
+    throughput_rps = Column(Float)
+    p50_ms = Column(Float)
+    p95_ms = Column(Float)
+    p99_ms = Column(Float)
+    max_ms = Column(Float)
+    histogram = Column(Text)  # serialized core.histogram.Histogram
+
+    run = relationship("TestRun", back_populates="load_stats")
+
+
+class GeneratedTestCache(Base):
+    """LLM output for one operation, keyed by a hash of everything that went into the prompt."""
+    __tablename__ = "generated_test_cache"
+    key = Column(String(64), primary_key=True)
+    model = Column(String, nullable=False)
+    tests = Column(Text, nullable=False)
+    size_bytes = Column(Integer, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    last_used_at = Column(DateTime, default=datetime.utcnow, index=True)
+
+
+class Job(Base):
+    """A unit of background work (e.g. ingesting an uploaded spec) and its progress."""
+    __tablename__ = "jobs"
+    id = Column(Integer, primary_key=True, index=True)
+    kind = Column(String, nullable=False)
+    status = Column(String, nullable=False, default="queued", index=True)  # queued / running / completed / failed
+    filename = Column(String)
+    file_path = Column(String)
+    content_hash = Column(String(64))
+    spec_id = Column(Integer, ForeignKey("api_specs.id"))
+    progress = Column(Integer, default=0)
+    total = Column(Integer)
+    result = Column(Text)
+    error = Column(Text)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+
+class Operation(Base):
+    """One operation of a spec, parsed once at ingest with its ``$ref``s resolved."""
+    __tablename__ = "operations"
+    __table_args__ = (UniqueConstraint("spec_id", "key", name="uq_operations_spec_id_key"),)
+
+    id = Column(Integer, primary_key=True, index=True)
+    spec_id = Column(Integer, ForeignKey("api_specs.id"), nullable=False, index=True)
+    key = Column(String, nullable=False)  # e.g. "GET /users/{id}"
+    path = Column(String, nullable=False)
+    method = Column(String, nullable=False)
+    operation_id = Column(String)
+    definition = Column(Text, nullable=False)  # Full resolved operation object (JSON)
+    parameters = Column(Text, default="[]")
+    request_body = Column(Text)
+    responses = Column(Text, default="{}")
+    definition_hash = Column(String(64), nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    spec = relationship("APISpec", back_populates="operations")
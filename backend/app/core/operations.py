@@ -0,0 +1,81 @@
+import json
+from sqlalchemy.orm import Session
+from . import models
+from .spec_parser import iter_operations
+
+
+def _row_values(op: dict) -> dict:
+    return {
+        "key": op["key"],
+        "path": op["path"],
+        "method": op["method"],
+        "operation_id": op["operation_id"],
+        "definition": json.dumps(op["definition"], default=str),
+        "parameters": json.dumps(op["parameters"], default=str),
+        "request_body": json.dumps(op["request_body"], default=str) if op["request_body"] is not None else None,
+        "responses": json.dumps(op["responses"], default=str),
+        "definition_hash": op["hash"],
+    }
+
+
+def as_dict(row: models.Operation) -> dict:
+    """The normalized form of an indexed operation, as produced by ``spec_parser.iter_operations``."""
+    return {
+        "id": row.id,
+        "key": row.key,
+        "path": row.path,
+        "method": row.method,
+        "operation_id": row.operation_id,
+        "definition": json.loads(row.definition),
+        "parameters": json.loads(row.parameters or "[]"),
+        "request_body": json.loads(row.request_body) if row.request_body else None,
+        "responses": json.loads(row.responses or "{}"),
+        "hash": row.definition_hash,
+    }
+
+
+def index_operations(session: Session, spec_id: int, spec: dict):
+    """Parse the spec's operations once and store them. Returns the normalized operations."""
+    ops = list(iter_operations(spec))
+    session.bulk_insert_mappings(models.Operation, [{"spec_id": spec_id, **_row_values(op)} for op in ops])
+    session.commit()
+    return ops
+
+
+def load_operations(session: Session, spec_id: int, keys=None):
+    query = session.query(models.Operation).filter(models.Operation.spec_id == spec_id)
+    if keys is not None:
+        query = query.filter(models.Operation.key.in_(list(keys)))
+    return [as_dict(row) for row in query.order_by(models.Operation.id)]
+
+
+def ensure_operations(session: Session, spec: models.APISpec):
+    """Index specs stored before the operations table existed."""
+    if not session.query(models.Operation.id).filter(models.Operation.spec_id == spec.id).first():
+        index_operations(session, spec.id, json.loads(spec.content))
+
+
+def sync_operations(session: Session, spec_id: int, spec: dict):
+    """Bring the spec's indexed operations in line with a new version of the document.
+
+    Returns ``(diff, ops)`` where ``diff`` lists the ``added``, ``changed``,
+    ``removed`` and ``unchanged`` operation keys and ``ops`` maps each current
+    key to its normalized operation.
+    """
+    stored = {row.key: row for row in session.query(models.Operation).filter(models.Operation.spec_id == spec_id)}
+    ops = {op["key"]: op for op in iter_operations(spec)}
+    diff = {
+        "added": sorted(k for k in ops if k not in stored),
+        "changed": sorted(k for k in ops if k in stored and stored[k].definition_hash != ops[k]["hash"]),
+        "removed": sorted(k for k in stored if k not in ops),
+        "unchanged": sorted(k for k in ops if k in stored and stored[k].definition_hash == ops[k]["hash"]),
+    }
+
+    for key in diff["removed"]:
+        session.delete(stored[key])
+    for key in diff["changed"]:
+        for name, value in _row_values(ops[key]).items():
+            setattr(stored[key], name, value)
+    session.bulk_insert_mappings(models.Operation, [{"spec_id": spec_id, **_row_values(ops[k])} for k in diff["added"]])
+    session.commit()
+    return diff, ops
@@ -0,0 +1,68 @@
+import os
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+from . import models
+
+# An endpoint has regressed when its mean latency grew by this factor and by at least this many milliseconds
+PERF_REGRESSION_RATIO = float(os.getenv("PERF_REGRESSION_RATIO", "1.5"))
+PERF_REGRESSION_MIN_MS = float(os.getenv("PERF_REGRESSION_MIN_MS", "20"))
+
+
+def endpoint_latency_query(session: Session, run_id: int):
+    """Latency of each endpoint (operation) over the timed results of a run, in one grouped query."""
+    endpoint = func.coalesce(models.TestCase.operation_key,
+                             models.TestCase.method + " " + models.TestCase.endpoint).label("endpoint")
+    return (
+        session.query(
+            endpoint,
+            func.count(models.TestResult.id).label("requests"),
+            func.avg(models.TestResult.latency_ms).label("avg_ms"),
+            func.max(models.TestResult.latency_ms).label("max_ms"),
+            func.avg(models.TestResult.ttfb_ms).label("avg_ttfb_ms"),
+            func.avg(models.TestResult.response_bytes).label("avg_response_bytes"),
+        )
+        .join(models.TestCase, models.TestCase.id == models.TestResult.test_case_id)
+        .filter(models.TestResult.run_id == run_id, models.TestResult.latency_ms.isnot(None))
+        .group_by(endpoint)
+    )
+
+
+def _row(row) -> dict:
+    return {k: round(v, 3) if isinstance(v, float) else v for k, v in row._asdict().items()}
+
+
+def slowest_endpoints(session: Session, run_id: int, limit: int = 10):
+    query = endpoint_latency_query(session, run_id)
+    return [_row(r) for r in query.order_by(func.avg(models.TestResult.latency_ms).desc()).limit(limit)]
+
+
+def previous_run(session: Session, run: models.TestRun):
+    """The last completed run of the same spec and mode before ``run``."""
+    return (
+        session.query(models.TestRun)
+        .filter(models.TestRun.spec_id == run.spec_id, models.TestRun.mode == run.mode,
+                models.TestRun.status == "completed", models.TestRun.id < run.id)
+        .order_by(models.TestRun.id.desc())
+        .first()
+    )
+
+
+def latency_regressions(session: Session, run_id: int, baseline_run_id: int,
+                        ratio: float = PERF_REGRESSION_RATIO, min_ms: float = PERF_REGRESSION_MIN_MS):
+    """Endpoints whose mean latency in ``run_id`` regressed against ``baseline_run_id``, worst first."""
+    baseline = {r.endpoint: r.avg_ms for r in endpoint_latency_query(session, baseline_run_id)}
+    regressions = []
+    for r in endpoint_latency_query(session, run_id):
+        before = baseline.get(r.endpoint)
+        if not before or r.avg_ms is None:
+            continue
+        delta = r.avg_ms - before
+        if r.avg_ms >= before * ratio and delta >= min_ms:
+            regressions.append({
+                "endpoint": r.endpoint,
+                "baseline_avg_ms": round(before, 3),
+                "avg_ms": round(r.avg_ms, 3),
+                "delta_ms": round(delta, 3),
+                "ratio": round(r.avg_ms / before, 2),
+            })
+    return sorted(regressions, key=lambda x: x["delta_ms"], reverse=True)
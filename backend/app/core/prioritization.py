@@ -0,0 +1,64 @@
+"""Ordering a spec's test cases by how likely they are to fail, from stored result history.
+
+Cases whose latest result failed go first, then flaky ones (whose outcome
+flipped between recent runs) and cases of added or changed operations or
+never run at all; everything else keeps its insertion order. Combined with a
+run's ``fail_fast``/``time_budget`` limits this gets CI a verdict from the
+cases most likely to produce one.
+"""
+import os
+from itertools import groupby
+from sqlalchemy.orm import Session
+from . import models
+
+# Finished functional runs of the spec whose results feed the ordering
+PRIORITY_HISTORY_RUNS = int(os.getenv("PRIORITY_HISTORY_RUNS", "10"))
+
+RECENT_FAILURE_WEIGHT = 4.0
+FLAKY_WEIGHT = 2.0
+CHANGED_WEIGHT = 2.0
+
+
+def score(history: list, changed: bool = False) -> float:
+    """Priority of a case from its outcomes (oldest first); higher runs earlier, 0 keeps its place."""
+    if not history:
+        # Never run: nothing is known about it yet
+        return CHANGED_WEIGHT
+    value = CHANGED_WEIGHT if changed else 0.0
+    if not history[-1]:
+        value += RECENT_FAILURE_WEIGHT
+    if len(history) > 1:
+        flips = sum(1 for before, after in zip(history, history[1:]) if before != after)
+        value += FLAKY_WEIGHT * flips / (len(history) - 1)
+    # Breaks ties towards the cases that fail most often
+    return value + history.count(False) / len(history)
+
+
+def case_history(session: Session, spec_id: int, runs: int = PRIORITY_HISTORY_RUNS) -> dict:
+    """``{test_case_id: [success, ...]}`` over the spec's last ``runs`` completed functional runs, oldest first."""
+    run_ids = session.query(models.TestRun.id)\
+        .filter(models.TestRun.spec_id == spec_id, models.TestRun.mode == "functional",
+                models.TestRun.status == "completed")\
+        .order_by(models.TestRun.id.desc()).limit(runs).scalar_subquery()
+    # Result ids grow with runs, so (test_case_id, id) order is each case's history in run order
+    rows = session.query(models.TestResult.test_case_id, models.TestResult.success)\
+        .filter(models.TestResult.run_id.in_(run_ids))\
+        .order_by(models.TestResult.test_case_id, models.TestResult.id)\
+        .yield_per(5000)
+    return {tc_id: [r.success for r in results] for tc_id, results in groupby(rows, key=lambda r: r.test_case_id)}
+
+
+def priorities(session: Session, spec_id: int, runs: int = PRIORITY_HISTORY_RUNS) -> dict:
+    """``{test_case_id: score}`` for every case of the spec."""
+    history = case_history(session, spec_id, runs)
+    current_version = session.query(models.APISpec.version).filter(models.APISpec.id == spec_id).scalar() or 1
+    cases = session.query(models.TestCase.id, models.TestCase.spec_version).filter(models.TestCase.spec_id == spec_id)
+    # Re-uploads regenerate the cases of added and changed operations for the new version
+    return {tc_id: score(history.get(tc_id), current_version > 1 and version == current_version)
+            for tc_id, version in cases}
+
+
+def prioritize(session: Session, spec_id: int, test_cases: list) -> list:
+    """``test_cases`` (anything with an ``id``) most-likely-to-fail first; ties keep their order."""
+    scores = priorities(session, spec_id)
+    return sorted(test_cases, key=lambda tc: -scores.get(tc.id, 0.0))
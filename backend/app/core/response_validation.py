@@ -0,0 +1,414 @@
+"""Validation of responses against the operation's declared ``responses``.
+
+Each schema is compiled once into a tree of small closures: type checks,
+required keys, enum sets and regexes are all prepared up front, so checking
+a response only walks its body. Compiled validators are cached per operation
+definition hash, which also retires them when a new spec version changes the
+operation.
+"""
+import json
+import os
+import re
+import threading
+from collections import OrderedDict
+from sqlalchemy.orm import Session
+from . import models, operations
+
+# Compiled operations kept per process, and validation errors recorded per response
+VALIDATOR_CACHE_SIZE = int(os.getenv("VALIDATOR_CACHE_SIZE", "4096"))
+MAX_VALIDATION_ERRORS = 10
+
+JSON_CONTENT_TYPES = ("application/json", "+json")
+
+_TYPE_CHECKS = {
+    "string": lambda v: isinstance(v, str),
+    "integer": lambda v: (isinstance(v, int) and not isinstance(v, bool)) or (isinstance(v, float) and v.is_integer()),
+    "number": lambda v: isinstance(v, (int, float)) and not isinstance(v, bool),
+    "boolean": lambda v: isinstance(v, bool),
+    "array": lambda v: isinstance(v, list),
+    "object": lambda v: isinstance(v, dict),
+    "null": lambda v: v is None,
+}
+
+
+def _accept(value, path, errors):
+    pass
+
+
+def compile_schema(schema) -> callable:
+    """Compile a (``$ref``-resolved) OpenAPI/JSON Schema into ``check(value, path, errors)``.
+
+    ``check`` appends ``"<path>: <problem>"`` strings to ``errors``. ``path``
+    is ``"body"`` or a ``(parent path, key)`` pair, only formatted when there
+    is an error to report. Keywords
+    that only annotate (``format``, ``description``...) and unresolved
+    recursive ``$ref``s accept anything.
+    """
+    if not isinstance(schema, dict) or not schema or "$ref" in schema:
+        return _accept
+    checks = []
+
+    types = schema.get("type")
+    if types:
+        types = [types] if isinstance(types, str) else list(types)
+        if schema.get("nullable") and "null" not in types:
+            types.append("null")
+        type_checks = [_TYPE_CHECKS[t] for t in types if t in _TYPE_CHECKS]
+        expected = " or ".join(types)
+        if len(type_checks) == 1:
+            is_type = type_checks[0]
+        else:
+            is_type = lambda v: any(check(v) for check in type_checks)  # noqa: E731
+
+        def _type(value, path, errors):
+            if not is_type(value):
+                errors.append(f"{_where(path)}: expected {expected}, got {_json_type(value)}")
+                return False
+            return True
+
+        checks.append(_type)
+        nullable = "null" in types
+    else:
+        nullable = True
+
+    if "enum" in schema:
+        options = schema["enum"]
+        try:
+            allowed = frozenset(options)
+            member = lambda v: v in allowed  # noqa: E731
+        except TypeError:
+            member = lambda v: v in options  # noqa: E731
+
+        def _enum(value, path, errors):
+            if not (member(value) or (value is None and nullable and schema.get("nullable"))):
+                errors.append(f"{_where(path)}: {_short(value)} is not one of {_short(options)}")
+
+        checks.append(_enum)
+
+    checks.extend(_string_checks(schema))
+    checks.extend(_number_checks(schema))
+    checks.extend(_object_checks(schema))
+    checks.extend(_array_checks(schema))
+    checks.extend(_combinator_checks(schema))
+
+    if not checks:
+        return _accept
+    if types:
+        type_check, rest = checks[0], checks[1:]
+
+        def check(value, path, errors):
+            # Skip the keyword checks when the type is already wrong (or null is allowed and given)
+            if type_check(value, path, errors) and value is not None:
+                for c in rest:
+                    c(value, path, errors)
+    else:
+        def check(value, path, errors):
+            for c in checks:
+                c(value, path, errors)
+    return check
+
+
+def _string_checks(schema: dict):
+    min_len, max_len, pattern = schema.get("minLength"), schema.get("maxLength"), schema.get("pattern")
+    if min_len is None and max_len is None and pattern is None:
+        return []
+    try:
+        regex = re.compile(pattern) if pattern else None
+    except re.error:
+        regex = None
+
+    def _string(value, path, errors):
+        if not isinstance(value, str):
+            return
+        if min_len is not None and len(value) < min_len:
+            errors.append(f"{_where(path)}: shorter than {min_len} characters")
+        if max_len is not None and len(value) > max_len:
+            errors.append(f"{_where(path)}: longer than {max_len} characters")
+        if regex is not None and not regex.search(value):
+            errors.append(f"{_where(path)}: does not match {pattern}")
+
+    return [_string]
+
+
+def _number_checks(schema: dict):
+    minimum, maximum, multiple = schema.get("minimum"), schema.get("maximum"), schema.get("multipleOf")
+    ex_min, ex_max = schema.get("exclusiveMinimum"), schema.get("exclusiveMaximum")
+    # OpenAPI 3.0 uses booleans that modify minimum/maximum; JSON Schema uses numbers
+    if isinstance(ex_min, bool):
+        ex_min, minimum = (minimum if ex_min else None), (None if ex_min else minimum)
+    if isinstance(ex_max, bool):
+        ex_max, maximum = (maximum if ex_max else None), (None if ex_max else maximum)
+    if all(v is None for v in (minimum, maximum, ex_min, ex_max, multiple)):
+        return []
+
+    def _number(value, path, errors):
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            return
+        if minimum is not None and value < minimum:
+            errors.append(f"{_where(path)}: {value} is below the minimum {minimum}")
+        if maximum is not None and value > maximum:
+            errors.append(f"{_where(path)}: {value} is above the maximum {maximum}")
+        if ex_min is not None and value <= ex_min:
+            errors.append(f"{_where(path)}: {value} is not above {ex_min}")
+        if ex_max is not None and value >= ex_max:
+            errors.append(f"{_where(path)}: {value} is not below {ex_max}")
+        if multiple and (value / multiple) % 1:
+            errors.append(f"{_where(path)}: {value} is not a multiple of {multiple}")
+
+    return [_number]
+
+
+def _object_checks(schema: dict):
+    properties = {name: compile_schema(sub) for name, sub in (schema.get("properties") or {}).items()}
+    required = tuple(schema.get("required") or ())
+    additional = schema.get("additionalProperties", True)
+    extra = compile_schema(additional) if isinstance(additional, dict) else None
+    if not properties and not required and additional is True:
+        return []
+
+    def _object(value, path, errors):
+        if not isinstance(value, dict):
+            return
+        for name in required:
+            if name not in value:
+                errors.append(f"{_where(path)}: missing required property '{name}'")
+        for name, item in value.items():
+            check = properties.get(name)
+            if check is not None:
+                check(item, (path, name), errors)
+            elif additional is False:
+                errors.append(f"{_where(path)}: unexpected property '{name}'")
+            elif extra is not None:
+                extra(item, (path, name), errors)
+
+    return [_object]
+
+
+def _array_checks(schema: dict):
+    items = compile_schema(schema["items"]) if isinstance(schema.get("items"), dict) else None
+    min_items, max_items = schema.get("minItems"), schema.get("maxItems")
+    if items in (None, _accept) and min_items is None and max_items is None:
+        return []
+
+    def _array(value, path, errors):
+        if not isinstance(value, list):
+            return
+        if min_items is not None and len(value) < min_items:
+            errors.append(f"{_where(path)}: fewer than {min_items} items")
+        if max_items is not None and len(value) > max_items:
+            errors.append(f"{_where(path)}: more than {max_items} items")
+        if items is not None and items is not _accept:
+            for i, item in enumerate(value):
+                items(item, (path, i), errors)
+                if len(errors) >= MAX_VALIDATION_ERRORS:
+                    return
+
+    return [_array]
+
+
+def _combinator_checks(schema: dict):
+    checks = []
+    for part in schema.get("allOf") or ():
+        checks.append(compile_schema(part))
+    for combinator in ("anyOf", "oneOf"):
+        branches = [compile_schema(part) for part in schema.get(combinator) or ()]
+        if not branches:
+            continue
+
+        def _some(value, path, errors, branches=branches, combinator=combinator):
+            matches = 0
+            for branch in branches:
+                branch_errors = []
+                branch(value, path, branch_errors)
+                if not branch_errors:
+                    matches += 1
+                    if combinator == "anyOf":
+                        return
+            if matches == 0:
+                errors.append(f"{_where(path)}: matches none of the {combinator} schemas")
+            elif matches > 1:
+                errors.append(f"{_where(path)}: matches {matches} of the oneOf schemas")
+
+        checks.append(_some)
+    if isinstance(schema.get("not"), dict):
+        negated = compile_schema(schema["not"])
+
+        def _not(value, path, errors):
+            branch_errors = []
+            negated(value, path, branch_errors)
+            if not branch_errors:
+                errors.append(f"{_where(path)}: must not match the 'not' schema")
+
+        checks.append(_not)
+    return checks
+
+
+def _where(path) -> str:
+    keys = []
+    while isinstance(path, tuple):
+        path, key = path
+        keys.append(f"[{key}]" if isinstance(key, int) else f".{key}")
+    return path + "".join(reversed(keys))
+
+
+def _json_type(value) -> str:
+    if value is None:
+        return "null"
+    if isinstance(value, bool):
+        return "boolean"
+    if isinstance(value, (int, float)):
+        return "number"
+    if isinstance(value, str):
+        return "string"
+    return "array" if isinstance(value, list) else "object"
+
+
+def _short(value) -> str:
+    text = json.dumps(value, default=str)
+    return text if len(text) <= 60 else text[:57] + "..."
+
+
+def _is_json(content_type: str) -> bool:
+    return content_type.startswith(JSON_CONTENT_TYPES[0]) or JSON_CONTENT_TYPES[1] in content_type
+
+
+class OperationValidator:
+    """Compiled response schemas of one operation, looked up by status code.
+
+    Statuses resolve like OpenAPI does: the exact code, then its range
+    (``2XX``), then ``default``.
+    """
+
+    def __init__(self, responses: dict):
+        self.declared = bool(responses)
+        self.by_status = {}
+        for code, response in (responses or {}).items():
+            code = str(code).upper()
+            if not isinstance(response, dict):
+                response = {}
+            if "content" in response:
+                schemas = {ct.split(";")[0].strip().lower(): (media or {}).get("schema")
+                           for ct, media in (response.get("content") or {}).items()}
+            else:
+                # Swagger 2: one schema, produced as JSON
+                schemas = {"application/json": response["schema"]} if "schema" in response else {}
+            self.by_status[code] = {ct: compile_schema(s) if s is not None else None for ct, s in schemas.items()}
+
+    def _declared_for(self, status: int):
+        code = str(status)
+        for key in (code, f"{code[0]}XX", "DEFAULT"):
+            if key in self.by_status:
+                return self.by_status[key]
+        return None
+
+    def validate(self, status: int, content_type: str, body: bytes) -> list:
+        """Problems with a response, as short human readable strings (empty when valid)."""
+        if not self.declared:
+            return []
+        media = self._declared_for(status)
+        if media is None:
+            return [f"status {status} is not declared for this operation"]
+        if not media:
+            return []
+        content_type = (content_type or "").split(";")[0].strip().lower()
+        if content_type in media:
+            check = media[content_type]
+        elif not content_type and len(media) == 1:
+            content_type, check = next(iter(media.items()))
+        else:
+            wildcard = [ct for ct in media if ct.endswith("/*") and content_type.startswith(ct[:-1])]
+            if not wildcard and "*/*" not in media:
+                return [f"content type '{content_type or 'none'}' is not declared (expected "
+                        f"{', '.join(sorted(media))})"]
+            check = media[wildcard[0] if wildcard else "*/*"]
+        if check is None or check is _accept or not _is_json(content_type or "application/json"):
+            return []
+        try:
+            value = json.loads(body) if body else None
+        except ValueError:
+            return ["body: not valid JSON"]
+        errors = []
+        check(value, "body", errors)
+        return errors[:MAX_VALIDATION_ERRORS]
+
+
+class ValidatorCache:
+    """Process-wide LRU of compiled operations, keyed by operation definition hash."""
+
+    def __init__(self, size: int = VALIDATOR_CACHE_SIZE):
+        self.size = size
+        self._lock = threading.Lock()
+        self._validators = OrderedDict()
+        self.compiled = 0
+
+    def get(self, definition_hash: str) -> OperationValidator:
+        """The cached validator, or None."""
+        with self._lock:
+            validator = self._validators.get(definition_hash)
+            if validator is not None:
+                self._validators.move_to_end(definition_hash)
+            return validator
+
+    def compile(self, definition_hash: str, responses) -> OperationValidator:
+        """Compile an operation's ``responses`` (JSON text or dict) and cache the validator."""
+        if isinstance(responses, str):
+            responses = json.loads(responses or "{}")
+        validator = OperationValidator(responses or {})
+        with self._lock:
+            self._validators[definition_hash] = validator
+            self.compiled += 1
+            while len(self._validators) > self.size:
+                self._validators.popitem(last=False)
+        return validator
+
+
+cache = ValidatorCache()
+
+
+def _path_regex(template: str):
+    """``/users/{id}`` -> a regex matching ``/users/42``."""
+    return re.compile("^" + re.sub(r"\\{[^/]+?\\}", "[^/]+", re.escape(template)) + "$")
+
+
+class SpecValidators:
+    """The response validators of a spec's operations, matched to test cases by operation key."""
+
+    def __init__(self, validators: dict):
+        self.validators = validators
+        # Cases stored without an operation key are matched on their path against the templates
+        self.templates = []
+        for key in validators:
+            method, _, template = key.partition(" ")
+            self.templates.append((method, _path_regex(template), key))
+
+    def for_request(self, operation_key: str, method: str, endpoint: str):
+        if operation_key and operation_key in self.validators:
+            return self.validators[operation_key]
+        path = endpoint.split("?", 1)[0]
+        if "://" in path:
+            path = "/" + path.split("://", 1)[1].partition("/")[2]
+        method = method.upper()
+        for op_method, regex, key in self.templates:
+            if op_method == method and regex.match(path):
+                return self.validators[key]
+        return None
+
+    def validate(self, test_case, status: int, content_type: str, body: bytes) -> list:
+        validator = self.for_request(test_case.operation_key, test_case.method, test_case.endpoint)
+        return validator.validate(status, content_type, body) if validator else []
+
+
+def spec_validators(session: Session, spec_id: int) -> SpecValidators:
+    """Validators for every operation of a spec; only operations not cached yet are loaded and compiled."""
+    operations.ensure_operations(session, session.get(models.APISpec, spec_id))
+    hashes = dict(session.query(models.Operation.key, models.Operation.definition_hash)
+                  .filter(models.Operation.spec_id == spec_id))
+    # Compile whatever is not cached now, including entries evicted since they were last used
+    validators = {key: cache.get(definition_hash) for key, definition_hash in hashes.items()}
+    missing = [key for key, validator in validators.items() if validator is None]
+    if missing:
+        responses = dict(session.query(models.Operation.key, models.Operation.responses)
+                         .filter(models.Operation.spec_id == spec_id, models.Operation.key.in_(missing)))
+        for key in missing:
+            validators[key] = cache.compile(hashes[key], responses.get(key))
+    return SpecValidators(validators)
@@ -0,0 +1,192 @@
+"""Shared queue of test case batches for worker processes.
+
+A run is split into ``RunBatch`` rows. Workers lease one batch at a time and
+renew the lease with heartbeats while executing it; a batch whose lease runs
+out (its worker crashed or hung) becomes claimable again, up to
+``QUEUE_MAX_ATTEMPTS`` times. Claims and completions are conditional updates,
+so two workers can never both own a batch or both record its results.
+
+A run with a ``fail_fast`` or ``time_budget`` limit stops across all workers:
+once the recorded failures or the elapsed time reach it, its queued batches
+are skipped instead of claimed.
+"""
+import json
+import os
+from datetime import datetime, timedelta
+from sqlalchemy import and_, func, or_
+from sqlalchemy.orm import Session
+from . import models, prioritization, runs
+
+# Queue configuration
+QUEUE_BATCH_SIZE = int(os.getenv("QUEUE_BATCH_SIZE", "100"))
+QUEUE_LEASE_SECONDS = float(os.getenv("QUEUE_LEASE_SECONDS", "60"))
+QUEUE_MAX_ATTEMPTS = int(os.getenv("QUEUE_MAX_ATTEMPTS", "3"))
+CLAIM_RETRIES = 5
+
+
+def enqueue_run(session: Session, run: models.TestRun, changed_only: bool = False,
+                batch_size: int = QUEUE_BATCH_SIZE, prioritized: bool = False) -> int:
+    """Split a run's test cases into queued batches. Returns the number of batches.
+
+    Batches are claimed in order, so with ``prioritized`` the likeliest failures run first.
+    """
+    cases = runs.test_cases_query(session, run.spec_id, changed_only).with_entities(models.TestCase.id).all()
+    if prioritized:
+        cases = prioritization.prioritize(session, run.spec_id, cases)
+        runs.update_summary(run, order="priority")
+    ids = [tc.id for tc in cases]
+    batches = [
+        {"run_id": run.id, "test_case_ids": json.dumps(ids[i:i + batch_size]), "status": "queued", "attempts": 0}
+        for i in range(0, len(ids), batch_size)
+    ]
+    session.bulk_insert_mappings(models.RunBatch, batches)
+    session.commit()
+    if not batches:
+        runs.finish_run(session, run, passed=0, failed=0)
+    return len(batches)
+
+
+def budget_left(session: Session, run: models.TestRun) -> tuple:
+    """``(failures, seconds)`` the run may still spend under its ``fail_fast``/``time_budget`` (None: no limit)."""
+    failures = seconds = None
+    if run.fail_fast:
+        failed = session.query(func.coalesce(func.sum(models.RunBatch.failed), 0))\
+            .filter(models.RunBatch.run_id == run.id, models.RunBatch.status == "done").scalar()
+        failures = run.fail_fast - failed
+    if run.time_budget:
+        seconds = run.time_budget - (datetime.utcnow() - run.started_at).total_seconds()
+    return failures, seconds
+
+
+def _stop_reason(failures, seconds):
+    if failures is not None and failures <= 0:
+        return "fail_fast"
+    if seconds is not None and seconds <= 0:
+        return "time_budget"
+    return None
+
+
+def skip_if_exhausted(session: Session, run_id: int) -> bool:
+    """Skip a run's queued batches once it used up its budget. Returns whether it has."""
+    run = session.get(models.TestRun, run_id)
+    if run is None or run.status != "running" or not (run.fail_fast or run.time_budget):
+        return False
+    if _stop_reason(*budget_left(session, run)) is None:
+        return False
+    session.query(models.RunBatch)\
+        .filter(models.RunBatch.run_id == run_id, models.RunBatch.status == "queued")\
+        .update({"status": "skipped", "finished_at": datetime.utcnow(), "passed": 0, "failed": 0},
+                synchronize_session=False)
+    session.commit()
+    return True
+
+
+def _claimable(now: datetime):
+    expired = and_(models.RunBatch.status == "leased", models.RunBatch.lease_expires_at < now)
+    return and_(or_(models.RunBatch.status == "queued", expired), models.RunBatch.attempts < QUEUE_MAX_ATTEMPTS)
+
+
+def _fail_exhausted(session: Session, now: datetime):
+    """Give up on batches whose lease expired on their last attempt; their cases count as failed."""
+    exhausted = session.query(models.RunBatch).filter(
+        models.RunBatch.status == "leased", models.RunBatch.lease_expires_at < now,
+        models.RunBatch.attempts >= QUEUE_MAX_ATTEMPTS,
+    ).all()
+    for batch in exhausted:
+        claimed = session.query(models.RunBatch)\
+            .filter(models.RunBatch.id == batch.id, models.RunBatch.status == "leased")\
+            .update({"status": "failed", "finished_at": now, "passed": 0,
+                     "failed": len(json.loads(batch.test_case_ids))}, synchronize_session=False)
+        session.commit()
+        if claimed:
+            print(f"Batch {batch.id} of run {batch.run_id} failed after {batch.attempts} attempts")
+            finish_run_if_done(session, batch.run_id)
+
+
+def lease_batch(session: Session, worker_id: str, lease_seconds: float = QUEUE_LEASE_SECONDS):
+    """Claim the oldest claimable batch for ``worker_id``, or return None if there is none."""
+    now = datetime.utcnow()
+    _fail_exhausted(session, now)
+    for _ in range(CLAIM_RETRIES):
+        candidate = session.query(models.RunBatch.id).filter(_claimable(now))\
+            .order_by(models.RunBatch.id).with_for_update(skip_locked=True).first()
+        if candidate is None:
+            session.rollback()
+            return None
+        claimed = session.query(models.RunBatch)\
+            .filter(models.RunBatch.id == candidate.id, _claimable(now))\
+            .update({"status": "leased", "worker_id": worker_id,
+                     "lease_expires_at": now + timedelta(seconds=lease_seconds),
+                     "attempts": models.RunBatch.attempts + 1}, synchronize_session=False)
+        session.commit()
+        if not claimed:
+            # Another worker won this one; try the next
+            continue
+        batch = session.get(models.RunBatch, candidate.id)
+        if skip_if_exhausted(session, batch.run_id):
+            # The run hit its limit while this batch waited; give it up along with the rest
+            session.query(models.RunBatch).filter(models.RunBatch.id == batch.id)\
+                .update({"status": "skipped", "finished_at": datetime.utcnow(), "passed": 0, "failed": 0},
+                        synchronize_session=False)
+            session.commit()
+            finish_run_if_done(session, batch.run_id)
+            continue
+        return batch
+    return None
+
+
+def heartbeat(session: Session, batch_id: int, worker_id: str, lease_seconds: float = QUEUE_LEASE_SECONDS) -> bool:
+    """Extend a held lease. False means the lease was lost and the batch will be re-run elsewhere."""
+    renewed = session.query(models.RunBatch)\
+        .filter(models.RunBatch.id == batch_id, models.RunBatch.worker_id == worker_id,
+                models.RunBatch.status == "leased")\
+        .update({"lease_expires_at": datetime.utcnow() + timedelta(seconds=lease_seconds)},
+                synchronize_session=False)
+    session.commit()
+    return bool(renewed)
+
+
+def complete_batch(session: Session, batch: models.RunBatch, worker_id: str, results) -> bool:
+    """Record a batch's results, unless its lease was lost in the meantime (then they are discarded)."""
+    passed = sum(1 for r in results if r["success"])
+    owned = session.query(models.RunBatch)\
+        .filter(models.RunBatch.id == batch.id, models.RunBatch.worker_id == worker_id,
+                models.RunBatch.status == "leased")\
+        .update({"status": "done", "finished_at": datetime.utcnow(), "passed": passed,
+                 "failed": len(results) - passed}, synchronize_session=False)
+    if not owned:
+        session.rollback()
+        return False
+
+    rows, captures = [], []
+    for r in results:
+        r = {**r, "run_id": batch.run_id}
+        if "capture" in r:
+            captures.append({**r.pop("capture"), "run_id": batch.run_id, "test_case_id": r["test_case_id"]})
+        rows.append(r)
+    session.bulk_insert_mappings(models.TestResult, rows)
+    if captures:
+        session.bulk_insert_mappings(models.ResponseCapture, captures)
+    session.commit()
+    skip_if_exhausted(session, batch.run_id)
+    finish_run_if_done(session, batch.run_id)
+    return True
+
+
+def finish_run_if_done(session: Session, run_id: int):
+    """Close the run once none of its batches are queued or leased."""
+    pending = session.query(func.count(models.RunBatch.id))\
+        .filter(models.RunBatch.run_id == run_id, models.RunBatch.status.in_(("queued", "leased"))).scalar()
+    if pending:
+        return
+    run = session.get(models.TestRun, run_id)
+    if run is None or run.status != "running":
+        return
+    passed, failed = session.query(func.coalesce(func.sum(models.RunBatch.passed), 0),
+                                   func.coalesce(func.sum(models.RunBatch.failed), 0))\
+        .filter(models.RunBatch.run_id == run_id).one()
+    skipped = (run.total_tests or 0) - passed - failed
+    if skipped > 0 and (run.fail_fast or run.time_budget):
+        runs.update_summary(run, stopped=_stop_reason(*budget_left(session, run)), skipped=skipped)
+    runs.finish_run(session, run, passed=passed, failed=failed)
+    runs.compact_runs(session, run.spec_id)
@@ -0,0 +1,89 @@
+import json
+import os
+from datetime import datetime
+from sqlalchemy.orm import Session
+from . import db, events, models
+
+# Number of runs (with their results) kept per spec; older ones are compacted away
+RUN_RETENTION = int(os.getenv("RUN_RETENTION", "20"))
+
+
+def test_cases_query(session: Session, spec_id: int, changed_only: bool = False):
+    """The test cases a run of the spec executes.
+
+    With ``changed_only`` only cases generated for the spec's current version
+    (i.e. added or changed operations of the latest re-upload) are included.
+    """
+    query = session.query(models.TestCase).filter(models.TestCase.spec_id == spec_id)
+    if changed_only:
+        current_version = session.query(models.APISpec.version).filter(models.APISpec.id == spec_id).scalar_subquery()
+        query = query.filter(models.TestCase.spec_version == current_version)
+    return query.order_by(models.TestCase.id)
+
+
+def start_run(session: Session, spec_id: int, changed_only: bool = False, mode: str = "functional",
+              environment_id: int = None, fail_fast: int = None, time_budget: float = None) -> models.TestRun:
+    """Open a new run for a spec. Previous runs and their results are left untouched."""
+    total = test_cases_query(session, spec_id, changed_only).count() if mode == "functional" else 0
+    run = models.TestRun(spec_id=spec_id, status="running", mode=mode, total_tests=total,
+                         environment_id=environment_id, fail_fast=fail_fast, time_budget=time_budget)
+    session.add(run)
+    session.commit()
+    session.refresh(run)
+    return run
+
+
+def finish_run(session: Session, run: models.TestRun, passed: int, failed: int, status: str = "completed"):
+    run.finished_at = datetime.utcnow()
+    run.passed = passed
+    run.failed = failed
+    run.status = status
+    run.duration_ms = int((run.finished_at - run.started_at).total_seconds() * 1000)
+    session.commit()
+    events.broker.publish(run.id, {"type": "finished", "status": status, "counters": run_counters(run)})
+
+
+def update_summary(run: models.TestRun, **fields):
+    """Merge ``fields`` into the run's JSON summary (committed by the caller)."""
+    summary = json.loads(run.summary) if run.summary else {}
+    summary.update(fields)
+    run.summary = json.dumps(summary)
+
+
+def run_counters(run: models.TestRun) -> dict:
+    return {"total": run.total_tests or 0, "done": (run.passed or 0) + (run.failed or 0),
+            "passed": run.passed or 0, "failed": run.failed or 0}
+
+
+def fail_run(run_id: int):
+    """Mark a run failed in a session of its own, whatever state the caller's session is in."""
+    with db.SessionLocal() as session:
+        finish_run(session, session.get(models.TestRun, run_id), passed=0, failed=0, status="failed")
+
+
+def compact_runs(session: Session, spec_id: int, keep: int = RUN_RETENTION) -> int:
+    """Delete all but the ``keep`` most recent runs of a spec. Returns the number of runs removed."""
+    old_run_ids = [
+        run_id for (run_id,) in session.query(models.TestRun.id)
+        .filter(models.TestRun.spec_id == spec_id, models.TestRun.status != "running")
+        .order_by(models.TestRun.id.desc())
+        .offset(keep)
+    ]
+    if not old_run_ids:
+        return 0
+
+    # Bulk deletes on the indexed run_id column rather than loading rows through the ORM cascade
+    session.query(models.TestResult).filter(models.TestResult.run_id.in_(old_run_ids))\
+        .delete(synchronize_session=False)
+    session.query(models.LoadStat).filter(models.LoadStat.run_id.in_(old_run_ids))\
+        .delete(synchronize_session=False)
+    session.query(models.ResponseCapture).filter(models.ResponseCapture.run_id.in_(old_run_ids))\
+        .delete(synchronize_session=False)
+    session.query(models.ScenarioResult).filter(models.ScenarioResult.run_id.in_(old_run_ids))\
+        .delete(synchronize_session=False)
+    session.query(models.RunBatch).filter(models.RunBatch.run_id.in_(old_run_ids))\
+        .delete(synchronize_session=False)
+    session.query(models.TestRun).filter(models.TestRun.id.in_(old_run_ids))\
+        .delete(synchronize_session=False)
+    session.commit()
+    return len(old_run_ids)
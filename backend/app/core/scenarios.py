@@ -0,0 +1,189 @@
+"""Stateful scenarios: flows whose steps feed values from earlier responses into later requests.
+
+A step lists the steps it ``depends_on`` and the values it ``extract``s from
+its response, e.g. ``{"user_id": "body.id", "etag": "headers.etag"}``.
+Downstream steps use them as ``{{user_id}}`` in their endpoint, headers or
+payload. The steps form a DAG, so independent branches can run concurrently.
+"""
+import json
+import re
+from urllib.parse import quote
+from sqlalchemy.orm import Session
+from . import models
+
+VARIABLE = re.compile(r"\{\{\s*([A-Za-z_]\w*)\s*\}\}")
+EXTRACT_SOURCES = ("body", "headers", "status")
+
+
+class ScenarioError(Exception):
+    pass
+
+
+def _variables_in(value) -> set:
+    if isinstance(value, str):
+        return set(VARIABLE.findall(value))
+    if isinstance(value, dict):
+        return set().union(*(_variables_in(v) for v in value.values()))
+    if isinstance(value, list):
+        return set().union(*(_variables_in(v) for v in value))
+    return set()
+
+
+def topological_order(steps: list) -> list:
+    """Step names ordered so every step comes after its dependencies (definition order among peers)."""
+    names = [s["name"] for s in steps]
+    pending = {s["name"]: set(s.get("depends_on") or ()) for s in steps}
+    order = []
+    while pending:
+        ready = [n for n in names if n in pending and not pending[n]]
+        if not ready:
+            raise ScenarioError(f"Dependency cycle between steps: {', '.join(sorted(pending))}")
+        for name in ready:
+            order.append(name)
+            del pending[name]
+        for deps in pending.values():
+            deps.difference_update(ready)
+    return order
+
+
+def validate_steps(steps: list) -> list:
+    """Check that a scenario's steps form a DAG and only use variables extracted by their ancestors.
+
+    Returns the step names in topological order.
+    """
+    if not steps:
+        raise ScenarioError("A scenario needs at least one step")
+    by_name, owners = {}, {}
+    for step in steps:
+        name = step["name"]
+        if name in by_name:
+            raise ScenarioError(f"Duplicate step name '{name}'")
+        by_name[name] = step
+        for variable, expression in (step.get("extract") or {}).items():
+            if not re.fullmatch(r"[A-Za-z_]\w*", variable):
+                raise ScenarioError(f"Step '{name}': invalid variable name '{variable}'")
+            if variable in owners:
+                # Parallel branches share one variable scope, so each name has a single writer
+                raise ScenarioError(f"Variable '{variable}' is extracted by both '{owners[variable]}' and '{name}'")
+            if expression.split(".", 1)[0] not in EXTRACT_SOURCES:
+                raise ScenarioError(f"Step '{name}': '{expression}' must start with "
+                                    f"one of {', '.join(EXTRACT_SOURCES)}")
+            owners[variable] = name
+    for step in steps:
+        for dep in step.get("depends_on") or ():
+            if dep not in by_name:
+                raise ScenarioError(f"Step '{step['name']}' depends on unknown step '{dep}'")
+
+    order = topological_order(steps)
+    ancestors = {}
+    for name in order:
+        deps = by_name[name].get("depends_on") or ()
+        ancestors[name] = set(deps).union(*(ancestors[d] for d in deps))
+        step = by_name[name]
+        used = _variables_in([step["endpoint"], step.get("headers") or {}, step.get("payload")])
+        available = {v for v, owner in owners.items() if owner in ancestors[name]}
+        missing = used - available
+        if missing:
+            raise ScenarioError(f"Step '{name}' uses {', '.join(sorted(missing))} "
+                                f"without depending on the step that extracts it")
+    return order
+
+
+def render(value, variables: dict, quote_values: bool = False):
+    """Fill ``{{name}}`` placeholders. A string that is only a placeholder takes the value as is (keeping its type)."""
+    if isinstance(value, str):
+        whole = VARIABLE.fullmatch(value)
+        if whole and not quote_values:
+            return variables[whole.group(1)]
+
+        def _sub(match):
+            text = str(variables[match.group(1)])
+            return quote(text, safe="") if quote_values else text
+
+        return VARIABLE.sub(_sub, value)
+    if isinstance(value, dict):
+        return {k: render(v, variables) for k, v in value.items()}
+    if isinstance(value, list):
+        return [render(v, variables) for v in value]
+    return value
+
+
+def extract(expression: str, status: int, headers, body):
+    """Evaluate ``status``, ``headers.<name>`` or ``body[.key|.index...]`` against a response."""
+    source, _, path = expression.partition(".")
+    if source == "status":
+        return status
+    if source == "headers":
+        if path.lower() not in headers:
+            raise ScenarioError(f"No '{path}' header in the response")
+        return headers[path.lower()]
+    value = body
+    for part in path.split(".") if path else ():
+        if isinstance(value, list) and part.lstrip("-").isdigit() and -len(value) <= int(part) < len(value):
+            value = value[int(part)]
+        elif isinstance(value, dict) and part in value:
+            value = value[part]
+        else:
+            raise ScenarioError(f"'{expression}' not found in the response body")
+    return value
+
+
+def create_scenario(session: Session, spec_id: int, name: str, steps: list, description: str = None) -> models.Scenario:
+    validate_steps(steps)
+    scenario = models.Scenario(spec_id=spec_id, name=name, description=description)
+    scenario.steps = [
+        models.ScenarioStep(
+            name=s["name"],
+            position=i,
+            method=s["method"].upper(),
+            endpoint=s["endpoint"],
+            payload=json.dumps(s["payload"]) if s.get("payload") is not None else None,
+            headers=json.dumps(s.get("headers") or {}),
+            depends_on=json.dumps(list(s.get("depends_on") or ())),
+            extract=json.dumps(s.get("extract") or {}),
+            expect_status=s.get("expect_status"),
+        )
+        for i, s in enumerate(steps)
+    ]
+    session.add(scenario)
+    session.commit()
+    session.refresh(scenario)
+    return scenario
+
+
+def delete_scenario(session: Session, scenario: models.Scenario):
+    session.query(models.ScenarioResult).filter(models.ScenarioResult.scenario_id == scenario.id)\
+        .delete(synchronize_session=False)
+    session.delete(scenario)
+    session.commit()
+
+
+def step_dict(row: models.ScenarioStep) -> dict:
+    return {
+        "id": row.id,
+        "name": row.name,
+        "method": row.method,
+        "endpoint": row.endpoint,
+        "payload": json.loads(row.payload) if row.payload else None,
+        "headers": json.loads(row.headers or "{}"),
+        "depends_on": json.loads(row.depends_on or "[]"),
+        "extract": json.loads(row.extract or "{}"),
+        "expect_status": row.expect_status,
+    }
+
+
+def scenario_dict(row: models.Scenario) -> dict:
+    return {
+        "id": row.id,
+        "spec_id": row.spec_id,
+        "name": row.name,
+        "description": row.description,
+        "steps": [step_dict(step) for step in row.steps],
+    }
+
+
+def scenarios_query(session: Session, spec_id: int, scenario_id: int = None):
+    query = session.query(models.Scenario).filter(models.Scenario.spec_id == spec_id)
+    if scenario_id is not None:
+        query = query.filter(models.Scenario.id == scenario_id)
+    return query.order_by(models.Scenario.id)
@@ -0,0 +1,294 @@
+"""Deterministic, offline test generation from an operation's JSON Schemas.
+
+Walks the request body schema (or the query parameters for methods without
+a body) and emits valid, empty, boundary, missing-required, type-violation,
+out-of-range, oversized and injection payloads. No network or LLM involved.
+"""
+import json
+from urllib.parse import quote, urlencode
+
+OVERSIZED_STRING_LENGTH = 10000
+MAX_FIELD_CASES = 10  # Cap on per-field variants (missing/type violation) for wide schemas
+MAX_DEPTH = 5
+
+INJECTION_PAYLOADS = [
+    "' OR '1'='1' --",
+    "\"; DROP TABLE users; --",
+    "<script>alert(1)</script>",
+    "{\"$ne\": null}",
+    "../../../../etc/passwd",
+    "; cat /etc/passwd",
+    "%s%s%s%n",
+    "${jndi:ldap://127.0.0.1/a}",
+]
+
+BODY_METHODS = {"POST", "PUT", "PATCH"}
+
+FORMAT_EXAMPLES = {
+    "email": "user@example.com",
+    "uuid": "123e4567-e89b-12d3-a456-426614174000",
+    "date": "2024-01-01",
+    "date-time": "2024-01-01T00:00:00Z",
+    "uri": "https://example.com",
+    "url": "https://example.com",
+    "hostname": "example.com",
+    "ipv4": "127.0.0.1",
+    "ipv6": "::1",
+    "password": "P@ssw0rd!",
+    "byte": "dGVzdA==",
+}
+
+WRONG_TYPE_VALUES = {
+    "string": 12345,
+    "integer": "not-a-number",
+    "number": "not-a-number",
+    "boolean": "not-a-boolean",
+    "array": {"not": "an array"},
+    "object": ["not", "an", "object"],
+}
+
+
+def _type(schema: dict) -> str:
+    t = schema.get("type")
+    if isinstance(t, list):
+        t = next((x for x in t if x != "null"), "string")
+    if t:
+        return t
+    if "properties" in schema:
+        return "object"
+    if "items" in schema:
+        return "array"
+    for combinator in ("allOf", "oneOf", "anyOf"):
+        if schema.get(combinator):
+            return _type(_merge(schema))
+    return "string"
+
+
+def _merge(schema: dict) -> dict:
+    """Flatten ``allOf`` and pick the first ``oneOf``/``anyOf`` branch."""
+    merged = {k: v for k, v in schema.items() if k not in ("allOf", "oneOf", "anyOf")}
+    parts = list(schema.get("allOf") or [])
+    for combinator in ("oneOf", "anyOf"):
+        if schema.get(combinator):
+            parts.append(schema[combinator][0])
+    for part in parts:
+        if not isinstance(part, dict):
+            continue
+        part = _merge(part)
+        merged.setdefault("type", part.get("type"))
+        merged["properties"] = {**part.get("properties", {}), **merged.get("properties", {})}
+        merged["required"] = list(dict.fromkeys(merged.get("required", []) + part.get("required", [])))
+        for k, v in part.items():
+            merged.setdefault(k, v)
+    if merged.get("type") is None:
+        merged.pop("type", None)
+    return merged
+
+
+def example_value(schema: dict, depth: int = 0):
+    """A value that conforms to ``schema``."""
+    schema = _merge(schema or {})
+    for key in ("const", "example", "default"):
+        if key in schema:
+            return schema[key]
+    if schema.get("enum"):
+        return schema["enum"][0]
+
+    t = _type(schema)
+    if t == "object":
+        if depth >= MAX_DEPTH:
+            return {}
+        return {name: example_value(prop, depth + 1) for name, prop in (schema.get("properties") or {}).items()}
+    if t == "array":
+        if depth >= MAX_DEPTH:
+            return []
+        count = max(1, schema.get("minItems", 1))
+        return [example_value(schema.get("items") or {}, depth + 1) for _ in range(count)]
+    if t == "integer":
+        return _number_in_range(schema, 1, int)
+    if t == "number":
+        return _number_in_range(schema, 1.5, float)
+    if t == "boolean":
+        return True
+    if schema.get("format") in FORMAT_EXAMPLES:
+        return FORMAT_EXAMPLES[schema["format"]]
+    value = "test"
+    if schema.get("minLength", 0) > len(value):
+        value = value.ljust(schema["minLength"], "x")
+    if "maxLength" in schema:
+        value = value[:schema["maxLength"]]
+    return value
+
+
+def _number_in_range(schema: dict, preferred, cast):
+    low, high = _bounds(schema)
+    value = preferred
+    if low is not None and value < low:
+        value = low
+    if high is not None and value > high:
+        value = high
+    return cast(value)
+
+
+def _bounds(schema: dict):
+    low = schema.get("minimum")
+    high = schema.get("maximum")
+    step = 1 if _type(schema) == "integer" else 0.01
+    if schema.get("exclusiveMinimum") is True and low is not None:
+        low += step
+    elif isinstance(schema.get("exclusiveMinimum"), (int, float)) and not isinstance(schema["exclusiveMinimum"], bool):
+        low = schema["exclusiveMinimum"] + step
+    if schema.get("exclusiveMaximum") is True and high is not None:
+        high -= step
+    elif isinstance(schema.get("exclusiveMaximum"), (int, float)) and not isinstance(schema["exclusiveMaximum"], bool):
+        high = schema["exclusiveMaximum"] - step
+    return low, high
+
+
+def _limit_value(schema: dict, which: str, outside: bool = False):
+    """The value at (or just past, with ``outside``) the lower/upper limit, or None if undeclared."""
+    schema = _merge(schema)
+    t = _type(schema)
+    if t in ("integer", "number"):
+        low, high = _bounds(schema)
+        step = 1 if t == "integer" else 0.01
+        if which == "min" and low is not None:
+            return low - step if outside else low
+        if which == "max" and high is not None:
+            return high + step if outside else high
+    elif t == "string":
+        key = "minLength" if which == "min" else "maxLength"
+        if key in schema:
+            length = schema[key] + ((-1 if which == "min" else 1) if outside else 0)
+            return "x" * length if length >= 0 else None
+    elif t == "array":
+        key = "minItems" if which == "min" else "maxItems"
+        if key in schema:
+            count = schema[key] + ((-1 if which == "min" else 1) if outside else 0)
+            return [example_value(schema.get("items") or {}, 1) for _ in range(count)] if count >= 0 else None
+    return None
+
+
+def _with_fields(base: dict, fields: dict, make):
+    """Copy of ``base`` with ``make(schema)`` applied to each field that yields a value."""
+    out = dict(base)
+    changed = False
+    for name, schema in fields.items():
+        value = make(schema)
+        if value is not None:
+            out[name] = value
+            changed = True
+    return out if changed else None
+
+
+def _input_schema(op: dict):
+    """The object schema the generated payload fills in, or None if the operation declares none."""
+    if op["method"] in BODY_METHODS:
+        body = op.get("request_body") or {}
+        for media_type, media in (body.get("content") or {}).items():
+            if "json" in media_type and isinstance(media, dict) and media.get("schema"):
+                return _merge(media["schema"])
+        for media in (body.get("content") or {}).values():
+            if isinstance(media, dict) and media.get("schema"):
+                return _merge(media["schema"])
+        return None
+
+    query = [p for p in op.get("parameters") or [] if isinstance(p, dict) and p.get("in") == "query"]
+    if not query:
+        return None
+    return {
+        "type": "object",
+        "properties": {p["name"]: p.get("schema") or {} for p in query if p.get("name")},
+        "required": [p["name"] for p in query if p.get("required") and p.get("name")],
+    }
+
+
+def _fill_path(op: dict) -> str:
+    path = op["path"]
+    for p in op.get("parameters") or []:
+        if isinstance(p, dict) and p.get("in") == "path" and p.get("name"):
+            value = example_value(p.get("schema") or {})
+            path = path.replace("{" + p["name"] + "}", quote(str(value), safe=""))
+    return path
+
+
+def _to_test(op: dict, endpoint: str, payload, category: str) -> dict:
+    test = {"endpoint": endpoint, "method": op["method"], "payload": payload, "operation": op["key"],
+            "category": category}
+    if op["method"] not in BODY_METHODS and isinstance(payload, dict):
+        # Same convention as the LLM generators: non-body methods carry their inputs in the query string
+        if payload:
+            query = {k: v if isinstance(v, (str, int, float, bool, list)) else json.dumps(v) for k, v in payload.items()}
+            test["endpoint"] = endpoint + "?" + urlencode(query, doseq=True)
+        test["payload"] = {}
+    return test
+
+
+def covers(op: dict) -> bool:
+    """Whether the schema engine has a schema to work from for this operation."""
+    return _input_schema(op) is not None
+
+
+def generate_operation_tests(op: dict):
+    """Generate the deterministic test cases for one normalized operation."""
+    endpoint = _fill_path(op)
+    schema = _input_schema(op)
+    if schema is None:
+        payload = {} if op["method"] not in BODY_METHODS else {"test": "data"}
+        return [_to_test(op, endpoint, {}, "empty")] + (
+            [_to_test(op, endpoint, payload, "valid")] if payload else []
+        )
+
+    if _type(schema) != "object":
+        # Non-object bodies (arrays, scalars): valid value plus one type violation
+        return [
+            _to_test(op, endpoint, example_value(schema), "valid"),
+            _to_test(op, endpoint, WRONG_TYPE_VALUES.get(_type(schema), None), "type_violation"),
+        ]
+
+    fields = schema.get("properties") or {}
+    required = [name for name in schema.get("required") or [] if name in fields]
+    valid = example_value(schema)
+    cases = [("valid", valid), ("empty", {})]
+
+    for which in ("min", "max"):
+        payload = _with_fields(valid, fields, lambda s: _limit_value(s, which))
+        if payload is not None:
+            cases.append(("boundary", payload))
+
+    for name in required[:MAX_FIELD_CASES]:
+        cases.append(("missing_required", {k: v for k, v in valid.items() if k != name}))
+
+    for name in list(fields)[:MAX_FIELD_CASES]:
+        wrong = WRONG_TYPE_VALUES.get(_type(_merge(fields[name])))
+        if wrong is not None:
+            cases.append(("type_violation", {**valid, name: wrong}))
+
+    for which in ("min", "max"):
+        payload = _with_fields(valid, fields, lambda s: _limit_value(s, which, outside=True))
+        if payload is not None:
+            cases.append(("out_of_range", payload))
+
+    strings = {n: s for n, s in fields.items() if _type(_merge(s)) == "string"}
+    arrays = {n: s for n, s in fields.items() if _type(_merge(s)) == "array"}
+    oversized = {**valid}
+    for name in strings:
+        oversized[name] = "A" * OVERSIZED_STRING_LENGTH
+    for name, s in arrays.items():
+        oversized[name] = [example_value(_merge(s).get("items") or {}, 1)] * 1000
+    if strings or arrays:
+        cases.append(("oversized", oversized))
+
+    if strings:
+        for injection in INJECTION_PAYLOADS:
+            cases.append(("injection", {**valid, **{name: injection for name in strings}}))
+
+    return [_to_test(op, endpoint, payload, category) for category, payload in cases]
+
+
+def generate_schema_tests(operations):
+    """Generate deterministic test cases for a list of normalized operations."""
+    tests = []
+    for op in operations:
+        tests.extend(generate_operation_tests(op))
+    return tests
@@ -0,0 +1,161 @@
+import hashlib
+import json
+import os
+import tempfile
+
+try:
+    import yaml
+    YAML_AVAILABLE = True
+except ImportError:
+    YAML_AVAILABLE = False
+
+CHUNK_SIZE = 1024 * 1024
+YAML_EXTENSIONS = (".yaml", ".yml")
+HTTP_METHODS = {"get", "put", "post", "delete", "options", "head", "patch", "trace"}
+
+
+class SpecParseError(Exception):
+    pass
+
+
+def store_upload(fileobj, upload_dir: str, filename: str):
+    """Stream an upload to ``upload_dir`` under the SHA-256 of its bytes.
+
+    The file is hashed while it is written, so it is never held in memory.
+    Identical uploads share one stored file and different files with the same
+    name no longer overwrite each other. Returns ``(sha256, file_path)``.
+    """
+    ext = os.path.splitext(filename or "")[1].lower()
+    if ext not in YAML_EXTENSIONS:
+        ext = ".json"
+
+    digest = hashlib.sha256()
+    fd, tmp_path = tempfile.mkstemp(dir=upload_dir, suffix=".part")
+    try:
+        with os.fdopen(fd, "wb") as out:
+            while True:
+                chunk = fileobj.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                digest.update(chunk)
+                out.write(chunk)
+        content_hash = digest.hexdigest()
+        file_path = os.path.join(upload_dir, content_hash + ext)
+        if os.path.exists(file_path):
+            os.remove(tmp_path)
+        else:
+            os.replace(tmp_path, file_path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return content_hash, file_path
+
+
+def load_spec(file_path: str):
+    """Parse a stored JSON or YAML spec. Returns ``(spec, content)``.
+
+    ``content`` is the JSON text to keep on the ``APISpec`` row: the file as
+    uploaded for JSON specs, and the converted document for YAML ones.
+    """
+    if file_path.lower().endswith(YAML_EXTENSIONS):
+        if not YAML_AVAILABLE:
+            raise SpecParseError("YAML specs need PyYAML. Install with: pip install pyyaml")
+        try:
+            with open(file_path, "r", encoding="utf-8") as f:
+                spec = yaml.load(f, Loader=getattr(yaml, "CSafeLoader", yaml.SafeLoader))
+        except yaml.YAMLError as e:
+            raise SpecParseError(f"Invalid YAML file: {str(e)}")
+        content = json.dumps(spec, default=str)
+    else:
+        try:
+            with open(file_path, "r", encoding="utf-8") as f:
+                content = f.read()
+            spec = json.loads(content)
+        except json.JSONDecodeError as e:
+            raise SpecParseError(f"Invalid JSON file: {str(e)}")
+
+    if not isinstance(spec, dict):
+        raise SpecParseError("Spec must be a JSON/YAML object")
+    return spec, content
+
+
+def _lookup(spec: dict, ref: str):
+    node = spec
+    for part in ref[2:].split("/"):
+        part = part.replace("~1", "/").replace("~0", "~")
+        if isinstance(node, dict) and part in node:
+            node = node[part]
+        elif isinstance(node, list) and part.isdigit() and int(part) < len(node):
+            node = node[int(part)]
+        else:
+            return None
+    return node
+
+
+def resolve_refs(node, spec: dict, _stack=()):
+    """Inline local ``$ref``s (``#/components/...``) in ``node``.
+
+    Recursive references are left as ``{"$ref": ...}`` at the point where
+    they would loop; external references are left untouched.
+    """
+    if isinstance(node, dict):
+        ref = node.get("$ref")
+        if isinstance(ref, str) and ref.startswith("#/"):
+            if ref in _stack:
+                return {"$ref": ref}
+            target = _lookup(spec, ref)
+            if target is not None:
+                resolved = resolve_refs(target, spec, _stack + (ref,))
+                siblings = {k: resolve_refs(v, spec, _stack) for k, v in node.items() if k != "$ref"}
+                return {**resolved, **siblings} if siblings and isinstance(resolved, dict) else resolved
+        return {k: resolve_refs(v, spec, _stack) for k, v in node.items()}
+    if isinstance(node, list):
+        return [resolve_refs(v, spec, _stack) for v in node]
+    return node
+
+
+def base_url(spec: dict) -> str:
+    servers = spec.get("servers") or []
+    return servers[0]["url"] if servers and servers[0].get("url") else "http://localhost:8000"
+
+
+def iter_operations(spec: dict):
+    """Yield each operation of a spec in a normalized form.
+
+    Every item has the operation ``key`` (``"GET /users"``), its ``path``,
+    upper-case ``method``, ``operation_id``, and its ``definition`` with local
+    ``$ref``s resolved and path-level parameters merged in. ``parameters``,
+    ``request_body`` and ``responses`` are pulled out of the definition, and
+    ``hash`` covers the resolved definition, so edits to a shared component
+    count as a change to every operation using it. Path-level entries that
+    aren't HTTP methods (``parameters``, ``summary``...) are skipped.
+    """
+    for path, methods in (spec.get("paths") or {}).items():
+        methods = resolve_refs(methods or {}, spec)
+        shared_parameters = methods.get("parameters") or []
+        for method, definition in methods.items():
+            if method.lower() not in HTTP_METHODS or not isinstance(definition, dict):
+                continue
+            parameters = definition.get("parameters") or []
+            # Operation-level parameters override path-level ones with the same name/location
+            overridden = {(p.get("name"), p.get("in")) for p in parameters if isinstance(p, dict)}
+            parameters = [
+                p for p in shared_parameters
+                if isinstance(p, dict) and (p.get("name"), p.get("in")) not in overridden
+            ] + parameters
+            if parameters:
+                definition = {**definition, "parameters": parameters}
+
+            canonical = json.dumps(definition, sort_keys=True, separators=(",", ":"), default=str)
+            yield {
+                "key": f"{method.upper()} {path}",
+                "path": path,
+                "method": method.upper(),
+                "operation_id": definition.get("operationId"),
+                "definition": definition,
+                "parameters": parameters,
+                "request_body": definition.get("requestBody"),
+                "responses": definition.get("responses") or {},
+                "hash": hashlib.sha256(canonical.encode("utf-8")).hexdigest(),
+            }
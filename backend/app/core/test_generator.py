@@ -1,8 +1,12 @@
+import asyncio
+import httpx
 import json
-import time
 import os
 from urllib.parse import urlencode
 from dotenv import load_dotenv
+from .generation_cache import cache_key
+from .rate_limit import TokenBucket, backoff_delay
+from . import spec_parser, schema_generator
 
 # Add the parent directory to the path to find .env file
 current_dir = os.path.dirname(os.path.abspath(__file__))
@@ -28,81 +32,29 @@ for env_path in env_paths:
 HF_API_KEY = os.getenv("HF_API_KEY")
 # Using a known working model by default
 MODEL_NAME = os.getenv("MODEL_NAME", "gpt2")
+HF_API_URL = os.getenv("HF_API_URL", "https://api-inference.huggingface.co/models")
 
-# OpenAI Configuration
+# OpenAI Configuration (any OpenAI-compatible chat completions server works)
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
+OPENAI_MODEL = os.getenv("OPENAI_MODEL", "gpt-3.5-turbo")
+OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL", "https://api.openai.com/v1")
 USE_OPENAI = bool(OPENAI_API_KEY)
 
-try:
-    import openai
-    openai.api_key = OPENAI_API_KEY
-    OPENAI_AVAILABLE = True
-except ImportError:
-    OPENAI_AVAILABLE = False
-    print("OpenAI package not installed. Install with: pip install openai")
+# "auto": LLM if configured, else schema-based tests; "schema": schema-based only (offline);
+# "hybrid": schema-based tests for operations with schemas, LLM only for the rest
+GENERATOR_MODE = os.getenv("GENERATOR_MODE", "auto")
 
-# Hugging Face Hub
-try:
-    from huggingface_hub import InferenceApi
-    HUGGINGFACE_HUB_AVAILABLE = True
-except ImportError:
-    HUGGINGFACE_HUB_AVAILABLE = False
-    print("huggingface_hub package not installed. Install with: pip install huggingface_hub")
+# LLM scheduling: prompts in flight, provider request budget, and per-prompt retries
+LLM_CONCURRENCY = int(os.getenv("LLM_CONCURRENCY", "4"))
+LLM_REQUESTS_PER_MINUTE = float(os.getenv("LLM_REQUESTS_PER_MINUTE", "60"))
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "60"))
 
-
-def generate_basic_tests(spec_json: str):
-    """Generate basic test cases without AI when AI is not available."""
-    spec = json.loads(spec_json)
-    paths = spec.get("paths", {})
-    servers = spec.get("servers", [])
-    base_url = servers[0]["url"] if servers else "http://localhost:8000"
-    
-    all_tests = []
-    
-    for endpoint, methods in paths.items():
-        for method, details in methods.items():
-            # Generate basic test cases
-            basic_tests = [
-                {
-                    "endpoint": endpoint,
-                    "method": method.upper(),
-                    "payload": {}  # Empty payload as default
-                }
-            ]
-            
-            # For POST/PUT methods, add a basic payload test
-            if method.upper() in ["POST", "PUT"]:
-                basic_tests.append({
-                    "endpoint": endpoint,
-                    "method": method.upper(),
-                    "payload": {"test": "data"}  # Basic payload
-                })
-            
-            all_tests.extend(basic_tests)
-    
-    return all_tests
-
-
-def generate_openai_tests(spec_json: str):
-    """Generate test cases using OpenAI API."""
-    if not OPENAI_AVAILABLE:
-        raise Exception("OpenAI package not installed")
-    
-    spec = json.loads(spec_json)
-    paths = spec.get("paths", {})
-    servers = spec.get("servers", [])
-    base_url = servers[0]["url"] if servers else "http://localhost:8000"
-
-    all_tests = []
-
-    for endpoint, methods in paths.items():
-        for method, details in methods.items():
-            prompt = f"""
+PROMPT_TEMPLATE = """
 You are an expert API tester. Generate 5 JSON test cases for the following API:
 
-Endpoint: {method.upper()} {endpoint}
+Endpoint: {method} {endpoint}
 Base URL: {base_url}
-Payload schema: {details.get('requestBody', {})}
+Payload schema: {request_body}
 
 Rules:
 1. Include one valid payload.
@@ -117,174 +69,337 @@ Return ONLY a JSON array of objects in this exact format:
 No other text, just the JSON array.
 """
 
-            try:
-                response = openai.ChatCompletion.create(
-                    model="gpt-3.5-turbo",
-                    messages=[
-                        {"role": "system", "content": "You are an expert API tester that generates JSON test cases."},
-                        {"role": "user", "content": prompt}
-                    ],
-                    max_tokens=1000,
-                    temperature=0.7
-                )
-                
-                result_text = response.choices[0].message.content.strip()
-                
-                try:
-                    # Try to parse the response as JSON
-                    test_cases = json.loads(result_text)
-                except json.JSONDecodeError:
-                    # If that fails, try to extract JSON from the response
-                    start = result_text.find("[")
-                    end = result_text.rfind("]") + 1
-                    if start != -1 and end > start:
-                        json_text = result_text[start:end]
-                        test_cases = json.loads(json_text)
-                    else:
-                        raise Exception("Could not extract JSON from OpenAI response")
-                
-                # Process GET requests to move payload to query parameters
-                for t in test_cases:
-                    if t["method"].upper() == "GET" and isinstance(t.get("payload"), dict):
-                        if t["payload"]:
-                            t["endpoint"] += "?" + urlencode(t["payload"])
-                        t["payload"] = {}
-                
-                all_tests.extend(test_cases)
-                
-            except Exception as e:
-                print(f"Error calling OpenAI API for endpoint {method.upper()} {endpoint}: {e}")
-                continue
 
-    return all_tests
+class LLMError(Exception):
+    """An LLM call failed. ``retryable`` errors are retried with backoff."""
 
+    def __init__(self, message: str, retryable: bool = False, retry_after: float = None):
+        super().__init__(message)
+        self.retryable = retryable
+        self.retry_after = retry_after
 
-def generate_huggingface_tests(spec_json: str, max_retries: int = 5, retry_delay: int = 5):
-    """Generate test cases using Hugging Face Hub API."""
-    if not HUGGINGFACE_HUB_AVAILABLE:
-        raise Exception("huggingface_hub package not installed. Install with: pip install huggingface_hub")
-    
-    if not HF_API_KEY:
-        raise Exception("HF_API_KEY not found in environment variables")
-    
-    print(f"Using Hugging Face model: {MODEL_NAME}")
-    print(f"Model page: https://huggingface.co/{MODEL_NAME}")
-    
-    spec = json.loads(spec_json)
-    paths = spec.get("paths", {})
-    servers = spec.get("servers", [])
-    base_url = servers[0]["url"] if servers else "http://localhost:8000"
+
+class LLMConfigError(LLMError):
+    """The provider rejected the configuration (bad key, unknown model); retrying won't help."""
+
+
+def operation_key(endpoint: str, method: str) -> str:
+    """Identify an operation within a spec, e.g. ``"GET /users/{id}"``."""
+    return f"{method.upper()} {endpoint}"
+
+
+def _operations(spec, base_url: str = None):
+    """Normalize generator input to ``(operations, base_url)``.
+
+    ``spec`` is either a spec document (dict or JSON string) or a list of
+    already indexed operations (see ``core.operations``), which skips parsing.
+    """
+    if isinstance(spec, list):
+        return spec, base_url or "http://localhost:8000"
+    if isinstance(spec, (str, bytes)):
+        spec = json.loads(spec)
+    return list(spec_parser.iter_operations(spec)), base_url or spec_parser.base_url(spec)
+
+
+def generate_basic_tests(spec, base_url: str = None):
+    """Generate basic test cases without AI when AI is not available."""
+    ops, base_url = _operations(spec, base_url)
 
     all_tests = []
+
+    for op in ops:
+        # Generate basic test cases
+        basic_tests = [
+            {
+                "endpoint": op["path"],
+                "method": op["method"],
+                "payload": {},  # Empty payload as default
+                "operation": op["key"]
+            }
+        ]
+
+        # For POST/PUT methods, add a basic payload test
+        if op["method"] in ["POST", "PUT"]:
+            basic_tests.append({
+                "endpoint": op["path"],
+                "method": op["method"],
+                "payload": {"test": "data"},  # Basic payload
+                "operation": op["key"]
+            })
+
+        all_tests.extend(basic_tests)
     
-    # Initialize the Inference API client
-    inference = InferenceApi(repo_id=MODEL_NAME, token=HF_API_KEY)
+    return all_tests
 
-    for endpoint, methods in paths.items():
-        for method, details in methods.items():
-            prompt = f"""
-You are an expert API tester. Generate 5 JSON test cases for the following API:
 
-Endpoint: {method.upper()} {endpoint}
-Base URL: {base_url}
-Payload schema: {details.get('requestBody', {})}
+def build_prompt(endpoint: str, method: str, details: dict, base_url: str) -> str:
+    return PROMPT_TEMPLATE.format(
+        method=method.upper(),
+        endpoint=endpoint,
+        base_url=base_url,
+        request_body=details.get("requestBody", {}),
+    )
+
+
+def parse_test_cases(result_text: str):
+    """Extract the JSON array of test cases from an LLM response."""
+    try:
+        test_cases = json.loads(result_text)
+    except json.JSONDecodeError:
+        # If that fails, try to extract JSON from the response
+        start = result_text.find("[")
+        end = result_text.rfind("]") + 1
+        if start == -1 or end <= start:
+            raise ValueError("Could not extract JSON from LLM response")
+        test_cases = json.loads(result_text[start:end])
+
+    # Process GET requests to move payload to query parameters
+    for t in test_cases:
+        if t["method"].upper() == "GET" and isinstance(t.get("payload"), dict):
+            if t["payload"]:
+                t["endpoint"] += "?" + urlencode(t["payload"])
+            t["payload"] = {}
+
+    return test_cases
+
+
+def _retry_after(response: httpx.Response):
+    try:
+        return float(response.headers.get("Retry-After"))
+    except (TypeError, ValueError):
+        return None
+
+
+def _check_response(response: httpx.Response, provider: str):
+    if response.status_code in (401, 403, 404):
+        raise LLMConfigError(f"{provider} rejected the request ({response.status_code}): {response.text[:200]}")
+    if response.status_code == 429 or response.status_code >= 500:
+        raise LLMError(f"{provider} returned {response.status_code}", retryable=True,
+                       retry_after=_retry_after(response))
+    if response.status_code >= 400:
+        raise LLMError(f"{provider} returned {response.status_code}: {response.text[:200]}")
+
+
+async def _call_openai(client: httpx.AsyncClient, prompt: str) -> str:
+    response = await client.post(
+        f"{OPENAI_BASE_URL.rstrip('/')}/chat/completions",
+        headers={"Authorization": f"Bearer {OPENAI_API_KEY}"},
+        json={
+            "model": OPENAI_MODEL,
+            "messages": [
+                {"role": "system", "content": "You are an expert API tester that generates JSON test cases."},
+                {"role": "user", "content": prompt}
+            ],
+            "max_tokens": 1000,
+            "temperature": 0.7
+        },
+    )
+    _check_response(response, "OpenAI")
+    return response.json()["choices"][0]["message"]["content"].strip()
+
+
+async def _call_huggingface(client: httpx.AsyncClient, prompt: str) -> str:
+    response = await client.post(
+        f"{HF_API_URL.rstrip('/')}/{MODEL_NAME}",
+        headers={"Authorization": f"Bearer {HF_API_KEY}"},
+        json={"inputs": prompt, "parameters": {"max_new_tokens": 500, "return_full_text": False}},
+    )
+    if response.status_code == 503:
+        # Model is still loading; HF reports how long that should take
+        try:
+            estimated = float(response.json().get("estimated_time"))
+        except Exception:
+            estimated = None
+        raise LLMError("Hugging Face model loading", retryable=True, retry_after=estimated)
+    _check_response(response, "Hugging Face")
 
-Rules:
-1. Include one valid payload.
-2. Include one empty payload.
-3. Include one payload with extremely long string.
-4. Include one payload with invalid type.
-5. Include one payload with special characters for security testing.
+    data = response.json()
+    if isinstance(data, list) and len(data) > 0:
+        return data[0].get("generated_text", "")
+    raise LLMError(f"Hugging Face unexpected response: {data}")
 
-Return ONLY a JSON array of objects in this exact format:
-[{{"endpoint": "...", "method": "...", "payload": {{}}}}, ...]
 
-No other text, just the JSON array.
-"""
+PROVIDERS = {
+    "openai": _call_openai,
+    "huggingface": _call_huggingface,
+}
+
+PROVIDER_MODELS = {
+    "openai": lambda: f"openai:{OPENAI_MODEL}",
+    "huggingface": lambda: f"huggingface:{MODEL_NAME}",
+}
+
 
-            result_text = ""
-            for attempt in range(max_retries):
+async def _complete(call, client, prompt: str, limiter: TokenBucket, max_retries: int, retry_delay: float) -> str:
+    """Make one LLM call under the rate limiter, retrying with jittered exponential backoff."""
+    for attempt in range(max_retries):
+        await limiter.acquire()
+        try:
+            return await call(client, prompt)
+        except LLMConfigError:
+            raise
+        except LLMError as e:
+            if not e.retryable:
+                raise
+            delay = e.retry_after if e.retry_after is not None else backoff_delay(attempt, base=retry_delay)
+            if e.retry_after is not None:
+                # The provider told us when to come back, so hold every caller, not just this one
+                limiter.pause(delay)
+            print(f"{e}, retrying in {delay:.1f}s... ({attempt+1}/{max_retries})")
+        except httpx.HTTPError as e:
+            delay = backoff_delay(attempt, base=retry_delay)
+            print(f"LLM request error: {e}, retrying in {delay:.1f}s... ({attempt+1}/{max_retries})")
+        await asyncio.sleep(delay)
+    raise LLMError(f"No valid output after {max_retries} attempts")
+
+
+async def generate_llm_tests_async(spec, provider: str, max_retries: int = 5, retry_delay: float = 1.0,
+                                   concurrency: int = LLM_CONCURRENCY,
+                                   requests_per_minute: float = LLM_REQUESTS_PER_MINUTE, cache=None,
+                                   on_progress=None, base_url: str = None):
+    """Generate test cases for every operation of a spec, prompting the LLM for several operations at once.
+
+    At most ``concurrency`` prompts are in flight and calls are spread to stay
+    within ``requests_per_minute``. Results keep the spec's operation order.
+    With a ``GenerationCache``, operations whose definition, prompt and model
+    were seen before are served from the cache without an LLM call.
+    ``on_progress(done, total)`` is called as operations complete.
+    """
+    call = PROVIDERS[provider]
+    model = PROVIDER_MODELS[provider]()
+    ops, base_url = _operations(spec, base_url)
+
+    operations = [
+        (op["path"], op["method"], op["definition"],
+         cache_key(op["path"], op["method"], op["definition"], base_url, PROMPT_TEMPLATE, model))
+        for op in ops
+    ]
+    cached = cache.get_many([key for *_, key in operations]) if cache else {}
+    if cached:
+        print(f"Reusing cached tests for {len(cached)} of {len(operations)} operations")
+    generated = {}
+    done = len(cached)
+    if on_progress:
+        on_progress(done, len(operations))
+
+    limiter = TokenBucket(rate=requests_per_minute / 60.0, capacity=max(1.0, min(concurrency, requests_per_minute / 60.0)))
+    slots = asyncio.Semaphore(concurrency)
+
+    async with httpx.AsyncClient(timeout=LLM_TIMEOUT) as client:
+        async def _generate(endpoint, method, details, key):
+            nonlocal done
+            if key in cached:
+                return cached[key]
+            prompt = build_prompt(endpoint, method, details, base_url)
+            async with slots:
                 try:
-                    response = inference(
-                        inputs=prompt,
-                        parameters={
-                            "max_new_tokens": 500,
-                            "return_full_text": False
-                        }
-                    )
-                    
-                    if isinstance(response, dict) and "error" in response:
-                        error_msg = response["error"]
-                        if "loading" in str(error_msg).lower():
-                            print(f"Model loading, retrying in {retry_delay}s... ({attempt+1}/{max_retries})")
-                            time.sleep(retry_delay)
-                            continue
-                        elif "rate limit" in str(error_msg).lower():
-                            print(f"Rate limited, retrying in {retry_delay}s... ({attempt+1}/{max_retries})")
-                            time.sleep(retry_delay)
-                            continue
-                        elif "not found" in str(error_msg).lower():
-                            print(f"❌ Model not found: {error_msg}")
-                            print("   This model may not be available through the Inference API")
-                            print("   Try a different model like 'gpt2'")
-                            return []
-                        else:
-                            print(f"Hugging Face API error: {error_msg}")
-                            break
-                    elif isinstance(response, list) and len(response) > 0:
-                        result_text = response[0].get('generated_text', '')
-                        break
-                    else:
-                        print(f"Hugging Face unexpected response: {response}")
-                        break
-                        
+                    result_text = await _complete(call, client, prompt, limiter, max_retries, retry_delay)
+                    test_cases = parse_test_cases(result_text)
+                    # An empty parse is a bad completion, not an answer worth serving from cache
+                    if test_cases:
+                        generated[key] = test_cases
+                except LLMConfigError:
+                    raise
                 except Exception as e:
-                    print(f"Error calling Hugging Face API: {e}")
-                    time.sleep(retry_delay)
-
-            if not result_text:
-                print(f"No valid output from AI for endpoint {method.upper()} {endpoint}")
-                continue
-
-            try:
-                start = result_text.find("[")
-                end = result_text.rfind("]") + 1
-                json_text = result_text[start:end]
-                test_cases = json.loads(json_text)
-            except Exception as e:
-                print(f"Failed to parse AI output: {e}")
-                test_cases = []
-
-            for t in test_cases:
-                if t["method"].upper() == "GET" and isinstance(t.get("payload"), dict):
-                    if t["payload"]:
-                        t["endpoint"] += "?" + urlencode(t["payload"])
-                    t["payload"] = {}
-
-            all_tests.extend(test_cases)
+                    print(f"No valid output from AI for endpoint {method.upper()} {endpoint}: {e}")
+                    test_cases = []
+            done += 1
+            if on_progress:
+                on_progress(done, len(operations))
+            return test_cases
+
+        tasks = [asyncio.ensure_future(_generate(*op)) for op in operations]
+        try:
+            batches = await asyncio.gather(*tasks)
+        except BaseException:
+            # A config error fails every call: stop the other prompts before their client closes
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            raise
+        finally:
+            # Keep what was generated even if a later operation aborted the run
+            if cache and generated:
+                cache.put_many(generated, model)
+
+    # Copies (so callers can't mutate cached entries), tagged with the operation they test
+    return [
+        {**t, "operation": operation_key(endpoint, method)}
+        for (endpoint, method, _, _), batch in zip(operations, batches)
+        for t in batch
+    ]
+
+
+def generate_openai_tests(spec, base_url: str = None):
+    """Generate test cases using OpenAI API."""
+    return asyncio.run(generate_llm_tests_async(spec, "openai", base_url=base_url))
 
-    return all_tests
+
+def generate_huggingface_tests(spec, max_retries: int = 5, retry_delay: int = 5, base_url: str = None):
+    """Generate test cases using Hugging Face Inference API."""
+    if not HF_API_KEY:
+        raise Exception("HF_API_KEY not found in environment variables")
+    return asyncio.run(generate_llm_tests_async(spec, "huggingface", max_retries, retry_delay, base_url=base_url))
 
 
-def generate_ai_tests(spec_json: str, max_retries: int = 5, retry_delay: int = 5):
+async def _generate_llm_tests(ops, base_url: str, max_retries: int, retry_delay: int, cache, on_progress):
+    """Generate with the first configured provider (OpenAI, then Hugging Face). None if none worked."""
     # Try OpenAI first if configured
-    if USE_OPENAI and OPENAI_AVAILABLE:
+    if USE_OPENAI:
         try:
             print("Using OpenAI for test generation")
-            return generate_openai_tests(spec_json)
+            return await generate_llm_tests_async(ops, "openai", max_retries, retry_delay, cache=cache,
+                                                  on_progress=on_progress, base_url=base_url)
         except Exception as e:
             print(f"OpenAI test generation failed: {e}")
-            print("Falling back to Hugging Face or basic tests")
-    
+            print("Falling back to Hugging Face or schema-based tests")
+
     # Try Hugging Face if configured
-    if HF_API_KEY and HUGGINGFACE_HUB_AVAILABLE:
+    if HF_API_KEY:
         try:
             print("Using Hugging Face for test generation")
-            return generate_huggingface_tests(spec_json, max_retries, retry_delay)
+            print(f"Using Hugging Face model: {MODEL_NAME}")
+            return await generate_llm_tests_async(ops, "huggingface", max_retries, retry_delay, cache=cache,
+                                                  on_progress=on_progress, base_url=base_url)
         except Exception as e:
             print(f"Hugging Face test generation failed: {e}")
-            print("Falling back to basic test generation")
-    
-    # Fall back to basic test generation
-    print("No AI service configured or available. Generating basic tests instead.")
-    return generate_basic_tests(spec_json)
\ No newline at end of file
+            print("Falling back to schema-based test generation")
+
+    return None
+
+
+async def generate_ai_tests_async(spec, max_retries: int = 5, retry_delay: int = 5, cache=None,
+                                  on_progress=None, base_url: str = None, mode: str = None):
+    """Generate tests for a spec document or a list of indexed operations.
+
+    ``mode`` (default ``GENERATOR_MODE``) picks between the LLM with a
+    schema-based fallback (``auto``), the schema engine alone (``schema``),
+    or the schema engine as a pre-pass that leaves the LLM only the
+    operations it has no schema for (``hybrid``).
+    """
+    mode = mode or GENERATOR_MODE
+    ops, base_url = _operations(spec, base_url)
+
+    if mode == "schema":
+        print("Generating schema-based tests")
+        return schema_generator.generate_schema_tests(ops)
+
+    pre_tests, llm_ops = [], ops
+    if mode == "hybrid":
+        covered = [op for op in ops if schema_generator.covers(op)]
+        llm_ops = [op for op in ops if not schema_generator.covers(op)]
+        pre_tests = schema_generator.generate_schema_tests(covered)
+        print(f"Schema engine covered {len(covered)} of {len(ops)} operations; {len(llm_ops)} left for the LLM")
+        if not llm_ops:
+            return pre_tests
+
+    tests = await _generate_llm_tests(llm_ops, base_url, max_retries, retry_delay, cache, on_progress)
+    if tests is None:
+        # Fall back to schema-based test generation
+        print("No AI service configured or available. Generating schema-based tests instead.")
+        tests = schema_generator.generate_schema_tests(llm_ops)
+    return pre_tests + tests
+
+
+def generate_ai_tests(spec, max_retries: int = 5, retry_delay: int = 5, base_url: str = None):
+    return asyncio.run(generate_ai_tests_async(spec, max_retries, retry_delay, base_url=base_url))
@@ -1,10 +1,21 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from core.db import Base, engine
-from api import specs, tests
+from api import specs, tests, scenarios
+from workers import jobs
 
 Base.metadata.create_all(bind=engine)
 
-app = FastAPI(title="AETHER - AI API Tester")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Pick up spec ingestion jobs interrupted by a restart
+    jobs.resume_pending_jobs()
+    yield
+
+
+app = FastAPI(title="AETHER - AI API Tester", lifespan=lifespan)
 
 app.include_router(specs.router, prefix="/api/specs", tags=["Specs"])
 app.include_router(tests.router, prefix="/api/tests", tags=["Tests"])
+app.include_router(scenarios.router, prefix="/api/scenarios", tags=["Scenarios"])
\ No newline at end of file
@@ -0,0 +1,54 @@
+"""Run queue workers: ``python -m workers`` (from backend/app) or ``python -m app.workers`` (from backend).
+
+Start any number of these, on any host that can reach the API server's
+DATABASE_URL (set it explicitly; the SQLite default is relative to the
+working directory) and the APIs under test. Runs started with
+``distributed=true`` are spread over them.
+"""
+import argparse
+import multiprocessing
+import os
+import sys
+
+# Same import root as the API server (modules import ``core`` and ``workers``)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from workers import queue_worker  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(prog="python -m workers", description="AETHER test runner worker")
+    parser.add_argument("--processes", type=int, default=1, help="worker processes to start on this host")
+    parser.add_argument("--worker-id", help="worker name (default: host-pid-random)")
+    parser.add_argument("--max-concurrency", type=int, default=queue_worker.test_runner.MAX_CONCURRENCY,
+                        help="requests in flight per worker")
+    parser.add_argument("--lease-seconds", type=float, default=queue_worker.run_queue.QUEUE_LEASE_SECONDS)
+    parser.add_argument("--once", action="store_true", help="exit when the queue is empty")
+    args = parser.parse_args()
+
+    options = {"once": args.once, "max_concurrency": args.max_concurrency, "lease_seconds": args.lease_seconds}
+    if args.processes <= 1:
+        queue_worker.run_worker(args.worker_id, **options)
+        return
+
+    procs = [
+        multiprocessing.Process(
+            target=queue_worker.run_worker,
+            args=(f"{args.worker_id}-{i}" if args.worker_id else None,),
+            kwargs=options,
+        )
+        for i in range(args.processes)
+    ]
+    for p in procs:
+        p.start()
+    try:
+        for p in procs:
+            p.join()
+    except KeyboardInterrupt:
+        # Children got the same SIGINT and finish their current batch
+        for p in procs:
+            p.join()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,414 @@
+import asyncio
+import bisect
+import hashlib
+import json
+import os
+import random
+import time
+import httpx
+from collections import Counter
+from sqlalchemy import func
+from urllib.parse import parse_qsl, urlencode, urlsplit
+from core import db, models, runs, operations, schema_generator, capture, environments, response_validation
+from core.rate_limit import TokenBucket
+from workers import test_runner
+
+# Fuzz run defaults
+FUZZ_DURATION = float(os.getenv("FUZZ_DURATION", "60"))
+FUZZ_RPS = float(os.getenv("FUZZ_RPS", "50"))
+FUZZ_CONCURRENCY = int(os.getenv("FUZZ_CONCURRENCY", "20"))
+
+LATENCY_BUCKETS_MS = [10, 50, 100, 250, 500, 1000, 2500, 5000]
+MAX_CORPUS = 2000
+# Inputs that go into the URL stay far below httpx's 64 KiB URL limit; bodies get the full-size strings
+MAX_URL_LENGTH = 8192
+BODY_LONG_STRINGS = [256, 4096, 65536]
+URL_LONG_STRINGS = [256, 1024, 2048]
+URL_MUTATION_ATTEMPTS = 5
+MAX_SUMMARY_SIGNATURES = 200
+BODY_METHODS = {"POST", "PUT", "PATCH"}
+
+INTERESTING_NUMBERS = [0, -1, 1, 2 ** 31 - 1, -2 ** 31, 2 ** 63, -2 ** 63, 1e308, -1e-308, 0.1]
+INTERESTING_STRINGS = [
+    "", " ", "null", "undefined", "NaN", "-1", "0", "true",
+    "\u0000", "‮", "😀" * 10, "\r\n\r\nX-Injected: 1",
+] + schema_generator.INJECTION_PAYLOADS
+
+
+def _latency_bucket(elapsed_ms: float) -> int:
+    return bisect.bisect_left(LATENCY_BUCKETS_MS, elapsed_ms)
+
+
+def _response_shape(response) -> str:
+    """A coarse description of a response body: content type plus JSON structure."""
+    if response is None:
+        return "no-response"
+    content_type = response.headers.get("content-type", "").split(";")[0].strip()
+    try:
+        body = response.json()
+    except Exception:
+        return f"{content_type}:text"
+    if isinstance(body, dict):
+        return f"{content_type}:{{{','.join(sorted(body))[:200]}}}"
+    if isinstance(body, list):
+        return f"{content_type}:list"
+    return f"{content_type}:{type(body).__name__}"
+
+
+def signature(operation: str, response, elapsed_ms: float, invalid: bool = False) -> tuple:
+    """What counts as distinct behaviour: operation, status, response shape and schema conformance, latency bucket."""
+    status = response.status_code if response is not None else 0
+    shape = _response_shape(response) + (":schema-violation" if invalid else "")
+    return operation, status, shape, _latency_bucket(elapsed_ms)
+
+
+def _paths(value, prefix=()):
+    """Every location inside a JSON value, as key/index tuples (including the root)."""
+    yield prefix
+    if isinstance(value, dict):
+        for k, v in value.items():
+            yield from _paths(v, prefix + (k,))
+    elif isinstance(value, list):
+        for i, v in enumerate(value[:20]):
+            yield from _paths(v, prefix + (i,))
+
+
+def _set(value, path, new):
+    if not path:
+        return new
+    value = value.copy()
+    value[path[0]] = _set(value[path[0]], path[1:], new)
+    return value
+
+
+def _delete(value, path):
+    if len(path) == 1:
+        value = value.copy()
+        if isinstance(value, dict):
+            value.pop(path[0], None)
+        else:
+            del value[path[0]]
+        return value
+    value = value.copy()
+    value[path[0]] = _delete(value[path[0]], path[1:])
+    return value
+
+
+def _get(value, path):
+    for part in path:
+        value = value[part]
+    return value
+
+
+def mutate_value(value, rng: random.Random, long_strings=BODY_LONG_STRINGS):
+    """Apply one random mutation somewhere inside a JSON value."""
+    path = rng.choice(list(_paths(value)))
+    current = _get(value, path)
+    choice = rng.randrange(9)
+    if choice == 0:
+        new = rng.choice(INTERESTING_NUMBERS)
+    elif choice == 1:
+        new = rng.choice(INTERESTING_STRINGS)
+    elif choice == 2:
+        new = "A" * rng.choice(long_strings)
+    elif choice == 3:
+        new = None
+    elif choice == 4:
+        new = rng.choice([True, False, [], {}, [current], {"nested": current}])
+    elif choice == 5 and path:
+        return _delete(value, path)
+    elif choice == 6 and isinstance(current, dict):
+        new = {**current, rng.choice(["__proto__", "admin", "id", "$where", "extra"]): rng.choice(INTERESTING_STRINGS)}
+    elif choice == 7 and isinstance(current, list):
+        new = current * rng.choice([0, 2, 100]) if current else [None]
+    elif choice == 8 and isinstance(current, str):
+        new = current + rng.choice(INTERESTING_STRINGS)
+    elif isinstance(current, (int, float)) and not isinstance(current, bool):
+        new = current + rng.choice([-1, 1]) * rng.choice([1, 2 ** 16, 2 ** 32])
+    else:
+        new = rng.choice(INTERESTING_STRINGS)
+    return _set(value, path, new)
+
+
+def mutate(entry: dict, rng: random.Random) -> dict:
+    """A mutated copy of a fuzz input (operation, method, path, query, body)."""
+    child = dict(entry)
+    if entry["method"] in BODY_METHODS and (not entry["query"] or rng.random() < 0.8):
+        child["body"] = mutate_value(entry["body"] if entry["body"] is not None else {}, rng)
+    else:
+        for _ in range(URL_MUTATION_ATTEMPTS):
+            query = mutate_value(dict(entry["query"]), rng, URL_LONG_STRINGS)
+            query = query if isinstance(query, dict) else {"q": query}
+            # Repeated list mutations can still outgrow a URL; those would never leave the client
+            if len(entry["path"]) + len(_query_string(query)) < MAX_URL_LENGTH:
+                child["query"] = query
+                break
+    return child
+
+
+def _query_string(query: dict) -> str:
+    return urlencode({
+        str(k): v if isinstance(v, (str, int, float, bool)) else json.dumps(v)
+        for k, v in query.items()
+    })
+
+
+def to_request(entry: dict):
+    """Method, endpoint and JSON body for a fuzz input."""
+    endpoint = entry["path"]
+    if entry["query"]:
+        endpoint += "?" + _query_string(entry["query"])
+    body = entry["body"] if entry["method"] in BODY_METHODS else None
+    return entry["method"], endpoint, body
+
+
+def case_key(operation_key: str, method: str, endpoint: str, payload: str) -> tuple:
+    """Identifies a stored case by its request; payloads compare as canonical JSON."""
+    try:
+        payload = json.dumps(json.loads(payload or "{}"), sort_keys=True)
+    except json.JSONDecodeError:
+        pass
+    return operation_key, method.upper(), endpoint, hashlib.sha256(payload.encode()).hexdigest()
+
+
+def failure_kind(operation_key: str, status: int, validation_errors) -> tuple:
+    return operation_key, status, bool(validation_errors)
+
+
+def known_cases(session, spec_id: int, operation_keys) -> dict:
+    """``{case_key: test_case_id}`` for the spec's stored cases of ``operation_keys``."""
+    rows = session.query(models.TestCase.id, models.TestCase.operation_key, models.TestCase.method,
+                         models.TestCase.endpoint, models.TestCase.payload)\
+        .filter(models.TestCase.spec_id == spec_id, models.TestCase.operation_key.in_(list(operation_keys)))
+    return {case_key(r.operation_key, r.method, r.endpoint, r.payload): r.id for r in rows}
+
+
+def known_failures(session, spec_id: int, operation_keys) -> set:
+    """Failure kinds (see ``failure_kind``) a stored fuzz case of ``operation_keys`` reproduced in its latest result."""
+    latest = session.query(func.max(models.TestResult.id))\
+        .join(models.TestCase, models.TestCase.id == models.TestResult.test_case_id)\
+        .filter(models.TestCase.spec_id == spec_id, models.TestCase.category == "fuzz",
+                models.TestCase.operation_key.in_(list(operation_keys)))\
+        .group_by(models.TestResult.test_case_id)
+    rows = session.query(models.TestCase.operation_key, models.TestResult.status, models.TestResult.validation_errors)\
+        .join(models.TestResult, models.TestResult.test_case_id == models.TestCase.id)\
+        .filter(models.TestResult.id.in_(latest), models.TestResult.success.is_(False))
+    return {failure_kind(*r) for r in rows}
+
+
+def seed_inputs(session, spec_id: int):
+    """Fuzz seeds: the spec's stored test cases plus one schema-valid input per operation."""
+    seeds = []
+    for tc in session.query(models.TestCase).filter(models.TestCase.spec_id == spec_id):
+        parts = urlsplit(tc.endpoint)
+        try:
+            body = json.loads(tc.payload or "{}")
+        except json.JSONDecodeError:
+            body = {}
+        seeds.append({
+            "operation": tc.operation_key or f"{tc.method.upper()} {parts.path}",
+            "method": tc.method.upper(),
+            "path": tc.endpoint.split("?", 1)[0],
+            "query": dict(parse_qsl(parts.query)),
+            "body": body,
+        })
+
+    spec = session.get(models.APISpec, spec_id)
+    operations.ensure_operations(session, spec)
+    for op in operations.load_operations(session, spec_id):
+        for t in schema_generator.generate_operation_tests(op):
+            if t["category"] != "valid":
+                continue
+            parts = urlsplit(t["endpoint"])
+            seeds.append({
+                "operation": op["key"],
+                "method": op["method"],
+                "path": parts.path,
+                "query": dict(parse_qsl(parts.query)),
+                "body": t["payload"],
+            })
+    return seeds
+
+
+class Fuzzer:
+    """Coverage-guided mutation loop.
+
+    Each request's response signature (see ``signature``) is its coverage.
+    Inputs that produce a new signature join the corpus with high energy, and
+    parents are picked in proportion to their energy, so the request budget
+    goes to mutations that keep finding new behaviour.
+    """
+
+    def __init__(self, seeds, rps: float = FUZZ_RPS, duration: float = FUZZ_DURATION,
+                 concurrency: int = FUZZ_CONCURRENCY, max_requests: int = None, seed: int = None,
+                 validators=None):
+        self.corpus = [{"input": s, "energy": 1.0} for s in seeds]
+        self.rps = rps
+        self.duration = duration
+        self.concurrency = concurrency
+        self.max_requests = max_requests
+        self.rng = random.Random(seed)
+        self.validators = validators
+        self.schema_violations = 0
+        self.signatures = {}
+        self.findings = []
+        self.requests = 0
+        self.sent = 0
+        self.errors = 0
+        self.rejected = 0
+        self.statuses = Counter()
+
+    def _pick(self):
+        return self.rng.choices(self.corpus, weights=[e["energy"] for e in self.corpus])[0]
+
+    def _record(self, parent, child, response, elapsed_ms):
+        self.requests += 1
+        status = response.status_code if response is not None else 0
+        self.statuses[status] += 1
+        if status == 0:
+            self.errors += 1
+
+        violations = []
+        if self.validators is not None and 0 < status < 500:
+            validator = self.validators.for_request(child["operation"], child["method"], child["path"])
+            if validator is not None:
+                violations = validator.validate(status, response.headers.get("content-type"), response.content)
+                self.schema_violations += bool(violations)
+
+        sig = signature(child["operation"], response, elapsed_ms, bool(violations))
+        if sig in self.signatures:
+            parent["energy"] = max(0.05, parent["energy"] * 0.9)
+            return
+
+        finding = {"input": child, "status": status, "latency_ms": round(elapsed_ms, 1), "signature": sig,
+                   "validation_errors": violations}
+        if (status >= 500 or violations) and capture.should_capture(False):
+            finding["capture"] = capture.capture_response(response)
+        self.signatures[sig] = finding
+        self.findings.append(finding)
+        parent["energy"] += 1.0
+        if len(self.corpus) < MAX_CORPUS:
+            self.corpus.append({"input": child, "energy": 8.0 if status >= 500 or status == 0 else 4.0})
+
+    async def run(self, client):
+        if not self.corpus:
+            return self.summary(0.0)
+        limiter = TokenBucket(rate=self.rps, capacity=max(1.0, self.rps / 10))
+        started = time.monotonic()
+        deadline = started + self.duration
+
+        async def _worker():
+            while time.monotonic() < deadline and (self.max_requests is None or self.sent < self.max_requests):
+                await limiter.acquire()
+                if time.monotonic() >= deadline or (self.max_requests is not None and self.sent >= self.max_requests):
+                    break
+                self.sent += 1
+                parent = self._pick()
+                child = mutate(parent["input"], self.rng)
+                method, endpoint, body = to_request(child)
+                t0 = time.perf_counter()
+                try:
+                    response = await test_runner.send(client, method, endpoint, body)
+                except (httpx.LocalProtocolError, httpx.UnsupportedProtocol):
+                    # Refused by the client before anything reached the target
+                    self.rejected += 1
+                    continue
+                except httpx.TransportError:
+                    # Timeouts, refused or reset connections, malformed responses: the target's doing
+                    response = None
+                except Exception:
+                    # InvalidURL, unencodable inputs and the like are client-side too
+                    self.rejected += 1
+                    continue
+                self._record(parent, child, response, (time.perf_counter() - t0) * 1000)
+
+        await asyncio.gather(*(_worker() for _ in range(self.concurrency)))
+        return self.summary(time.monotonic() - started)
+
+    def summary(self, elapsed: float) -> dict:
+        return {
+            "requests": self.requests,
+            "errors": self.errors,
+            "client_rejected": self.rejected,
+            "elapsed_s": round(elapsed, 2),
+            "achieved_rps": round(self.requests / elapsed, 1) if elapsed else 0.0,
+            "statuses": {str(k): v for k, v in sorted(self.statuses.items())},
+            "schema_violations": self.schema_violations,
+            "signatures": len(self.signatures),
+            "corpus_size": len(self.corpus),
+            "new_signatures": [
+                {"operation": f["signature"][0], "status": f["status"], "shape": f["signature"][2],
+                 "latency_ms": f["latency_ms"]}
+                for f in self.findings[:MAX_SUMMARY_SIGNATURES]
+            ],
+        }
+
+
+def run_fuzz_background(spec_id: int, run_id: int, duration: float = FUZZ_DURATION, rps: float = FUZZ_RPS,
+                        concurrency: int = FUZZ_CONCURRENCY, max_requests: int = None):
+    """Fuzz a spec and keep an input per operation that hit a new kind of server error, transport
+    failure or schema violation as a test case.
+    """
+    try:
+        # No session is held while fuzzing
+        with db.SessionLocal() as session:
+            spec_version = session.get(models.APISpec, spec_id).version
+            target = environments.run_target(session, session.get(models.TestRun, run_id))
+            seeds = seed_inputs(session, spec_id)
+            validators = response_validation.spec_validators(session, spec_id)
+        fuzzer = Fuzzer(seeds, rps=rps, duration=duration, concurrency=concurrency, max_requests=max_requests,
+                        validators=validators)
+
+        async def _fuzz():
+            async with test_runner.target_client(target, concurrency) as client:
+                return await fuzzer.run(client)
+
+        summary = asyncio.run(_fuzz())
+
+        with db.SessionLocal() as session:
+            # Crashes and schema violations become regression cases, with the result that exposed them
+            crashes = [f for f in fuzzer.findings
+                       if f["status"] >= 500 or f["status"] == 0 or f["validation_errors"]]
+            # One case per operation and failure kind: an input the spec already has a case for only adds a
+            # result to it, and a failure an existing fuzz case still reproduces is not saved again
+            operation_keys = {f["input"]["operation"] for f in crashes}
+            known = known_cases(session, spec_id, operation_keys)
+            reproduced = known_failures(session, spec_id, operation_keys)
+            saved, recorded_ids = 0, set()
+            for f in crashes:
+                method, endpoint, body = to_request(f["input"])
+                payload = json.dumps(body or {})
+                key = case_key(f["input"]["operation"], method, endpoint, payload)
+                kind = failure_kind(f["input"]["operation"], f["status"], f["validation_errors"])
+                tc_id = known.get(key)
+                if tc_id is None and kind in reproduced:
+                    continue
+                if tc_id is None:
+                    tc = models.TestCase(spec_id=spec_id, endpoint=endpoint, method=method, payload=payload,
+                                         operation_key=f["input"]["operation"], category="fuzz",
+                                         spec_version=spec_version)
+                    session.add(tc)
+                    session.flush()
+                    tc_id = known[key] = tc.id
+                    reproduced.add(kind)
+                    saved += 1
+                elif tc_id in recorded_ids:
+                    continue
+                recorded_ids.add(tc_id)
+                errors = json.dumps(f["validation_errors"]) if f["validation_errors"] else None
+                session.add(models.TestResult(test_case_id=tc_id, run_id=run_id, success=False, status=f["status"],
+                                              latency_ms=f["latency_ms"], validation_errors=errors))
+                if "capture" in f:
+                    session.add(models.ResponseCapture(run_id=run_id, test_case_id=tc_id, **f["capture"]))
+            summary["saved_test_cases"] = saved
+            summary["known_findings"] = len(crashes) - saved
+
+            run = session.get(models.TestRun, run_id)
+            run.summary = json.dumps(summary)
+            run.total_tests = summary["requests"]
+            failed = sum(v for k, v in summary["statuses"].items() if int(k) >= 500 or int(k) == 0)
+            runs.finish_run(session, run, passed=summary["requests"] - failed, failed=failed)
+            runs.compact_runs(session, spec_id)
+    except Exception as e:
+        print(f"Fuzz run {run_id} failed: {e}")
+        runs.fail_run(run_id)
@@ -0,0 +1,118 @@
+import asyncio
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from core import db, models, ingest
+
+# Number of spec ingestion jobs processed at the same time
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+
+# Seconds between progress updates written for a running job
+JOB_PROGRESS_INTERVAL = float(os.getenv("JOB_PROGRESS_INTERVAL", "0.5"))
+
+_executor = ThreadPoolExecutor(max_workers=JOB_WORKERS, thread_name_prefix="aether-job")
+
+
+class _Progress:
+    """A job's ``on_progress`` callback.
+
+    It is called on the ingest event loop, so the update is written from a
+    worker thread with its own session, at most every ``JOB_PROGRESS_INTERVAL``
+    seconds; ``write()`` stores the latest values once the job is done.
+    """
+
+    def __init__(self, job_id: int):
+        self.job_id = job_id
+        self.latest = None
+        self.written_at = 0.0
+        self.writing = None
+
+    def __call__(self, done: int, total: int):
+        self.latest = (done, total)
+        if self.writing is not None and not self.writing.done():
+            return
+        if time.monotonic() - self.written_at >= JOB_PROGRESS_INTERVAL:
+            self.written_at = time.monotonic()
+            self.writing = asyncio.ensure_future(asyncio.to_thread(self.write))
+
+    def write(self):
+        if self.latest is None:
+            return
+        with db.SessionLocal() as session:
+            try:
+                done, total = self.latest
+                session.query(models.Job).filter(models.Job.id == self.job_id)\
+                    .update({"progress": done, "total": total}, synchronize_session=False)
+                session.commit()
+            except Exception as e:
+                print(f"Failed to record progress of job {self.job_id}: {e}")
+
+
+async def _ingest(session, job, on_progress):
+    spec, test_count = await ingest.ingest_spec(session, job.file_path, job.filename, job.content_hash,
+                                                on_progress=on_progress)
+    return spec.id, {"generated_tests": test_count}
+
+
+async def _ingest_version(session, job, on_progress):
+    summary = await ingest.ingest_spec_version(session, job.spec_id, job.file_path, job.filename,
+                                               job.content_hash, on_progress=on_progress)
+    return job.spec_id, summary
+
+
+JOB_HANDLERS = {
+    "ingest": _ingest,
+    "ingest_version": _ingest_version,
+}
+
+
+def _run_job(job_id: int):
+    session = db.SessionLocal()
+    try:
+        job = session.get(models.Job, job_id)
+        if job is None or job.status not in ("queued", "running"):
+            return
+        job.status = "running"
+        session.commit()
+
+        progress = _Progress(job_id)
+        try:
+            spec_id, result = asyncio.run(JOB_HANDLERS[job.kind](session, job, progress))
+        except Exception as e:
+            session.rollback()
+            job.status = "failed"
+            job.error = str(e)
+            session.commit()
+            print(f"Job {job_id} failed: {e}")
+            return
+        finally:
+            # asyncio.run has waited for the background writes; this one stores the final count
+            progress.write()
+
+        job.status = "completed"
+        job.spec_id = spec_id
+        job.result = json.dumps(result)
+        session.commit()
+    finally:
+        session.close()
+
+
+def submit(job: models.Job):
+    _executor.submit(_run_job, job.id)
+
+
+def resume_pending_jobs():
+    """Requeue jobs left queued or running by a previous process."""
+    session = db.SessionLocal()
+    try:
+        pending = session.query(models.Job).filter(models.Job.status.in_(["queued", "running"])).all()
+        for job in pending:
+            job.status = "queued"
+        session.commit()
+        for job in pending:
+            submit(job)
+        if pending:
+            print(f"Resumed {len(pending)} pending jobs")
+    finally:
+        session.close()
@@ -0,0 +1,201 @@
+import asyncio
+import json
+import os
+import time
+from collections import Counter, defaultdict
+from urllib.parse import urlsplit
+from core import db, environments, models, runs, response_validation
+from core.histogram import Histogram
+from workers import test_runner
+
+# Load run defaults
+LOAD_DURATION = float(os.getenv("LOAD_DURATION", "30"))
+LOAD_RPS = float(os.getenv("LOAD_RPS", "50"))
+LOAD_CONCURRENCY = int(os.getenv("LOAD_CONCURRENCY", "20"))
+
+
+def endpoint_key(test_case) -> str:
+    """Stats are aggregated per operation, so ``/users/1`` and ``/users/2`` share a histogram."""
+    if test_case.operation_key:
+        return test_case.operation_key
+    return f"{test_case.method.upper()} {urlsplit(test_case.endpoint).path or '/'}"
+
+
+class EndpointStats:
+    def __init__(self):
+        self.histogram = Histogram()
+        self.statuses = Counter()
+        self.errors = 0
+        self.invalid = 0
+
+    def record(self, status: int, latency_us: float, invalid: bool = False):
+        self.histogram.record(latency_us)
+        self.statuses[status] += 1
+        # 4xx is an expected answer for the negative cases; only server and transport failures count as errors
+        if status == 0 or status >= 500:
+            self.errors += 1
+        elif invalid:
+            self.invalid += 1
+
+
+class LoadTest:
+    """Replays a spec's cases for ``duration`` seconds.
+
+    ``closed`` model: ``concurrency`` virtual users each send their next
+    request as soon as the previous one returns. ``open`` model: requests
+    arrive at a fixed ``rps`` regardless of how fast the server answers, with
+    at most ``concurrency`` in flight; latency is measured from the scheduled
+    send time so a stalling server is not hidden by coordinated omission, and
+    arrivals that find every slot busy are counted as dropped. With
+    ``validators``, responses that don't match their declared schema are
+    counted per endpoint as ``invalid``.
+    """
+
+    def __init__(self, test_cases, model: str = "closed", rps: float = LOAD_RPS,
+                 concurrency: int = LOAD_CONCURRENCY, duration: float = LOAD_DURATION, validators=None):
+        self.cases = [(tc, endpoint_key(tc), json.loads(tc.payload) if tc.payload else None) for tc in test_cases]
+        self.model = model
+        self.rps = rps
+        self.concurrency = concurrency
+        self.duration = duration
+        self.validators = validators
+        self.stats = defaultdict(EndpointStats)
+        self.dropped = 0
+        self.elapsed = 0.0
+
+    async def _send(self, client, case, scheduled: float):
+        tc, key, payload = case
+        invalid = False
+        try:
+            response = await test_runner.send(client, tc.method, tc.endpoint, payload)
+            status = response.status_code
+            latency_us = (time.perf_counter() - scheduled) * 1_000_000
+            if self.validators is not None:
+                invalid = bool(self.validators.validate(tc, status, response.headers.get("content-type"),
+                                                        response.content))
+        except Exception:
+            status = 0
+            latency_us = (time.perf_counter() - scheduled) * 1_000_000
+        self.stats[key].record(status, latency_us, invalid)
+
+    async def _closed(self, client, deadline: float):
+        async def _user(offset: int):
+            i = offset
+            while time.perf_counter() < deadline:
+                await self._send(client, self.cases[i % len(self.cases)], time.perf_counter())
+                i += 1
+
+        await asyncio.gather(*(_user(u) for u in range(self.concurrency)))
+
+    async def _open(self, client, started: float, deadline: float):
+        in_flight = set()
+        interval = 1.0 / self.rps
+        i = 0
+        while True:
+            scheduled = started + i * interval
+            if scheduled >= deadline:
+                break
+            delay = scheduled - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            if len(in_flight) >= self.concurrency:
+                self.dropped += 1
+            else:
+                task = asyncio.create_task(self._send(client, self.cases[i % len(self.cases)], scheduled))
+                in_flight.add(task)
+                task.add_done_callback(in_flight.discard)
+            i += 1
+        if in_flight:
+            await asyncio.gather(*in_flight)
+
+    async def run(self, target: dict = None):
+        if not self.cases:
+            return
+        started = time.perf_counter()
+        deadline = started + self.duration
+        async with test_runner.target_client(target or {}, self.concurrency) as client:
+            if self.model == "open":
+                await self._open(client, started, deadline)
+            else:
+                await self._closed(client, deadline)
+        self.elapsed = time.perf_counter() - started
+
+    def endpoint_rows(self, run_id: int):
+        for key, s in sorted(self.stats.items()):
+            h = s.histogram
+            yield {
+                "run_id": run_id,
+                "endpoint": key,
+                "requests": h.count,
+                "errors": s.errors,
+                "invalid": s.invalid,
+                "statuses": json.dumps({str(k): v for k, v in sorted(s.statuses.items())}),
+                "throughput_rps": round(h.count / self.elapsed, 2) if self.elapsed else 0.0,
+                "p50_ms": h.percentile(50) / 1000,
+                "p95_ms": h.percentile(95) / 1000,
+                "p99_ms": h.percentile(99) / 1000,
+                "max_ms": h.max / 1000,
+                "histogram": h.to_json(),
+            }
+
+    def summary(self) -> dict:
+        overall = Histogram()
+        for s in self.stats.values():
+            overall.merge(s.histogram)
+        errors = sum(s.errors for s in self.stats.values())
+        invalid = sum(s.invalid for s in self.stats.values())
+        return {
+            "model": self.model,
+            "target_rps": self.rps if self.model == "open" else None,
+            "concurrency": self.concurrency,
+            "duration_s": round(self.elapsed, 2),
+            "requests": overall.count,
+            "errors": errors,
+            "error_rate": round(errors / overall.count, 4) if overall.count else 0.0,
+            "invalid": invalid,
+            "dropped": self.dropped,
+            "throughput_rps": round(overall.count / self.elapsed, 2) if self.elapsed else 0.0,
+            "latency": overall.summary_ms(),
+        }
+
+
+def stats_dict(row: models.LoadStat) -> dict:
+    return {
+        "endpoint": row.endpoint,
+        "requests": row.requests,
+        "errors": row.errors,
+        "error_rate": round(row.errors / row.requests, 4) if row.requests else 0.0,
+        "invalid": row.invalid,
+        "statuses": json.loads(row.statuses) if row.statuses else {},
+        "throughput_rps": row.throughput_rps,
+        "p50_ms": row.p50_ms,
+        "p95_ms": row.p95_ms,
+        "p99_ms": row.p99_ms,
+        "max_ms": row.max_ms,
+    }
+
+
+def run_load_background(spec_id: int, run_id: int, model: str = "closed", rps: float = LOAD_RPS,
+                        concurrency: int = LOAD_CONCURRENCY, duration: float = LOAD_DURATION,
+                        changed_only: bool = False):
+    try:
+        # No session is held during the load phase
+        with db.SessionLocal() as session:
+            validators = response_validation.spec_validators(session, spec_id)
+            target = environments.run_target(session, session.get(models.TestRun, run_id))
+            test_cases = runs.test_cases_query(session, spec_id, changed_only).all()
+        load = LoadTest(test_cases, model=model, rps=rps, concurrency=concurrency, duration=duration,
+                        validators=validators)
+        asyncio.run(load.run(target))
+
+        with db.SessionLocal() as session:
+            session.bulk_insert_mappings(models.LoadStat, list(load.endpoint_rows(run_id)))
+            summary = load.summary()
+            run = session.get(models.TestRun, run_id)
+            run.summary = json.dumps(summary)
+            run.total_tests = summary["requests"]
+            runs.finish_run(session, run, passed=summary["requests"] - summary["errors"], failed=summary["errors"])
+            runs.compact_runs(session, spec_id)
+    except Exception as e:
+        print(f"Load run {run_id} failed: {e}")
+        runs.fail_run(run_id)
@@ -0,0 +1,105 @@
+import asyncio
+import json
+import os
+import signal
+import socket
+import uuid
+from core import db, environments, models, run_queue, response_validation
+from workers import test_runner
+
+# How long an idle worker waits before polling the queue again
+QUEUE_POLL_INTERVAL = float(os.getenv("QUEUE_POLL_INTERVAL", "1.0"))
+
+
+def default_worker_id() -> str:
+    return f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+
+
+class QueueWorker:
+    """Leases batches from the run queue and executes them with the async runner.
+
+    While a batch runs its lease is renewed every third of the lease period,
+    so only a worker that died or stalled loses it. HTTP clients are kept per
+    environment for the worker's lifetime, so connections outlive batches.
+    """
+
+    def __init__(self, worker_id: str = None, lease_seconds: float = run_queue.QUEUE_LEASE_SECONDS,
+                 poll_interval: float = QUEUE_POLL_INTERVAL, max_concurrency: int = test_runner.MAX_CONCURRENCY):
+        self.worker_id = worker_id or default_worker_id()
+        self.lease_seconds = lease_seconds
+        self.poll_interval = poll_interval
+        self.max_concurrency = max_concurrency
+        self.stopping = False
+        self.batches = 0
+        self.clients = None
+
+    def stop(self, *_):
+        # Finish the batch in hand, then exit
+        self.stopping = True
+
+    def _lease(self):
+        with db.SessionLocal() as session:
+            batch = run_queue.lease_batch(session, self.worker_id, self.lease_seconds)
+            if batch is None:
+                return None, [], {}
+            run = session.get(models.TestRun, batch.run_id)
+            # Validators compiled for earlier batches of the spec are reused from the process cache.
+            # Built first: indexing a spec's operations commits, which would expire the loaded cases.
+            context = {"target": environments.run_target(session, run),
+                       "validators": response_validation.spec_validators(session, run.spec_id)}
+            if run.fail_fast or run.time_budget:
+                # What is left of the run's limits, given the batches other workers already recorded
+                context["budget"] = test_runner.RunBudget(*run_queue.budget_left(session, run))
+            ids = json.loads(batch.test_case_ids)
+            # In the batch's own order, which is the run's priority order when it has one
+            by_id = {tc.id: tc for tc in session.query(models.TestCase).filter(models.TestCase.id.in_(ids))}
+            test_cases = [by_id[tc_id] for tc_id in ids if tc_id in by_id]
+            return batch, test_cases, context
+
+    def _heartbeat(self, batch_id: int) -> bool:
+        with db.SessionLocal() as session:
+            return run_queue.heartbeat(session, batch_id, self.worker_id, self.lease_seconds)
+
+    def _complete(self, batch, results) -> bool:
+        with db.SessionLocal() as session:
+            return run_queue.complete_batch(session, batch, self.worker_id, results)
+
+    async def _keep_lease(self, batch_id: int):
+        while True:
+            await asyncio.sleep(self.lease_seconds / 3)
+            if not await asyncio.to_thread(self._heartbeat, batch_id):
+                print(f"Worker {self.worker_id} lost the lease on batch {batch_id}")
+                return
+
+    async def run_batch(self, batch, test_cases, context: dict) -> bool:
+        keeper = asyncio.create_task(self._keep_lease(batch.id))
+        try:
+            results = await test_runner.run_test_cases(test_cases, max_concurrency=self.max_concurrency,
+                                                       clients=self.clients, **context)
+        finally:
+            keeper.cancel()
+        return await asyncio.to_thread(self._complete, batch, results)
+
+    async def run(self, once: bool = False):
+        """Process batches until stopped (or, with ``once``, until the queue is empty)."""
+        print(f"Worker {self.worker_id} started")
+        async with test_runner.ClientPool(self.max_concurrency) as self.clients:
+            while not self.stopping:
+                batch, test_cases, context = await asyncio.to_thread(self._lease)
+                if batch is None:
+                    if once:
+                        break
+                    await asyncio.sleep(self.poll_interval)
+                    continue
+                recorded = await self.run_batch(batch, test_cases, context)
+                self.batches += 1
+                print(f"Worker {self.worker_id} {'finished' if recorded else 'dropped'} batch {batch.id} "
+                      f"of run {batch.run_id} ({len(test_cases)} cases)")
+        print(f"Worker {self.worker_id} stopped after {self.batches} batches")
+
+
+def run_worker(worker_id: str = None, once: bool = False, **options):
+    worker = QueueWorker(worker_id, **options)
+    signal.signal(signal.SIGTERM, worker.stop)
+    signal.signal(signal.SIGINT, worker.stop)
+    asyncio.run(worker.run(once=once))
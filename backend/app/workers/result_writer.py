@@ -0,0 +1,130 @@
+import asyncio
+import os
+import queue
+import threading
+import time
+from core import db, models
+
+# Result writer configuration
+RESULT_BATCH_SIZE = int(os.getenv("RESULT_BATCH_SIZE", "200"))
+RESULT_FLUSH_INTERVAL = float(os.getenv("RESULT_FLUSH_INTERVAL", "1.0"))
+
+
+class ResultWriter:
+    """Buffer test results and write them to the DB in bulk.
+
+    The buffer is flushed once it holds ``batch_size`` rows or when
+    ``flush_interval`` seconds have passed since the last flush, and always
+    when the writer is closed, even if the run fails part way. A result's
+    ``capture`` (see ``core.capture``) goes to the response_captures table
+    in the same transaction.
+
+    Flushing only hands the batch to a writer thread, which owns the session:
+    the inserts and commits never stall the runner's event loop (and so never
+    show up in the latencies it measures).
+    """
+
+    def __init__(self, session=None, run_id: int = None, batch_size: int = RESULT_BATCH_SIZE,
+                 flush_interval: float = RESULT_FLUSH_INTERVAL):
+        # Without a session the writer opens a dedicated one and releases it on close
+        self.owns_session = session is None
+        self.session = db.SessionLocal() if self.owns_session else session
+        self.run_id = run_id
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.buffer = []
+        self.captures = []
+        self.written = 0
+        self.last_flush = time.monotonic()
+        # Rows of a failed write, retried with the next batch (only touched by the writer thread)
+        self.unwritten = ([], [])
+        self.batches = queue.Queue()
+        self.thread = threading.Thread(target=self._write_loop, name=f"result-writer-{run_id}", daemon=True)
+        self.thread.start()
+
+    def add(self, result: dict):
+        if self.run_id is not None:
+            result = {**result, "run_id": self.run_id}
+        if "capture" in result:
+            result = dict(result)
+            captured = result.pop("capture")
+            self.captures.append({**captured, "run_id": result.get("run_id"), "test_case_id": result["test_case_id"]})
+        self.buffer.append(result)
+        if len(self.buffer) >= self.batch_size:
+            self.flush()
+        else:
+            self.flush_if_due()
+
+    def flush_if_due(self):
+        if self.buffer and time.monotonic() - self.last_flush >= self.flush_interval:
+            self.flush()
+
+    def flush(self):
+        """Queue the buffered rows for the writer thread; does not wait for the write."""
+        self.last_flush = time.monotonic()
+        if not self.buffer:
+            return
+        self.batches.put((self.buffer, self.captures))
+        self.buffer = []
+        self.captures = []
+
+    def _write_loop(self):
+        while True:
+            batch = self.batches.get()
+            if batch is None:
+                break
+            self._write(*batch)
+        if self.unwritten[0]:
+            # Last retry before the writer closes
+            self._write([], [])
+
+    def _write(self, rows, captures):
+        rows, captures = self.unwritten[0] + rows, self.unwritten[1] + captures
+        try:
+            self.session.bulk_insert_mappings(models.TestResult, rows)
+            if captures:
+                self.session.bulk_insert_mappings(models.ResponseCapture, captures)
+            self.session.commit()
+        except Exception as e:
+            # Keep the rows so the next write (or close) retries them
+            self.session.rollback()
+            print(f"Failed to write {len(rows)} test results: {e}")
+            self.unwritten = (rows, captures)
+            return
+        self.unwritten = ([], [])
+        self.written += len(rows)
+
+    async def flush_periodically(self):
+        """Flush on the time threshold even while no new results arrive."""
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            self.flush_if_due()
+
+    def close(self):
+        try:
+            self.flush()
+        finally:
+            self._release()
+        if self.unwritten[0]:
+            raise RuntimeError(f"{len(self.unwritten[0])} test results could not be written")
+
+    def _release(self):
+        # Waits for the queued batches to be written
+        if self.thread.is_alive():
+            self.batches.put(None)
+            self.thread.join()
+        if self.owns_session:
+            self.session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            # Don't mask the original error, but still save what we have
+            try:
+                self.flush()
+            finally:
+                self._release()
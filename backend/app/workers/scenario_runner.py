@@ -0,0 +1,133 @@
+import asyncio
+import json
+from sqlalchemy.orm import Session
+from core import db, environments, models, runs, scenarios
+from workers import test_runner
+
+
+async def run_step(step: dict, variables: dict, client, limit: asyncio.Semaphore) -> dict:
+    result = {"step_id": step["id"], "success": False, "skipped": False, "status": 0,
+              "latency_ms": None, "extracted": None, "error": None}
+    try:
+        endpoint = scenarios.render(step["endpoint"], variables, quote_values=True)
+        headers = scenarios.render(step["headers"], variables)
+        payload = scenarios.render(step["payload"], variables)
+        async with limit:
+            # Timed from when the request gets a slot, not while it waits for one
+            timer = test_runner.RequestTimer()
+            resp = await client.request(step["method"], endpoint, json=payload,
+                                        headers={k: str(v) for k, v in headers.items()},
+                                        extensions={"trace": timer.trace})
+        result["latency_ms"] = timer.finish()["latency_ms"]
+        result["status"] = resp.status_code
+        expected = step["expect_status"]
+        if not (resp.status_code == expected if expected else 200 <= resp.status_code < 300):
+            result["error"] = f"Expected {expected or '2xx'}, got {resp.status_code}"
+            return result
+
+        if step["extract"]:
+            try:
+                body = resp.json() if resp.content else None
+            except ValueError:
+                body = None
+            extracted = {name: scenarios.extract(expr, resp.status_code, resp.headers, body)
+                         for name, expr in step["extract"].items()}
+            # Only dependants read these, and they start after this step returns
+            variables.update(extracted)
+            result["extracted"] = extracted
+        result["success"] = True
+    except scenarios.ScenarioError as e:
+        result["error"] = str(e)
+    except Exception as e:
+        result["error"] = f"{type(e).__name__}: {e}"
+    return result
+
+
+async def run_scenario(scenario: dict, client, limit: asyncio.Semaphore) -> list:
+    """Run a scenario's steps as a DAG: each step starts as soon as all of its dependencies succeeded.
+
+    Steps below a failed step are skipped. ``limit`` bounds requests in flight across all scenarios.
+    """
+    steps = {s["name"]: s for s in scenario["steps"]}
+    variables = {}
+    tasks = {}
+
+    async def _step(step):
+        outcomes = await asyncio.gather(*(tasks[dep] for dep in step["depends_on"]))
+        failed = [dep for dep, outcome in zip(step["depends_on"], outcomes) if not outcome["success"]]
+        if failed:
+            return {"step_id": step["id"], "success": False, "skipped": True, "status": 0, "latency_ms": None,
+                    "extracted": None, "error": f"Skipped: {', '.join(failed)} did not succeed"}
+        return await run_step(step, variables, client, limit)
+
+    # Dependencies' tasks always exist before their dependants' are created
+    for name in scenarios.topological_order(scenario["steps"]):
+        tasks[name] = asyncio.create_task(_step(steps[name]))
+    results = await asyncio.gather(*tasks.values())
+    return [{**r, "scenario_id": scenario["id"]} for r in results]
+
+
+async def run_scenarios(scenario_list: list, max_concurrency: int = test_runner.MAX_CONCURRENCY,
+                        target: dict = None) -> list:
+    """Run scenarios concurrently over one pooled client; returns a result per step."""
+    limit = asyncio.Semaphore(max_concurrency)
+    async with test_runner.target_client(target or {}, max_concurrency) as client:
+        per_scenario = await asyncio.gather(*(run_scenario(s, client, limit) for s in scenario_list))
+    return [r for results in per_scenario for r in results]
+
+
+def run_scenarios_background(spec_id: int, run_id: int, scenario_id: int = None):
+    try:
+        # No session is held while the scenarios run
+        with db.SessionLocal() as session:
+            target = environments.run_target(session, session.get(models.TestRun, run_id))
+            scenario_list = [scenarios.scenario_dict(s)
+                             for s in scenarios.scenarios_query(session, spec_id, scenario_id)]
+        results = asyncio.run(run_scenarios(scenario_list, target=target))
+
+        with db.SessionLocal() as session:
+            for r in results:
+                r["run_id"] = run_id
+                if r["extracted"] is not None:
+                    r["extracted"] = json.dumps(r["extracted"], default=str)
+            session.bulk_insert_mappings(models.ScenarioResult, results)
+            passed = sum(1 for r in results if r["success"])
+            failed_scenarios = {r["scenario_id"] for r in results if not r["success"]}
+            run = session.get(models.TestRun, run_id)
+            run.total_tests = len(results)
+            run.summary = json.dumps({
+                "scenarios": len(scenario_list),
+                "scenarios_passed": len(scenario_list) - len(failed_scenarios),
+                "skipped_steps": sum(1 for r in results if r["skipped"]),
+            })
+            runs.finish_run(session, run, passed=passed, failed=len(results) - passed)
+            runs.compact_runs(session, spec_id)
+    except Exception as e:
+        print(f"Scenario run {run_id} failed: {e}")
+        runs.fail_run(run_id)
+
+
+def results_by_scenario(session: Session, run_id: int) -> list:
+    """A run's step results grouped per scenario, steps in definition order."""
+    rows = session.query(models.ScenarioResult, models.ScenarioStep, models.Scenario)\
+        .join(models.ScenarioStep, models.ScenarioStep.id == models.ScenarioResult.step_id)\
+        .join(models.Scenario, models.Scenario.id == models.ScenarioResult.scenario_id)\
+        .filter(models.ScenarioResult.run_id == run_id)\
+        .order_by(models.Scenario.id, models.ScenarioStep.position)
+    grouped = {}
+    for result, step, scenario in rows:
+        entry = grouped.setdefault(scenario.id, {"scenario_id": scenario.id, "name": scenario.name,
+                                                 "success": True, "steps": []})
+        entry["success"] = entry["success"] and result.success
+        entry["steps"].append({
+            "step": step.name,
+            "method": step.method,
+            "endpoint": step.endpoint,
+            "success": result.success,
+            "skipped": result.skipped,
+            "status": result.status,
+            "latency_ms": result.latency_ms,
+            "extracted": json.loads(result.extracted) if result.extracted else None,
+            "error": result.error,
+        })
+    return list(grouped.values())
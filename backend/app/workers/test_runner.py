@@ -1,17 +1,214 @@
+import asyncio
 import httpx
 import json
+import os
+import time
+from collections import defaultdict
+from urllib.parse import urlsplit
+from core import capture, environments
 
-async def run_test_case(test_case):
+try:
+    import h2  # noqa: F401
+    H2_AVAILABLE = True
+except ImportError:
+    H2_AVAILABLE = False
+
+# Runner configuration
+MAX_CONCURRENCY = int(os.getenv("RUNNER_MAX_CONCURRENCY", "50"))
+PER_HOST_CONCURRENCY = int(os.getenv("RUNNER_PER_HOST_CONCURRENCY", "10"))
+REQUEST_TIMEOUT = float(os.getenv("RUNNER_REQUEST_TIMEOUT", "10"))
+# Negotiate HTTP/2 over TLS when the h2 package is installed (plain http:// stays on HTTP/1.1 keep-alive)
+RUNNER_HTTP2 = os.getenv("RUNNER_HTTP2", "true").lower() in ("1", "true", "yes") and H2_AVAILABLE
+
+
+def make_client(max_connections: int = MAX_CONCURRENCY, base_url: str = None, headers: dict = None,
+                params: dict = None, auth=None, http2: bool = RUNNER_HTTP2) -> httpx.AsyncClient:
+    """A pooled client; relative endpoints (``/users``) resolve against ``base_url``."""
+    limits = httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections)
+    return httpx.AsyncClient(limits=limits, timeout=REQUEST_TIMEOUT, base_url=base_url or "", headers=headers,
+                             params=params, auth=auth, http2=http2)
+
+
+def target_client(target: dict, max_connections: int = MAX_CONCURRENCY) -> httpx.AsyncClient:
+    """A pooled client for a run target (see ``core.environments``)."""
+    return make_client(max_connections, **environments.client_options(target))
+
+
+class ClientPool:
+    """One pooled client per target, kept for as long as the event loop that uses them.
+
+    Long-lived runners (queue workers) hold a pool across batches, so repeated
+    calls to the same environment reuse open keep-alive/HTTP/2 connections
+    instead of paying a TCP and TLS handshake per batch.
+    """
+
+    def __init__(self, max_connections: int = MAX_CONCURRENCY):
+        self.max_connections = max_connections
+        self.clients = {}
+
+    def get(self, target: dict) -> httpx.AsyncClient:
+        key = environments.target_key(target)
+        client = self.clients.get(key)
+        if client is None or client.is_closed:
+            client = self.clients[key] = target_client(target, self.max_connections)
+        return client
+
+    async def aclose(self):
+        clients, self.clients = list(self.clients.values()), {}
+        for client in clients:
+            await client.aclose()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.aclose()
+
+
+# httpcore trace events bounding each timed phase (HTTP/1.1 and HTTP/2 connections)
+TRACE_PHASES = {
+    "connection.connect_tcp": "connect_ms",
+    "connection.start_tls": "tls_ms",
+}
+TTFB_EVENTS = ("http11.receive_response_headers.complete", "http2.receive_response_headers.complete")
+
+
+class RequestTimer:
+    """Collects a request's phase timings from httpx's ``trace`` extension.
+
+    ``connect_ms`` (which includes name resolution; httpx does not report
+    DNS separately) and ``tls_ms`` are only set when the request opened a
+    new connection rather than reusing a pooled one.
+    """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.marks = {}
+        self.timings = {"latency_ms": None, "connect_ms": None, "tls_ms": None, "ttfb_ms": None}
+
+    async def trace(self, event_name: str, info: dict):
+        now = time.perf_counter()
+        phase, _, stage = event_name.rpartition(".")
+        if phase in TRACE_PHASES:
+            if stage == "started":
+                self.marks[phase] = now
+            elif stage == "complete" and phase in self.marks:
+                self.timings[TRACE_PHASES[phase]] = round((now - self.marks[phase]) * 1000, 3)
+        elif event_name in TTFB_EVENTS:
+            self.timings["ttfb_ms"] = round((now - self.started) * 1000, 3)
+
+    def finish(self) -> dict:
+        self.timings["latency_ms"] = round((time.perf_counter() - self.started) * 1000, 3)
+        return self.timings
+
+
+async def send(client: httpx.AsyncClient, method: str, endpoint: str, payload=None,
+               timer: RequestTimer = None) -> httpx.Response:
+    extensions = {"trace": timer.trace} if timer else None
+    return await client.request(method.upper(), endpoint, json=payload, extensions=extensions)
+
+
+async def run_test_case(test_case, client: httpx.AsyncClient, validators=None):
+    """Send one case. With ``validators`` (``core.response_validation.SpecValidators``) a
+    2xx response only passes if it also matches the operation's declared response schema.
+    """
+    timer = RequestTimer()
+    timings = None
+    response_bytes = None
+    errors = []
     try:
-        method = test_case.method.upper()
         payload = json.loads(test_case.payload) if test_case.payload else None
 
-        async with httpx.AsyncClient() as client:
-            resp = await client.request(method, test_case.endpoint, json=payload, timeout=10)
-            success = 200 <= resp.status_code < 300
-            status = resp.status_code
-    except Exception:
+        resp = await send(client, test_case.method, test_case.endpoint, payload, timer)
+        # Timed up to the response being read; validating it is not part of the latency
+        timings = timer.finish()
+        status = resp.status_code
+        response_bytes = len(resp.content)
+        if validators is not None:
+            errors = validators.validate(test_case, status, resp.headers.get("content-type"), resp.content)
+        success = 200 <= status < 300 and not errors
+    except Exception as e:
+        print(f"Error running test {test_case.id}: {e}")
         success = False
         status = 0
+        resp = None
+
+    result = {"test_case_id": test_case.id, "success": success, "status": status,
+              "response_bytes": response_bytes, **(timings or timer.finish()),
+              "validation_errors": json.dumps(errors) if errors else None}
+    if resp is not None and capture.should_capture(success):
+        # Stored separately by the result writer
+        result["capture"] = capture.capture_response(resp)
+    return result
+
+
+class RunBudget:
+    """Stops a run early: after ``max_failures`` failed cases or ``seconds`` from now (None: unlimited).
+
+    Cases not yet sent once it is exhausted are skipped; requests already in
+    flight still complete and are recorded.
+    """
+
+    def __init__(self, max_failures: int = None, seconds: float = None):
+        self.max_failures = max_failures
+        self.deadline = time.monotonic() + seconds if seconds is not None else None
+        self.failures = 0
+        self.reason = None
+        self.skipped = 0
+
+    def record(self, result: dict):
+        if not result["success"]:
+            self.failures += 1
+            if self.reason is None and self.max_failures is not None and self.failures >= self.max_failures:
+                self.reason = "fail_fast"
+
+    def exhausted(self) -> bool:
+        if self.reason is None and self.max_failures is not None and self.max_failures <= 0:
+            self.reason = "fail_fast"
+        if self.reason is None and self.deadline is not None and time.monotonic() >= self.deadline:
+            self.reason = "time_budget"
+        return self.reason is not None
+
+
+async def run_test_cases(test_cases, on_result=None,
+                         max_concurrency: int = MAX_CONCURRENCY,
+                         per_host_concurrency: int = PER_HOST_CONCURRENCY,
+                         target: dict = None, clients: ClientPool = None, validators=None,
+                         budget: RunBudget = None):
+    """Run test cases concurrently over one pooled client for ``target``.
+
+    At most ``max_concurrency`` requests are in flight overall and at most
+    ``per_host_concurrency`` against any single host. ``on_result`` is called
+    with each result dict as soon as it is available. The client comes from
+    ``clients`` when given (and stays open), otherwise it lives for this call.
+    Responses are checked against their schemas when ``validators`` is given.
+    Cases start in the given order; with a ``budget`` the rest are skipped
+    once it is exhausted.
+    """
+    global_limit = asyncio.Semaphore(max_concurrency)
+    host_limits = defaultdict(lambda: asyncio.Semaphore(per_host_concurrency))
+    results = []
+    target = target or {"base_url": None}
+
+    async def _run(tc, client):
+        host = urlsplit(tc.endpoint).netloc
+        # Host slot first: cases queued behind a busy host must not hold global slots other hosts could use
+        async with host_limits[host], global_limit:
+            if budget is not None and budget.exhausted():
+                budget.skipped += 1
+                return
+            result = await run_test_case(tc, client, validators)
+        if budget is not None:
+            budget.record(result)
+        results.append(result)
+        if on_result:
+            on_result(result)
+
+    if clients is not None:
+        client = clients.get(target)
+        await asyncio.gather(*(_run(tc, client) for tc in test_cases))
+    else:
+        async with target_client(target, max_concurrency) as client:
+            await asyncio.gather(*(_run(tc, client) for tc in test_cases))
 
-    return {"test_case_id": test_case.id, "success": success, "status": status}
+    return results
@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""
+Tests for the OAuth2 token cache: one fetch for many concurrent requests,
+and no retry storm against a failing token endpoint.
+Uses a local token endpoint; no network access needed.
+"""
+
+import asyncio
+import json
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "app"))
+
+from core.auth import AuthError, TokenManager  # noqa: E402
+
+
+class TokenEndpoint(BaseHTTPRequestHandler):
+    """Hands out numbered tokens, or fails with a 500 while ``failing`` is set."""
+    hits = 0
+    failing = False
+    expires_in = 3600
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        cls = type(self)
+        cls.hits += 1
+        time.sleep(0.1)
+        if cls.failing:
+            body, status = b'{"error": "server_error"}', 500
+        else:
+            body = json.dumps({"access_token": f"token-{cls.hits}", "expires_in": cls.expires_in}).encode()
+            status = 200
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def _endpoint(failing: bool = False, expires_in: float = 3600):
+    """A fresh token endpoint and the oauth2 config pointing at it."""
+    handler = type("Endpoint", (TokenEndpoint,), {"hits": 0, "failing": failing, "expires_in": expires_in})
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    config = {"type": "oauth2", "token_url": f"http://127.0.0.1:{server.server_port}/token",
+              "client_id": "client", "client_secret": "secret"}
+    return server, handler, config
+
+
+def test_concurrent_requests_share_one_fetch():
+    server, endpoint, config = _endpoint()
+    manager = TokenManager()
+
+    async def run():
+        return await asyncio.gather(*(manager.get(config) for _ in range(50)))
+
+    try:
+        values = asyncio.run(run())
+        assert set(values) == {"token-1"}
+        assert endpoint.hits == 1 and manager.fetches == 1
+        # Cached from now on
+        assert asyncio.run(manager.get(config)) == "token-1"
+        assert endpoint.hits == 1
+    finally:
+        server.shutdown()
+
+
+def test_failed_refresh_keeps_serving_the_valid_token():
+    """A failing endpoint is asked once per backoff, not once per request, while the old token is valid."""
+    server, endpoint, config = _endpoint(expires_in=2)
+    manager = TokenManager(retry_after=30)
+
+    async def run():
+        first = await manager.get(config)
+        # Into the refresh window (the last half of a 2s token) with the endpoint down
+        await asyncio.sleep(1.1)
+        endpoint.failing = True
+        values = []
+        for _ in range(20):
+            values += await asyncio.gather(*(manager.get(config) for _ in range(10)))
+            await asyncio.sleep(0.02)
+        return first, values
+
+    try:
+        first, values = asyncio.run(run())
+        assert first == "token-1"
+        assert set(values) == {"token-1"}
+        # The initial fetch and a single failed refresh
+        assert endpoint.hits == 2
+    finally:
+        server.shutdown()
+
+
+def test_no_token_fails_fast_during_backoff():
+    server, endpoint, config = _endpoint(failing=True)
+    manager = TokenManager(retry_after=30)
+
+    async def run():
+        errors = []
+        for _ in range(5):
+            try:
+                await manager.get(config)
+            except AuthError as e:
+                errors.append(e)
+        return errors
+
+    try:
+        started = time.monotonic()
+        errors = asyncio.run(run())
+        assert len(errors) == 5
+        assert endpoint.hits == 1
+        # Only the first call waited on the endpoint
+        assert time.monotonic() - started < 1
+    finally:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    print("🧪 OAuth2 Token Cache Test Script")
+    print("=" * 40)
+    test_concurrent_requests_share_one_fetch()
+    print("✅ Concurrent requests share a single token fetch")
+    test_failed_refresh_keeps_serving_the_valid_token()
+    print("✅ A failing refresh is not retried per request while the token is valid")
+    test_no_token_fails_fast_during_backoff()
+    print("✅ Without a token, requests fail fast during the backoff")
@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+Tests for concurrent LLM test generation: retries, the generated test cache
+and config errors. Uses a stub provider and a throwaway SQLite database;
+no API keys or network access needed.
+"""
+
+import asyncio
+import json
+import os
+import sys
+import tempfile
+
+os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(tempfile.mkdtemp(), "test_llm_generation.db")
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "app"))
+
+from core import db, test_generator  # noqa: E402
+from core.generation_cache import GenerationCache  # noqa: E402
+from core.test_generator import LLMConfigError, LLMError  # noqa: E402
+
+db.Base.metadata.create_all(bind=db.engine)
+
+SPEC = {"paths": {"/users": {"get": {}}, "/orders": {"post": {}}}}
+
+
+class StubProvider:
+    """Answers prompts with ``reply(endpoint, call_number)``; registered as a provider named ``name``."""
+
+    def __init__(self, name: str, reply):
+        self.name = name
+        self.reply = reply
+        self.calls = []
+        test_generator.PROVIDERS[name] = self
+        test_generator.PROVIDER_MODELS[name] = lambda: f"stub:{name}"
+
+    async def __call__(self, client, prompt: str) -> str:
+        endpoint = next(line.split()[2] for line in prompt.splitlines() if line.startswith("Endpoint:"))
+        self.calls.append(endpoint)
+        return self.reply(endpoint, self.calls.count(endpoint))
+
+
+def _cases(endpoint: str) -> str:
+    return "Here you go:\n" + json.dumps([{"endpoint": endpoint, "method": "GET", "payload": {}}])
+
+
+def _generate(provider: StubProvider, cache=None, max_retries: int = 3):
+    return asyncio.run(test_generator.generate_llm_tests_async(
+        SPEC, provider.name, max_retries=max_retries, retry_delay=0, requests_per_minute=60000, cache=cache,
+    ))
+
+
+def test_retryable_errors_are_retried():
+    def reply(endpoint, attempt):
+        if attempt == 1:
+            raise LLMError("rate limited", retryable=True, retry_after=0)
+        return _cases(endpoint)
+
+    provider = StubProvider("retrying", reply)
+    tests = _generate(provider)
+    assert sorted(t["operation"] for t in tests) == ["GET /users", "POST /orders"]
+    assert len(provider.calls) == 4
+
+
+def test_cached_generations_skip_the_llm():
+    provider = StubProvider("cached", lambda endpoint, attempt: _cases(endpoint))
+    with db.SessionLocal() as session:
+        first = _generate(provider, GenerationCache(session))
+        second = _generate(provider, GenerationCache(session))
+    assert first == second and len(first) == 2
+    assert len(provider.calls) == 2
+
+
+def test_empty_generations_are_not_cached():
+    """A completion without test cases is asked for again on the next run instead of being served from cache."""
+    provider = StubProvider("empty", lambda endpoint, attempt: "[]" if attempt == 1 else _cases(endpoint))
+    with db.SessionLocal() as session:
+        assert _generate(provider, GenerationCache(session), max_retries=1) == []
+        tests = _generate(provider, GenerationCache(session), max_retries=1)
+    assert len(tests) == 2
+    assert len(provider.calls) == 4
+
+
+def test_config_error_stops_the_other_prompts():
+    running = []
+
+    async def slow_or_broken(client, prompt):
+        if "Endpoint: GET /users" in prompt:
+            await asyncio.sleep(0.05)
+            raise LLMConfigError("invalid API key")
+        running.append(prompt)
+        try:
+            await asyncio.sleep(1)
+        finally:
+            running.remove(prompt)
+        return "[]"
+
+    test_generator.PROVIDERS["broken"] = slow_or_broken
+    test_generator.PROVIDER_MODELS["broken"] = lambda: "stub:broken"
+
+    async def run():
+        try:
+            await test_generator.generate_llm_tests_async(SPEC, "broken", retry_delay=0,
+                                                          requests_per_minute=60000)
+        except LLMConfigError:
+            # The other operation's call was cancelled rather than left running on a closed client
+            return list(running)
+        raise AssertionError("LLMConfigError was not raised")
+
+    assert asyncio.run(run()) == []
+
+
+if __name__ == "__main__":
+    print("🧪 LLM Test Generation Test Script")
+    print("=" * 40)
+    test_retryable_errors_are_retried()
+    print("✅ Retryable provider errors are retried")
+    test_cached_generations_skip_the_llm()
+    print("✅ Cached generations are reused without an LLM call")
+    test_empty_generations_are_not_cached()
+    print("✅ Empty generations are not cached")
+    test_config_error_stops_the_other_prompts()
+    print("✅ A config error cancels the remaining prompts")
@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+"""
+Tests for the distributed run queue: lease expiry and re-claiming of batches.
+Runs against a throwaway SQLite database; no server or workers needed.
+"""
+
+import json
+import os
+import sys
+import tempfile
+import time
+
+os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(tempfile.mkdtemp(), "test_run_queue.db")
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "app"))
+
+from core import db, models, run_queue  # noqa: E402
+
+db.Base.metadata.create_all(bind=db.engine)
+
+
+def _queued_run(session, cases: int = 3):
+    spec = models.APISpec(filename="queue.json", content="{}")
+    session.add(spec)
+    session.commit()
+    for i in range(cases):
+        session.add(models.TestCase(spec_id=spec.id, endpoint=f"/items/{i}", method="GET"))
+    run = models.TestRun(spec_id=spec.id, status="running", total_tests=cases)
+    session.add(run)
+    session.commit()
+    run_queue.enqueue_run(session, run, batch_size=cases)
+    return run.id
+
+
+def test_expired_lease_is_reclaimed():
+    """A batch whose lease ran out goes to the next worker; the first one can no longer touch it."""
+    with db.SessionLocal() as session:
+        run_id = _queued_run(session)
+        first = run_queue.lease_batch(session, "worker-a", lease_seconds=0.2)
+        assert first is not None and first.run_id == run_id
+        # Still leased: nothing for a second worker
+        assert run_queue.lease_batch(session, "worker-b", lease_seconds=30) is None
+
+        time.sleep(0.3)
+        second = run_queue.lease_batch(session, "worker-b", lease_seconds=30)
+        assert second is not None and second.id == first.id
+        assert second.worker_id == "worker-b" and second.attempts == 2
+
+        # The first worker lost the lease: its heartbeat and its results are rejected
+        assert not run_queue.heartbeat(session, first.id, "worker-a")
+        case_ids = json.loads(first.test_case_ids)
+        stale = [{"test_case_id": case_ids[0], "success": False, "status": 500}]
+        assert not run_queue.complete_batch(session, first, "worker-a", stale)
+        assert session.query(models.TestResult).filter(models.TestResult.run_id == run_id).count() == 0
+
+        results = [{"test_case_id": tc_id, "success": True, "status": 200} for tc_id in case_ids]
+        assert run_queue.heartbeat(session, second.id, "worker-b")
+        assert run_queue.complete_batch(session, second, "worker-b", results)
+        run = session.get(models.TestRun, run_id)
+        assert (run.status, run.passed, run.failed) == ("completed", 3, 0)
+
+
+if __name__ == "__main__":
+    print("🧪 Run Queue Test Script")
+    print("=" * 40)
+    test_expired_lease_is_reclaimed()
+    print("✅ Expired leases are re-claimed and the old worker's results are rejected")